@@ -5,9 +5,13 @@ from typing import Annotated
 from datetime import datetime, timedelta, timezone
 
 from app.db import get_db
-from app.models import User, Goal, Event
+from app.models import User, Goal, Event, LLMUsage
 from app.auth import get_current_user, get_admin_user
 from app.logger import logger
+from app.leaderboard import rebuild_leaderboard
+from app.progression import reconcile_progression_counters
+from app.cache import invalidate_tags
+from app.llm_usage import cost_usd, flush_usage, pending_usage
 
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -207,3 +211,119 @@ async def get_events(
             for event in events
         ]
     }
+
+
+@router.post("/leaderboard/rebuild")
+async def rebuild_leaderboard_index(
+    current_user: Annotated[User, Depends(get_admin_user)]
+):
+    """
+    Rebuild the Redis leaderboard from users.total_exp (drift repair).
+    Only accessible by admin users.
+    """
+    users_loaded = await rebuild_leaderboard()
+    await invalidate_tags("leaderboard")
+
+    logger.info("Leaderboard rebuilt by admin", admin_id=current_user.id, users=users_loaded, event="leaderboard_rebuilt_admin")
+
+    return {
+        "status": "rebuilt",
+        "users": users_loaded
+    }
+
+
+@router.post("/progression/reconcile")
+async def reconcile_progression(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_admin_user)]
+):
+    """
+    Recompute every user's levels_completed/levels_total counters (drift repair).
+    Only accessible by admin users.
+    """
+    users_fixed = await reconcile_progression_counters(db)
+
+    logger.info("Progression counters reconciled by admin", admin_id=current_user.id, users_fixed=users_fixed, event="progression_reconciled_admin")
+
+    return {
+        "status": "reconciled",
+        "users_fixed": users_fixed
+    }
+
+
+def _usage_totals(rows) -> list:
+    """Fold (group, model, calls, cache_hits, prompt, completion, latency) rows into one entry per group, with cost"""
+    totals = {}
+    for group, model, calls, cache_hits, prompt_tokens, completion_tokens, latency_ms in rows:
+        entry = totals.setdefault(group, {
+            "calls": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0, "cost_usd": 0.0
+        })
+        entry["calls"] += calls
+        entry["cache_hits"] += cache_hits
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+        entry["latency_ms"] += latency_ms
+        entry["cost_usd"] += cost_usd(model, prompt_tokens, completion_tokens) or 0.0
+
+    for entry in totals.values():
+        entry["avg_latency_ms"] = round(entry.pop("latency_ms") / entry["calls"], 2) if entry["calls"] else 0
+        entry["cost_usd"] = round(entry["cost_usd"], 6)
+    return sorted(totals.items(), key=lambda item: item[1]["cost_usd"], reverse=True)
+
+
+@router.get("/llm-usage")
+async def get_llm_usage(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_admin_user)],
+    days: int = 7,
+    user_id: int | None = None,
+    top_users: int = 20
+):
+    """
+    LLM token usage and estimated cost per endpoint, per user and per day.
+    Only accessible by admin users.
+
+    Query params:
+    - days: Look back this many UTC days, today included (default 7)
+    - user_id: Only this user's usage
+    - top_users: How many of the most expensive users to list (default 20)
+    """
+    await flush_usage()  # include this process's unflushed usage
+
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    sums = (
+        func.sum(LLMUsage.calls),
+        func.sum(LLMUsage.cache_hits),
+        func.sum(LLMUsage.prompt_tokens),
+        func.sum(LLMUsage.completion_tokens),
+        func.sum(LLMUsage.latency_ms),
+    )
+
+    async def grouped(*columns):
+        query = select(*columns, LLMUsage.model, *sums).where(LLMUsage.day >= since)
+        if user_id is not None:
+            query = query.where(LLMUsage.user_id == user_id)
+        result = await db.execute(query.group_by(*columns, LLMUsage.model))
+        return [
+            (row[0] if len(columns) == 1 else tuple(row[:len(columns)]), *row[len(columns):])
+            for row in result.all()
+        ]
+
+    by_endpoint = _usage_totals(await grouped(LLMUsage.endpoint, LLMUsage.purpose))
+    by_user = _usage_totals(await grouped(LLMUsage.user_id))[:top_users]
+    by_day = _usage_totals(await grouped(LLMUsage.day))
+    by_model = _usage_totals(await grouped(LLMUsage.model))
+
+    return {
+        "since": since.isoformat(),
+        "filters": {"user_id": user_id, "days": days},
+        "totals": {
+            key: round(sum(entry[key] for _, entry in by_model), 6)
+            for key in ("calls", "cache_hits", "prompt_tokens", "completion_tokens", "cost_usd")
+        },
+        "by_endpoint": [{"endpoint": endpoint, "purpose": purpose, **entry} for (endpoint, purpose), entry in by_endpoint],
+        "by_user": [{"user_id": uid, **entry} for uid, entry in by_user],
+        "by_day": sorted(({"day": day.isoformat(), **entry} for day, entry in by_day), key=lambda entry: entry["day"]),
+        "by_model": [{"model": model, **entry} for model, entry in by_model],
+        "pending": pending_usage()
+    }
@@ -0,0 +1,334 @@
+"""
+Pydantic models for what the LLM returns, with a repair pass.
+
+Completions are validated straight from the JSON text, in strict mode,
+with module-level TypeAdapters (built once, so each validator is compiled
+once per process). Well-formed output passes as is. When it doesn't, the
+payload goes through repair_*(): recoverable defects are coerced or dropped
+(topics given as plain strings, a "completed" flag of "false", 3 options
+instead of 4, one unusable question among good ones) and the result is
+validated again. A new roadmap never starts with completed topics, whatever
+the model says. Only output that can't be salvaged raises
+ValueError, so one bad item no longer costs a whole re-generation.
+"""
+import json
+from typing import Any, Callable, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError, field_validator, model_validator
+
+from app.logger import logger
+from app.metrics import metrics
+
+
+VALID_DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+QUIZ_OPTIONS = 4
+MIN_QUIZ_OPTIONS = 2  # fewer options than this and a question is dropped
+OPTION_VALUES = "ABCDEFGH"
+XP_RANGE = (100, 300)
+
+
+class _AIModel(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+
+# ===== Roadmap (newline-delimited: a header line, then one line per level) =====
+
+class RoadmapHeader(_AIModel):
+    title: str = Field(min_length=1)
+    category: str = Field(min_length=1)
+    difficulty: Literal["beginner", "intermediate", "advanced"]
+    roadmap_name: str = Field(min_length=1)
+
+
+class RoadmapTopic(_AIModel):
+    name: str = Field(min_length=1)
+    completed: bool = False
+
+    @field_validator("completed")
+    @classmethod
+    def not_completed_yet(cls, value: bool) -> bool:
+        return False
+
+
+class RoadmapLevel(_AIModel):
+    order: int = Field(ge=1)
+    title: str = Field(min_length=1)
+    description: str = ""
+    topics: List[RoadmapTopic] = Field(min_length=1)
+    xp_reward: int = Field(ge=XP_RANGE[0], le=XP_RANGE[1])
+
+
+# ===== Level explanations =====
+
+class TopicExplanation(_AIModel):
+    name: str = ""
+    explanation: str = Field(min_length=1)
+
+
+class LevelExplanations(_AIModel):
+    topics: List[TopicExplanation] = Field(min_length=1)
+
+
+# ===== Quiz =====
+
+class QuizOption(_AIModel):
+    text: str = Field(min_length=1)
+    value: str = Field(min_length=1)
+
+
+class QuizQuestion(_AIModel):
+    id: int
+    question: str = Field(min_length=1)
+    options: List[QuizOption] = Field(min_length=QUIZ_OPTIONS, max_length=QUIZ_OPTIONS)
+    correct_answer: str
+
+    @model_validator(mode="after")
+    def answer_is_an_option(self):
+        if self.correct_answer not in {option.value for option in self.options}:
+            raise ValueError(f"correct_answer {self.correct_answer!r} is not one of the options")
+        return self
+
+
+class RepairedQuizQuestion(QuizQuestion):
+    """A question that lost options in repair still counts if it has enough to choose from"""
+    options: List[QuizOption] = Field(min_length=MIN_QUIZ_OPTIONS, max_length=QUIZ_OPTIONS)
+
+
+class Quiz(_AIModel):
+    questions: List[QuizQuestion] = Field(min_length=1)
+
+
+class RepairedQuiz(_AIModel):
+    questions: List[RepairedQuizQuestion] = Field(min_length=1)
+
+
+roadmap_header_adapter = TypeAdapter(RoadmapHeader)
+roadmap_level_adapter = TypeAdapter(RoadmapLevel)
+level_explanations_adapter = TypeAdapter(LevelExplanations)
+quiz_adapter = TypeAdapter(Quiz)
+repaired_quiz_adapter = TypeAdapter(RepairedQuiz)
+
+
+# ===== Repair =====
+
+def _text(value: Any) -> Optional[str]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    return value.strip() or None if isinstance(value, str) else None
+
+
+def _int(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        return int(float(str(value).strip()))
+    except (ValueError, TypeError, OverflowError):  # OverflowError: "inf", 1e400
+        return None
+
+
+def repair_roadmap_header(data: Dict[str, Any], fixes: List[str]) -> Dict[str, Any]:
+    title = _text(data.get("title"))
+    if title is None:
+        raise ValueError("Roadmap header has no title")
+
+    difficulty = (_text(data.get("difficulty")) or "").lower()
+    if difficulty not in VALID_DIFFICULTIES:
+        fixes.append(f"difficulty {data.get('difficulty')!r} -> 'intermediate'")
+        difficulty = "intermediate"
+
+    category = _text(data.get("category"))
+    if category is None:
+        fixes.append("missing category")
+    roadmap_name = _text(data.get("roadmap_name"))
+    if roadmap_name is None:
+        fixes.append("missing roadmap_name")
+
+    return {
+        "title": title,
+        "category": category or "General",
+        "difficulty": difficulty,
+        "roadmap_name": roadmap_name or f"{title} Roadmap",
+    }
+
+
+def repair_roadmap_level(data: Dict[str, Any], order: int, fixes: List[str]) -> Dict[str, Any]:
+    """Repair one level line; order is its position in the roadmap"""
+    title = _text(data.get("title"))
+    if title is None:
+        raise ValueError(f"Level {order} has no title")
+
+    topics = []
+    for topic in data.get("topics") or []:
+        if isinstance(topic, str):
+            topic = {"name": topic}
+        name = _text(topic.get("name")) if isinstance(topic, dict) else None
+        if name is None:
+            fixes.append(f"level {order}: dropped a topic without a name")
+            continue
+        if topic.get("completed", False) is not False:
+            fixes.append(f"level {order}: completed flag {topic.get('completed')!r} -> False")
+        topics.append({"name": name, "completed": False})
+    if not topics:
+        raise ValueError(f"Level {order} has no topics")
+
+    if _int(data.get("order")) != order:
+        fixes.append(f"level {order}: order {data.get('order')!r} -> {order}")
+    xp_reward = _int(data.get("xp_reward"))
+    if xp_reward is None:
+        fixes.append(f"level {order}: missing xp_reward")
+        xp_reward = XP_RANGE[0]
+
+    return {
+        "order": order,
+        "title": title,
+        "description": _text(data.get("description")) or "",
+        "topics": topics,
+        "xp_reward": min(max(xp_reward, XP_RANGE[0]), XP_RANGE[1]),
+    }
+
+
+def repair_level_explanations(data: Any, fixes: List[str]) -> Dict[str, Any]:
+    """Accept explanations as objects, plain strings or a {name: explanation} map; drop empty ones"""
+    topics = data.get("topics") if isinstance(data, dict) else None
+    if topics is None and isinstance(data, dict):
+        fixes.append("explanations given as a map")
+        topics = [{"name": name, "explanation": explanation} for name, explanation in data.items()]
+    if not isinstance(topics, list):
+        raise ValueError("AI response missing 'topics' field")
+
+    repaired = []
+    for i, topic in enumerate(topics):
+        if isinstance(topic, str):
+            topic = {"explanation": topic}
+        explanation = _text(topic.get("explanation")) if isinstance(topic, dict) else None
+        if explanation is None:
+            fixes.append(f"dropped explanation {i + 1}: empty")
+            continue
+        repaired.append({"name": _text(topic.get("name")) or "", "explanation": explanation})
+    if not repaired:
+        raise ValueError("AI generated no usable explanations")
+    return {"topics": repaired}
+
+
+def match_explanations(explained: LevelExplanations, topic_names: List[str]) -> List[str]:
+    """
+    One explanation per topic, in topic order: matched by name, or by
+    position when the model explained exactly as many topics as asked.
+    """
+    by_name = {topic.name.lower(): topic.explanation for topic in explained.topics if topic.name}
+    if all(name.lower() in by_name for name in topic_names):
+        return [by_name[name.lower()] for name in topic_names]
+    if len(explained.topics) == len(topic_names):
+        return [topic.explanation for topic in explained.topics]
+    raise ValueError(f"AI explained {len(explained.topics)} of {len(topic_names)} topics")
+
+
+def _repair_question(question: Any, i: int, fixes: List[str]) -> Dict[str, Any]:
+    if not isinstance(question, dict):
+        raise ValueError("not an object")
+    text = _text(question.get("question"))
+    if text is None:
+        raise ValueError("no question text")
+
+    options = []
+    for option in question.get("options") or []:
+        if isinstance(option, str):
+            option = {"text": option}
+        option_text = _text(option.get("text")) if isinstance(option, dict) else None
+        if option_text is not None:
+            options.append({"text": option_text, "value": _text(option.get("value")) or ""})
+
+    if len(options) < MIN_QUIZ_OPTIONS:
+        raise ValueError(f"only {len(options)} usable options")
+
+    # The correct answer may be given by value ("B", "b") or by its text
+    answer = _text(question.get("correct_answer"))
+    if answer is None:
+        raise ValueError("no correct answer")
+    correct = next(
+        (j for j, option in enumerate(options)
+         if answer.upper() == option["value"].upper() or answer.lower() == option["text"].lower()),
+        None
+    )
+    if correct is None and len(answer) == 1 and answer.upper() in OPTION_VALUES[:len(options)]:
+        correct = OPTION_VALUES.index(answer.upper())
+    if correct is None:
+        raise ValueError(f"correct answer {answer!r} is not one of the options")
+
+    if len(options) > QUIZ_OPTIONS:
+        fixes.append(f"question {i + 1}: {len(options)} options trimmed to {QUIZ_OPTIONS}")
+        keep = [j for j in range(len(options)) if j != correct][:QUIZ_OPTIONS - 1] + [correct]
+        options = [options[j] for j in sorted(keep)]
+        correct = sorted(keep).index(correct)
+    elif len(options) < QUIZ_OPTIONS:
+        fixes.append(f"question {i + 1}: only {len(options)} options")
+
+    # Relabel A, B, C... in order, whatever values the model used
+    for j, option in enumerate(options):
+        option["value"] = OPTION_VALUES[j]
+    return {
+        "id": i + 1,
+        "question": text,
+        "options": options,
+        "correct_answer": OPTION_VALUES[correct],
+    }
+
+
+def repair_quiz(data: Any, fixes: List[str]) -> Dict[str, Any]:
+    """Repair every question, dropping those that can't be; ids are renumbered 1..n"""
+    questions = data.get("questions") if isinstance(data, dict) else None
+    if not isinstance(questions, list):
+        raise ValueError("AI response missing 'questions' field")
+
+    repaired = []
+    for i, question in enumerate(questions):
+        try:
+            repaired.append(_repair_question(question, len(repaired), fixes))
+        except ValueError as e:
+            fixes.append(f"dropped question {i + 1}: {e}")
+    if not repaired:
+        raise ValueError("AI generated no usable questions")
+    return {"questions": repaired}
+
+
+# ===== Validation =====
+
+def validate_ai_json(
+    kind: str,
+    content: str,
+    adapter: TypeAdapter,
+    repair: Callable[[Any, List[str]], Dict[str, Any]],
+    repaired_adapter: Optional[TypeAdapter] = None,
+) -> Any:
+    """
+    Validate an LLM completion: strict first, then repair and validate again (lax).
+
+    Returns the model instance. Raises ValueError if the JSON is invalid or
+    the payload can't be repaired.
+    """
+    try:
+        result = adapter.validate_json(content, strict=True)
+        metrics.record_llm_validation("valid")
+        return result
+    except ValidationError as e:
+        errors = e.errors()
+
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        metrics.record_llm_validation("rejected")
+        raise ValueError(f"AI returned invalid JSON: {str(e)}")
+
+    fixes: List[str] = []
+    try:
+        result = (repaired_adapter or adapter).validate_python(repair(data, fixes))
+    except (ValueError, TypeError, AttributeError) as e:  # ValidationError is a ValueError
+        metrics.record_llm_validation("rejected")
+        logger.warning("Unrepairable AI output", kind=kind, error=str(e), errors=len(errors), event="ai_output_rejected")
+        raise ValueError(f"Invalid {kind} from AI: {str(e)}")
+
+    metrics.record_llm_validation("repaired")
+    logger.info("Repaired AI output", kind=kind, fixes=fixes, errors=len(errors), event="ai_output_repaired")
+    return result
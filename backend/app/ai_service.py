@@ -1,171 +1,927 @@
-from openai import AsyncOpenAI
-import json
-from typing import Dict, Any
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import asyncio
+import copy
+import httpx
+import math
+import openai
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from app.config import settings
 from app.logger import logger
+from app.metrics import metrics
+from app.llm_cache import get_cached_response, prompt_key, store_response
+from app.ai_schemas import (
+    level_explanations_adapter, match_explanations, quiz_adapter, repair_level_explanations, repair_quiz,
+    repair_roadmap_header, repair_roadmap_level, repaired_quiz_adapter, roadmap_header_adapter,
+    roadmap_level_adapter, validate_ai_json,
+)
+from app.llm_usage import current_user_id, record_usage, seconds_until_reset, tokens_used_today
 
 
+# One client per worker process: pooled keep-alive connections are reused
+# across calls instead of a new TLS handshake per generation.
+_client: Optional[AsyncOpenAI] = None
 
-async def generate_roadmap(goal_description: str) -> Dict[str, Any]:
+
+def _http2_available() -> bool:
+    if not settings.openai_http2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("openai_http2 is enabled but the h2 package is not installed, using HTTP/1.1", event="openai_http2_unavailable")
+        return False
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Return the shared OpenAI client, creating it on first use"""
+    global _client
+    if _client is None:
+        http_client = DefaultAsyncHttpxClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections,
+                keepalive_expiry=settings.openai_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(settings.openai_timeout_seconds, connect=settings.openai_connect_timeout_seconds),
+        )
+        _client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=http_client,
+            max_retries=0,  # retries, backoff and the circuit breaker live in _call_with_resilience
+        )
+    return _client
+
+
+async def close_openai_client():
+    """Close the shared client and its connection pool (app shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+
+# ========== LLM backends ==========
+
+class LLMStream:
+    """Text deltas of a streamed completion; token counts are known once it ends"""
+    prompt_tokens = 0
+    completion_tokens = 0
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def close(self):
+        """Release the underlying connection (also when abandoned midway)"""
+
+
+class LLMBackend:
     """
-    Generate a structured learning roadmap from user's goal description using OpenAI.
-    
-    Args:
-        goal_description: User's learning goal (e.g., "I want to learn Python for data science")
-    
-    Returns:
-        Dict containing: title, category, difficulty, and roadmap with levels
-    
+    Where chat completions come from, selected by settings.llm_backend.
+
+    request holds the chat.completions.create() arguments (model, messages,
+    temperature, response_format, max_tokens); purpose tags what the call is
+    for (roadmap_skeleton, level_explanation, quiz). Failures are raised as
+    the openai SDK's exception types, so retries, the circuit breaker and the
+    error mapping treat every backend alike.
+    """
+    name = "base"
+
+    async def complete(self, request: Dict[str, Any], purpose: str, timeout: float) -> Tuple[str, int, int]:
+        """Return (content, prompt_tokens, completion_tokens)"""
+        raise NotImplementedError
+
+    async def stream(self, request: Dict[str, Any], purpose: str, timeout: float) -> LLMStream:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class _OpenAIStream(LLMStream):
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for chunk in self._stream:
+            if getattr(chunk, "usage", None):
+                self.prompt_tokens = chunk.usage.prompt_tokens
+                self.completion_tokens = chunk.usage.completion_tokens
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+
+    async def close(self):
+        await self._stream.close()
+
+
+class OpenAIBackend(LLMBackend):
+    """The OpenAI API through the shared client"""
+    name = "openai"
+
+    async def complete(self, request: Dict[str, Any], purpose: str, timeout: float) -> Tuple[str, int, int]:
+        response = await get_openai_client().chat.completions.create(**request, timeout=timeout)
+        usage = response.usage
+        return (
+            response.choices[0].message.content,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+        )
+
+    async def stream(self, request: Dict[str, Any], purpose: str, timeout: float) -> LLMStream:
+        stream = await get_openai_client().chat.completions.create(
+            **request, timeout=timeout, stream=True, stream_options={"include_usage": True}
+        )
+        return _OpenAIStream(stream)
+
+    async def close(self):
+        await close_openai_client()
+
+
+_backend: Optional[LLMBackend] = None
+
+
+def get_llm_backend() -> LLMBackend:
+    """Return the configured LLM backend (openai, or fake for offline load tests)"""
+    global _backend
+    if _backend is None:
+        if settings.llm_backend == "fake":
+            from app.fake_llm import FakeLLMBackend
+            _backend = FakeLLMBackend()
+            logger.warning("Using the fake LLM backend, no real AI content is generated", event="llm_backend_fake")
+        elif settings.llm_backend == "openai":
+            _backend = OpenAIBackend()
+            get_openai_client()  # open the shared connection pool up front
+        else:
+            raise ValueError(f"Unknown llm_backend: {settings.llm_backend!r}")
+    return _backend
+
+
+async def close_llm_backend():
+    """Close the LLM backend (app shutdown)"""
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+
+
+
+class LLMError(Exception):
+    """
+    An LLM call failed in a way clients should see as an AI service error.
+
+    Subclasses carry the HTTP mapping (see the handler in main.py): status
+    code, error code, user-facing message and an optional Retry-After.
+    """
+    status_code = 503
+    code = "AI_SERVICE_ERROR"
+    message = "AI service is temporarily unavailable. Please try again in a moment."
+
+    def __init__(self, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.retry_after = retry_after
+
+
+class LLMOverloadedError(LLMError):
+    """No LLM slot became available in time; returned to clients as 503 + Retry-After"""
+    code = "AI_SERVICE_BUSY"
+    message = "AI service is busy right now. Please try again in a moment."
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"LLM dispatcher overloaded ({reason})", retry_after)
+        self.reason = reason
+
+
+class LLMUnavailableError(LLMError):
+    """The provider kept failing (429/5xx/connection errors) until retries or the deadline ran out"""
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    """The call did not finish within its deadline"""
+    status_code = 504
+    code = "AI_SERVICE_TIMEOUT"
+    message = "AI service took too long to respond. Please try again in a moment."
+
+
+class LLMCircuitOpenError(LLMUnavailableError):
+    """The circuit breaker is open: recent calls failed, so fail fast instead of waiting"""
+
+
+class LLMRequestError(LLMError):
+    """The provider rejected the request itself (4xx other than 429); retrying won't help"""
+    status_code = 502
+
+
+class LLMQuotaExceededError(LLMError):
+    """The user has spent their daily LLM token quota; Retry-After points at the reset"""
+    status_code = 429
+    code = "AI_QUOTA_EXCEEDED"
+    message = "You've used today's AI allowance. It resets at midnight UTC."
+
+
+async def _check_token_quota(priority: str):
+    """Raise LLMQuotaExceededError if the attributed user is out of tokens for today"""
+    user_id = current_user_id()
+    quota = settings.llm_daily_token_quota_premium if priority == "premium" else settings.llm_daily_token_quota_free
+    if user_id is None or not quota:
+        return
+    used = await tokens_used_today(user_id)
+    if used >= quota:
+        logger.warning("LLM token quota exceeded", user_id=user_id, used=used, quota=quota, event="llm_quota_exceeded")
+        raise LLMQuotaExceededError(f"User {user_id} used {used} of {quota} LLM tokens today", retry_after=seconds_until_reset())
+
+
+LLM_PRIORITIES = ("premium", "free")
+
+
+class LLMDispatcher:
+    """
+    Caps concurrent LLM calls in this worker process, serving premium users first.
+
+    At most max_concurrency calls run at once, and free-tier calls may only
+    use the slots not reserved for premium (premium_reserved), so premium
+    users always find capacity. Up to max_queue callers per tier wait for a
+    slot, each for at most queue_timeout seconds; anyone beyond that, or who
+    times out, gets LLMOverloadedError straight away instead of piling up
+    behind the provider's rate limits.
+
+    When a slot frees up, the longest waiter gets it - with premium waiters
+    counted as if they had arrived premium_boost seconds earlier. Premium
+    jumps the queue, but a free caller never waits more than premium_boost
+    behind premium callers who arrived after it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        premium_reserved: int = 0,
+        premium_boost: float = 0.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.premium_reserved = min(premium_reserved, max_concurrency - 1)
+        self.premium_boost = premium_boost
+        self.active = {priority: 0 for priority in LLM_PRIORITIES}
+        self._waiters: dict[str, deque[tuple[float, asyncio.Future]]] = {priority: deque() for priority in LLM_PRIORITIES}
+
+    @property
+    def queued(self) -> dict[str, int]:
+        return {priority: len(waiters) for priority, waiters in self._waiters.items()}
+
+    def _report(self):
+        metrics.set_llm_load(self.active, self.queued)
+
+    def _reject(self, priority: str, reason: str):
+        metrics.increment_llm_rejection(priority, reason)
+        logger.warning("LLM call rejected", priority=priority, reason=reason, active=self.active, queued=self.queued, event="llm_overloaded")
+        raise LLMOverloadedError(reason, settings.llm_retry_after_seconds)
+
+    def _can_start(self, priority: str) -> bool:
+        if sum(self.active.values()) >= self.max_concurrency:
+            return False
+        if priority == "free":
+            return self.active["free"] < self.max_concurrency - self.premium_reserved
+        return True
+
+    def _next_waiter(self) -> str | None:
+        """The tier whose head waiter should get the next free slot, if any"""
+        best, best_key = None, None
+        for priority, waiters in self._waiters.items():
+            if not waiters or not self._can_start(priority):
+                continue
+            key = waiters[0][0] - (self.premium_boost if priority == "premium" else 0)
+            if best_key is None or key < best_key:
+                best, best_key = priority, key
+        return best
+
+    def _wake(self):
+        """Hand free slots to waiters"""
+        while (priority := self._next_waiter()) is not None:
+            _, future = self._waiters[priority].popleft()
+            if future.done():
+                continue  # timed out or cancelled
+            self.active[priority] += 1
+            future.set_result(None)
+
+    def _release(self, priority: str):
+        self.active[priority] -= 1
+        self._wake()
+        self._report()
+
+    async def _acquire(self, priority: str):
+        if not self._waiters[priority] and self._can_start(priority):
+            self.active[priority] += 1  # a slot is free, no waiting
+            metrics.record_llm_wait(priority, 0.0)
+            return
+
+        if len(self._waiters[priority]) >= self.max_queue:
+            self._reject(priority, "queue_full")
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append((started, future))
+        self._report()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(priority, "timeout")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(priority)  # the slot was granted as we were cancelled
+            raise
+        finally:
+            if not future.done() or future.cancelled():
+                self._discard_waiter(priority, future)
+            self._report()
+        metrics.record_llm_wait(priority, (time.monotonic() - started) * 1000)
+
+    def _discard_waiter(self, priority: str, future: asyncio.Future):
+        waiters = self._waiters[priority]
+        for entry in waiters:
+            if entry[1] is future:
+                waiters.remove(entry)
+                break
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "free"):
+        """Hold one LLM slot for the duration of the block (including a streamed response)"""
+        await self._acquire(priority)
+        self._report()
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+
+llm_dispatcher = LLMDispatcher(
+    settings.llm_max_concurrency,
+    settings.llm_max_queue,
+    settings.llm_queue_timeout_seconds,
+    premium_reserved=settings.llm_premium_reserved,
+    premium_boost=settings.llm_premium_boost_seconds,
+)
+
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the LLM provider is degraded.
+
+    closed     calls go through; llm_breaker_failure_threshold consecutive
+               retryable failures (429/5xx/timeouts/connection errors) open it
+    open       calls raise LLMCircuitOpenError at once for cooldown seconds
+    half_open  one probe call goes through; success closes the breaker,
+               failure opens it again
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning("LLM circuit breaker state changed", old_state=self.state, state=state, event="llm_breaker_state")
+            self.state = state
+            metrics.set_llm_breaker_state(state)
+
+    def before_call(self):
+        """Raise LLMCircuitOpenError unless a call may go to the provider now"""
+        if self.state == "open":
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise LLMCircuitOpenError("LLM circuit breaker is open", retry_after=math.ceil(remaining))
+            self._set_state("half_open")
+        if self.state == "half_open":
+            if self._probing:
+                raise LLMCircuitOpenError("LLM circuit breaker is probing the provider", retry_after=math.ceil(self.cooldown))
+            self._probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._set_state("closed")
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+    def release(self):
+        """The call ended without telling anything about the provider (e.g. cancelled)"""
+        self._probing = False
+
+
+llm_breaker = CircuitBreaker(settings.llm_breaker_failure_threshold, settings.llm_breaker_cooldown_seconds)
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code >= 500 or error.status_code == 408)
+
+
+def _backoff_delay(attempt: int, error: BaseException) -> float:
+    """Exponential backoff with jitter, never shorter than the provider's Retry-After"""
+    delay = min(settings.llm_backoff_max_seconds, settings.llm_backoff_base_seconds * 2 ** (attempt - 1))
+    delay = random.uniform(delay / 2, delay)
+    if isinstance(error, openai.APIStatusError):
+        try:
+            delay = max(delay, float(error.response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return delay
+
+
+T = TypeVar("T")
+
+
+async def _call_with_resilience(call: Callable[[float], Awaitable[T]], attempt_timeout: float, deadline: float) -> T:
+    """
+    Run call(timeout) with retries, per-attempt timeouts and the circuit breaker.
+
+    Each attempt gets min(attempt_timeout, time left before deadline), a
+    loop.time() value. Retryable failures back off and retry up to
+    llm_max_attempts while the deadline allows; other errors propagate at once.
+
     Raises:
-        ValueError: If AI response cannot be parsed or is invalid
-        Exception: If OpenAI API call fails
+        LLMCircuitOpenError: The breaker is open
+        LLMTimeoutError: The last attempt timed out or the deadline ran out
+        LLMUnavailableError: Retryable failures exhausted the attempts
+        LLMRequestError: The provider rejected the request (4xx)
+    """
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        timeout = min(attempt_timeout, deadline - loop.time())
+        if timeout <= 0:
+            raise LLMTimeoutError("LLM call deadline exceeded", retry_after=settings.llm_retry_after_seconds)
+        llm_breaker.before_call()
+        attempt += 1
+        try:
+            async with asyncio.timeout(timeout):
+                result = await call(timeout)
+        except Exception as e:
+            if not _is_retryable(e):
+                llm_breaker.release()
+                if isinstance(e, openai.APIStatusError):
+                    raise LLMRequestError(f"LLM request rejected ({e.status_code}): {e}") from e
+                raise
+
+            llm_breaker.record_failure()
+            timed_out = isinstance(e, (TimeoutError, openai.APITimeoutError))
+            if timed_out:
+                metrics.increment_llm_resilience("timeouts")
+            delay = _backoff_delay(attempt, e)
+            if attempt >= settings.llm_max_attempts or loop.time() + delay >= deadline:
+                error = LLMTimeoutError if timed_out else LLMUnavailableError
+                raise error(f"LLM call failed after {attempt} attempt(s): {e!r}", retry_after=settings.llm_retry_after_seconds) from e
+
+            logger.warning("Retrying LLM call", attempt=attempt, delay_seconds=round(delay, 2), error=repr(e), event="llm_retry")
+            metrics.increment_llm_resilience("retries")
+            await asyncio.sleep(delay)
+        except BaseException:
+            llm_breaker.release()
+            raise
+        else:
+            llm_breaker.record_success()
+            return result
+
+
+async def _ndjson_lines(deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Reassemble streamed completion deltas into complete, non-empty lines"""
+    buffer = ""
+    async for delta in deltas:
+        buffer += delta
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def _chat_completion(
+    request: Dict[str, Any],
+    parse: Callable[[str], T],
+    purpose: str,
+    priority: str = "free",
+    cache: bool = True,
+    cache_variant: int = 0,
+) -> T:
     """
-    client = AsyncOpenAI(api_key=settings.openai_api_key)
+    Run a chat completion through the LLM response cache and return parse(content).
 
+    A hit skips the LLM and its concurrency slot. A miss goes to the LLM via
+    _call_with_resilience, the request's timeout applying per attempt within
+    llm_deadline_seconds overall, and is stored only once parse() has
+    accepted it, so a malformed answer is never replayed.
+    cache=False always asks the LLM (and stores nothing).
+
+    Usage is recorded under purpose (see app.llm_usage), and a miss is
+    refused up front once the user is over their daily token quota.
+    """
+    cache = cache and settings.llm_cache_enabled
+    key = prompt_key(request, cache_variant) if cache else None
+    if cache:
+        content = await get_cached_response(key)
+        if content is not None:
+            await record_usage(purpose, request["model"], cache_hit=True)
+            return parse(content)
+
+    await _check_token_quota(priority)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.llm_deadline_seconds
+    request = dict(request)
+    attempt_timeout = request.pop("timeout", settings.openai_timeout_seconds)
+
+    backend = get_llm_backend()
+    async with llm_dispatcher.slot(priority):
+        started = loop.time()
+        content, prompt_tokens, completion_tokens = await _call_with_resilience(
+            lambda timeout: backend.complete(request, purpose, timeout),
+            attempt_timeout,
+            deadline,
+        )
+        latency_ms = (loop.time() - started) * 1000
+    await record_usage(purpose, request["model"], prompt_tokens, completion_tokens, latency_ms)
+
+    result = parse(content)
+    if cache:
+        await store_response(key, request["model"], content, completion_tokens)
+    return result
+
+
+async def _chat_completion_lines(
+    request: Dict[str, Any],
+    purpose: str,
+    priority: str = "free",
+    cache: bool = True,
+    cache_variant: int = 0,
+    cacheable: Callable[[], bool] = lambda: True,
+) -> AsyncIterator[str]:
+    """
+    Streamed counterpart of _chat_completion: yield the completion line by line.
+
+    Only opening the stream is retried. The request's timeout bounds each
+    read (a stalled stream fails instead of hanging), llm_deadline_seconds
+    the whole stream.
+
+    A hit replays the cached lines. A miss is stored only when the caller has
+    consumed every line without raising and cacheable() still holds then
+    (the caller's way to refuse a completion it had to drop lines from).
+    Usage and the token quota work as in _chat_completion; a stream that
+    is abandoned midway is recorded with the tokens reported so far.
+    """
+    cache = cache and settings.llm_cache_enabled
+    key = prompt_key(request, cache_variant) if cache else None
+    if cache:
+        content = await get_cached_response(key)
+        if content is not None:
+            await record_usage(purpose, request["model"], cache_hit=True)
+            for line in content.split("\n"):
+                yield line
+            return
+
+    await _check_token_quota(priority)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.llm_deadline_seconds
+    request = dict(request)
+    attempt_timeout = request.pop("timeout", settings.openai_timeout_seconds)
+
+    backend = get_llm_backend()
+    lines = []
+    async with llm_dispatcher.slot(priority):
+        # Opening the stream is retried; once lines have been handed out it can't be
+        started = loop.time()
+        stream = await _call_with_resilience(
+            lambda timeout: backend.stream(request, purpose, timeout),
+            attempt_timeout,
+            deadline,
+        )
+        try:
+            async for line in _ndjson_lines(stream):
+                if loop.time() > deadline:
+                    raise LLMTimeoutError("LLM stream deadline exceeded", retry_after=settings.llm_retry_after_seconds)
+                lines.append(line)
+                yield line
+        except (httpx.HTTPError, openai.APIError) as e:
+            llm_breaker.record_failure()
+            raise LLMUnavailableError(f"LLM stream failed: {e!r}", retry_after=settings.llm_retry_after_seconds) from e
+        finally:
+            await stream.close()
+            await record_usage(
+                purpose, request["model"], stream.prompt_tokens, stream.completion_tokens, (loop.time() - started) * 1000
+            )
+
+    if cache and cacheable():
+        await store_response(key, request["model"], "\n".join(lines), stream.completion_tokens)
+
+
+async def stream_roadmap_skeleton(
+    goal_description: str, priority: str = "free", cache_variant: int = 0
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream a roadmap skeleton from OpenAI: titles and topic names, no explanations.
+
+    The model is asked for newline-delimited JSON: a header line followed by
+    one line per level. Lines are parsed as tokens arrive, so each level is
+    available as soon as its line is complete. Leaving out the explanations
+    keeps the completion short enough not to be truncated on big roadmaps.
+
+    cache_variant picks a distinct LLM cache entry for the same description
+    (see llm_cache.prompt_key), so each roadmap library variant is generated.
+
+    Lines are validated against app.ai_schemas; defects that can be repaired
+    are, and a level that can't be is dropped (levels are numbered by
+    position), so one bad line doesn't cost the whole roadmap. A completion
+    with dropped levels is not cached, so a retry asks the model again.
+
+    Yields:
+        ("header", {"title", "category", "difficulty", "roadmap": {"name"}}) once, then
+        ("level", {order, title, description, topics, xp_reward}) per level
+
+    Raises:
+        ValueError: If the header is invalid, or no level is usable
+        Exception: If OpenAI API call fails
+    """
     prompt = f"""You are an expert learning path designer. A user wants to achieve this goal:
 
 "{goal_description}"
 
-Generate a structured learning roadmap in JSON format. Follow these rules:
+Design a structured learning roadmap. Follow these rules:
 1. Create a clear, concise title for the goal
 2. Determine the category (e.g., Programming, Language, Business, Health, Art, etc.)
 3. Assess difficulty level: "beginner", "intermediate", or "advanced"
 4. Design an appropriate number of levels (typically 3-8 depending on complexity)
 5. Each level should have 3-7 key topics to learn
-6. Each topic should be an object with "name" and "completed" fields (all start as false)
+6. Each topic is an object with "name" and "completed": false (no explanations)
 7. Assign XP rewards (100-300 based on difficulty)
-8. First level should always be unlocked
-
-Return ONLY valid JSON in this exact structure:
-{{
-    "title": "Clean, professional goal title",
-    "category": "Main category",
-    "difficulty": "beginner|intermediate|advanced",
-    "roadmap": {{
-        "name": "Descriptive roadmap name",
-        "levels": [
-            {{
-                "order": 1,
-                "title": "Level title",
-                "description": "What the user will learn in this level",
-                "topics": [
-                    {{
-                        "name": "Topic name 1",
-                        "explanation": "Clear, detailed explanation (4-6 sentences) covering: (1) What this topic is and its core concepts, (2) Why it's important for achieving the goal, (3) A practical real-world example demonstrating the concept, (4) What the learner will be able to do after mastering it. Use simple language and concrete examples to make it easy to understand.",
-                        "completed": false
-                    }},
-                    {{
-                        "name": "Topic name 2",
-                        "explanation": "Clear, detailed explanation (4-6 sentences) with practical examples showing how this concept is used in real projects.",
-                        "completed": false
-                    }},
-                    {{
-                        "name": "Topic name 3",
-                        "explanation": "Clear, detailed explanation (4-6 sentences) with practical examples showing how this concept is used in real projects.",
-                        "completed": false
-                    }}
-                ],
-                "xp_reward": 100
-            }}
-        ]
-    }}
-}}
 
-Make it practical, actionable, and motivating. 
+Respond with newline-delimited JSON: one compact JSON object per line, nothing else.
+The FIRST line is the roadmap header:
+{{"title": "Clean, professional goal title", "category": "Main category", "difficulty": "beginner|intermediate|advanced", "roadmap_name": "Descriptive roadmap name"}}
+Then ONE line per level, in order:
+{{"order": 1, "title": "Level title", "description": "What the user will learn in this level", "topics": [{{"name": "Topic name", "completed": false}}], "xp_reward": 100}}
 
-IMPORTANT for explanations:
-- Write in simple, clear language suitable for beginners
-- Include concrete examples (e.g., "like building a login form" or "such as calculating shopping cart totals")
-- Explain WHY the topic matters, not just WHAT it is
-- Show how it applies to real-world projects
-- Each explanation should be 4-6 sentences and educational
+Make it practical, actionable, and motivating.
 
-NO markdown, NO code blocks, NO extra text outside the JSON, ONLY the JSON object."""
+NO markdown, NO code blocks, NO blank lines, NO text outside the JSON lines."""
 
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",  # Fast and cost-effective, or use "gpt-4" for higher quality
+        request = dict(
+            model="gpt-4o-mini",
             messages=[
                 {
                     "role": "system",
-                    "content": "You are a learning path expert. Always respond with valid JSON only."
+                    "content": "You are a learning path expert. Always respond with newline-delimited JSON only."
                 },
                 {
                     "role": "user",
                     "content": prompt
                 }
             ],
-            max_tokens=2000,
-            temperature=0.7,
-            response_format={"type": "json_object"}  # Forces JSON output
+            max_tokens=1500,
+            timeout=settings.openai_roadmap_timeout_seconds,
+            temperature=0.7
         )
 
-        content = response.choices[0].message.content
-
-        # Parse JSON
-        try:
-            roadmap_data = json.loads(content)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"AI returned invalid JSON: {str(e)}")
-
-        # Validate required keys
-        required_keys = ["title", "category", "difficulty", "roadmap"]
-        missing_keys = [key for key in required_keys if key not in roadmap_data]
-        if missing_keys:
-            raise ValueError(f"AI response missing required keys: {missing_keys}")
-
-        # Validate roadmap structure
-        if "name" not in roadmap_data["roadmap"]:
-            raise ValueError("Roadmap missing 'name' field")
-        if "levels" not in roadmap_data["roadmap"]:
-            raise ValueError("Roadmap missing 'levels' field")
-
-        # Validate difficulty
-        valid_difficulties = ["beginner", "intermediate", "advanced"]
-        if roadmap_data["difficulty"] not in valid_difficulties:
-            raise ValueError(f"Invalid difficulty '{roadmap_data['difficulty']}'. Must be one of: {valid_difficulties}")
-
-        # Validate levels
-        levels = roadmap_data["roadmap"]["levels"]
-        if not levels or len(levels) == 0:
+        header_sent = False
+        levels_sent = 0
+        levels_dropped = 0
+
+        async for line in _chat_completion_lines(
+            request, "roadmap_skeleton", priority=priority, cache_variant=cache_variant,
+            cacheable=lambda: levels_dropped == 0
+        ):
+            if not header_sent:
+                header = validate_ai_json("roadmap header", line, roadmap_header_adapter, repair_roadmap_header)
+                header_sent = True
+                yield "header", {
+                    "title": header.title,
+                    "category": header.category,
+                    "difficulty": header.difficulty,
+                    "roadmap": {"name": header.roadmap_name},
+                }
+                continue
+
+            order = levels_sent + 1
+            try:
+                level = validate_ai_json(
+                    "roadmap level", line, roadmap_level_adapter,
+                    lambda data, fixes: repair_roadmap_level(data, order, fixes)
+                )
+            except ValueError as e:
+                logger.warning("Dropping invalid roadmap level", order=order, error=str(e), event="roadmap_level_dropped")
+                levels_dropped += 1
+                continue
+            level.order = order
+            levels_sent += 1
+            yield "level", level.model_dump()
+
+        if levels_sent == 0:
             raise ValueError("Roadmap must have at least one level")
 
-        # Validate each level has required fields
-        required_level_keys = ["order", "title", "description", "topics", "xp_reward"]
-        for i, level in enumerate(levels):
-            missing = [key for key in required_level_keys if key not in level]
-            if missing:
-                raise ValueError(f"Level {i+1} missing required keys: {missing}")
+    except LLMError:
+        raise
+    except ValueError as e:
+        logger.error("Validation error in roadmap streaming", error=str(e))
+        raise
+    except Exception as e:
+        logger.error("Failed to stream roadmap", error=str(e), event="roadmap_generation_error")
+        raise Exception(f"Failed to generate roadmap: {str(e)}")
+
+
+async def explain_level(goal_title: str, level: Dict[str, Any], priority: str = "free") -> Dict[str, Any]:
+    """
+    Generate the topic explanations for one roadmap level.
+
+    Args:
+        goal_title: Title of the goal the level belongs to
+        level: Level dict with title, description and topics
+        priority: LLM scheduling tier, "premium" or "free"
+
+    Returns:
+        A copy of the level whose topics carry an "explanation"
+
+    Raises:
+        ValueError: If AI response cannot be parsed or doesn't cover the topics
+        Exception: If OpenAI API call fails
+    """
+    topic_names = [topic["name"] for topic in level.get("topics") or []]
+    topics_text = "\n".join(f"- {name}" for name in topic_names)
+
+    prompt = f"""You are an expert teacher. A learner working towards "{goal_title}" is on this level:
+
+Level: {level["title"]}
+{level.get("description") or ""}
+
+Topics:
+{topics_text}
+
+Write an explanation for EACH topic above (4-6 sentences) covering: (1) what the topic is and its core concepts, (2) why it's important for achieving the goal, (3) a practical real-world example demonstrating the concept, (4) what the learner will be able to do after mastering it.
+
+IMPORTANT for explanations:
+- Write in simple, clear language suitable for beginners
+- Include concrete examples (e.g., "like building a login form" or "such as calculating shopping cart totals")
+- Explain WHY the topic matters, not just WHAT it is
+
+Return ONLY valid JSON in this exact structure, with the topics in the same order:
+{{
+    "topics": [
+        {{"name": "Topic name", "explanation": "..."}}
+    ]
+}}
+
+NO markdown, NO code blocks, NO extra text outside the JSON, ONLY the JSON object."""
+
+    def parse(content: str) -> List[str]:
+        # Strict validation, repairing recoverable defects (see app.ai_schemas)
+        explained = validate_ai_json("level explanations", content, level_explanations_adapter, repair_level_explanations)
+        return match_explanations(explained, topic_names)
 
-        return roadmap_data
+    try:
+        explained = await _chat_completion(
+            dict(
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a learning path expert. Always respond with valid JSON only."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                max_tokens=200 * max(len(topic_names), 1),
+                timeout=settings.openai_roadmap_timeout_seconds,
+                temperature=0.7,
+                response_format={"type": "json_object"}
+            ),
+            parse,
+            "level_explanation",
+            priority=priority
+        )
 
+        level = copy.deepcopy(level)
+        for topic, explanation in zip(level["topics"], explained):
+            topic["explanation"] = explanation
+        return level
+
+    except LLMError:
+        raise
     except ValueError as e:
-        logger.error("Validation error in roadmap generation", error=str(e))
-        # Re-raise validation errors
+        logger.error("Validation error in level explanation", error=str(e), level=level.get("title"))
         raise
     except Exception as e:
-        # Wrap other errors
-        logger.error("Failed to generate roadmap", error=str(e), event="roadmap_generation_error")
-        raise Exception(f"Failed to generate roadmap: {str(e)}")
-    
+        logger.error("Failed to explain level", error=str(e), level=level.get("title"), event="level_explanation_error")
+        raise Exception(f"Failed to explain level: {str(e)}")
+
 
+async def _explain_or_skip(goal_title: str, level: Dict[str, Any], priority: str) -> Dict[str, Any]:
+    """explain_level, falling back to the bare skeleton level on failure"""
+    try:
+        return await explain_level(goal_title, level, priority=priority)
+    except Exception:
+        logger.warning("Keeping level without explanations", level=level.get("title"), event="level_explanation_skipped")
+        return level
+
+
+async def stream_roadmap(
+    goal_description: str, priority: str = "free", cache_variant: int = 0
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Generate a roadmap skeleton-first, explaining only the first levels up front.
+
+    Phase 1 streams the skeleton (stream_roadmap_skeleton). Levels with
+    order <= roadmap_eager_explanation_levels get their explanation call
+    started as soon as their line arrives, running concurrently under the LLM
+    concurrency cap; later levels are yielded bare at once and explained when
+    they are unlocked (see app.explanations). Levels are yielded in completion
+    order (each carries its "order"). A level whose explanation call fails is
+    yielded without explanations rather than failing the roadmap.
+
+    Yields:
+        ("header", {...}) once, then ("level", {...}) per level
+
+    Raises:
+        ValueError / Exception: If the skeleton call fails (see stream_roadmap_skeleton)
+    """
+    header = None
+    tasks = []
+    try:
+        async for kind, data in stream_roadmap_skeleton(goal_description, priority=priority, cache_variant=cache_variant):
+            if kind == "header":
+                header = data
+                yield "header", data
+            elif data["order"] <= settings.roadmap_eager_explanation_levels:
+                tasks.append(asyncio.create_task(_explain_or_skip(header["title"], data, priority)))
+            else:
+                yield "level", data
+
+        for next_done in asyncio.as_completed(tasks):
+            yield "level", await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def generate_roadmap(goal_description: str, priority: str = "free", cache_variant: int = 0) -> Dict[str, Any]:
+    """
+    Generate a structured learning roadmap from user's goal description using OpenAI.
+    
+    Args:
+        goal_description: User's learning goal (e.g., "I want to learn Python for data science")
+        priority: LLM scheduling tier, "premium" or "free"
+        cache_variant: Distinct LLM cache entry for the same description (see stream_roadmap_skeleton)
+    
+    Returns:
+        Dict containing: title, category, difficulty, and roadmap with levels
+    
+    Raises:
+        ValueError: If AI response cannot be parsed or is invalid
+        Exception: If OpenAI API call fails
+    """
+    roadmap_data = None
+    levels = []
+    async for kind, data in stream_roadmap(goal_description, priority=priority, cache_variant=cache_variant):
+        if kind == "header":
+            roadmap_data = data
+        else:
+            levels.append(data)
 
+    roadmap_data["roadmap"]["levels"] = sorted(levels, key=lambda level: level["order"])
+    return roadmap_data
 
 
-async def generate_quiz_for_level(level_title: str, level_topics: list) -> Dict[str, Any]:
+async def generate_quiz_for_level(level_title: str, level_topics: list, priority: str = "free", cache: bool = True) -> Dict[str, Any]:
     """
     Generate a quiz based on level topics using OpenAI.
     
     Args:
         level_title: Title of the level
         level_topics: List of topic objects with 'name' field
+        priority: LLM scheduling tier, "premium" or "free"
+        cache: Serve an identical earlier prompt from the LLM cache (False for a fresh variant)
     
     Returns:
         Dict containing questions array with id, question, options, correct_answer
     """
-    client = AsyncOpenAI(api_key=settings.openai_api_key)
-    
     # Extract topic names
     topic_names = [topic["name"] for topic in level_topics] if level_topics else []
     topics_text = ", ".join(topic_names)
@@ -202,51 +958,37 @@ Return ONLY valid JSON in this exact structure:
 
 NO markdown, NO code blocks, NO explanations, ONLY the JSON object."""
 
+    def parse(content: str) -> Dict[str, Any]:
+        # Strict validation, repairing recoverable defects (see app.ai_schemas)
+        return validate_ai_json("quiz", content, quiz_adapter, repair_quiz, repaired_quiz_adapter).model_dump()
+
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a quiz generation expert. Always respond with valid JSON only."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            max_tokens=2000,
-            temperature=0.7,
-            response_format={"type": "json_object"}
+        return await _chat_completion(
+            dict(
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a quiz generation expert. Always respond with valid JSON only."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                max_tokens=2000,
+                timeout=settings.openai_quiz_timeout_seconds,
+                temperature=0.7,
+                response_format={"type": "json_object"}
+            ),
+            parse,
+            "quiz",
+            priority=priority,
+            cache=cache
         )
-
-        content = response.choices[0].message.content
-        
-        # Parse JSON
-        try:
-            quiz_data = json.loads(content)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"AI returned invalid JSON: {str(e)}")
-        
-        # Validate structure
-        if "questions" not in quiz_data:
-            raise ValueError("AI response missing 'questions' field")
-        
-        if len(quiz_data["questions"]) == 0:
-            raise ValueError("AI generated no questions")
-        
-        # Validate each question
-        required_keys = ["id", "question", "options", "correct_answer"]
-        for i, q in enumerate(quiz_data["questions"]):
-            missing = [key for key in required_keys if key not in q]
-            if missing:
-                raise ValueError(f"Question {i+1} missing required keys: {missing}")
-            
-            if len(q["options"]) != 4:
-                raise ValueError(f"Question {i+1} must have exactly 4 options")
-        
-        return quiz_data
     
+    except LLMError:
+        raise
     except ValueError as e:
         logger.error("Validation error in quiz generation", error=str(e))
         # Re-raise validation errors
@@ -1,44 +1,462 @@
+import asyncio
+import json
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
 import redis
-from typing import Optional
+import redis.asyncio as aioredis
 
 
 from app.config import settings
 from app.logger import logger
-# Initialize Redis client
-redis_client = redis.Redis.from_url(
+# Shared, bounded connection pool. BlockingConnectionPool makes callers wait
+# (up to redis_pool_timeout) for a free connection instead of opening new ones.
+connection_pool = aioredis.BlockingConnectionPool.from_url(
     settings.redis_url,
+    max_connections=settings.redis_max_connections,
+    timeout=settings.redis_pool_timeout,
+    socket_timeout=settings.redis_socket_timeout,
+    socket_connect_timeout=settings.redis_socket_timeout,
+    health_check_interval=30,
     decode_responses=True
 )
 
+# Initialize Redis client
+redis_client = aioredis.Redis(connection_pool=connection_pool)
+
+# Pub/sub channel used to tell every worker to drop keys from its local tier
+INVALIDATION_CHANNEL = "cache:invalidate"
+_CLEAR_ALL = "*"
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL.
+
+    Holds already-decoded Python objects so hot reads skip both the Redis
+    round trip and json.loads. Each worker has its own instance; cross-worker
+    consistency comes from pub/sub invalidation (see run_invalidation_listener).
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Return (hit, value). Expired entries count as a miss and are dropped."""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: int | None = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LocalCache(settings.local_cache_max_entries, settings.local_cache_ttl_seconds)
+
+
+# Key namespaces. Everything written through this module lives under
+# CACHE_PREFIX so clear_cache() never touches rate-limit counters or locks.
+CACHE_PREFIX = "cache:"
+TAG_PREFIX = "cache-tag:"
+
+
+def _redis_key(key: str) -> str:
+    return f"{CACHE_PREFIX}{key}"
+
+def _fresh_key(key: str) -> str:
+    return f"{CACHE_PREFIX}{key}:fresh"
+
+def _tag_key(tag: str) -> str:
+    return f"{TAG_PREFIX}{tag}"
+
+def _add_tags(pipe, key: str, tags: Iterable[str], expire: int):
+    """Queue the commands registering key under each tag"""
+    for tag in tags:
+        pipe.sadd(_tag_key(tag), key)
+        # a tag set must outlive the keys it points at
+        pipe.expire(_tag_key(tag), max(expire, settings.cache_tag_ttl_seconds))
+
+
 # Cache utility functions
-def get_cache(key: str) -> Optional[str]:
+async def get_cache(key: str) -> Optional[str]:
     """Get value from cache"""
     try:
-        return redis_client.get(key)
+        return await redis_client.get(_redis_key(key))
     except redis.RedisError:
         logger.warning("Redis error on get_cache, cache may be deleted or expired", exc_info=True, event="cache_miss", key=key)
         return None
 
-def set_cache(key: str, value: str, expire: int = 3600) -> bool:
-    """Set value in cache with expiration time in seconds"""
+async def set_cache(key: str, value: str, expire: int = 3600, tags: Iterable[str] = ()) -> bool:
+    """Set value in cache with expiration time in seconds, registered under tags"""
     try:
-        return redis_client.setex(key, expire, value)
+        pipe = redis_client.pipeline()
+        pipe.setex(_redis_key(key), expire, value)
+        _add_tags(pipe, key, tags, expire)
+        results = await pipe.execute()
+        return bool(results[0])
     except redis.RedisError:
         logger.error("Redis error on set_cache", exc_info=True, event="cache_set_error", key=key, value=value)
         return False
 
-def delete_cache(key: str) -> bool:
-    """Delete key from cache"""
+async def get_json(key: str) -> Any:
+    """Get a decoded value, checking the in-process tier before Redis"""
+    hit, value = local_cache.get(key)
+    if hit:
+        return value
+
+    cached = await get_cache(key)
+    if cached is None:
+        return None
+    value = json.loads(cached)
+    local_cache.set(key, value)
+    return value
+
+async def set_json(key: str, value: Any, expire: int = 3600, tags: Iterable[str] = ()) -> bool:
+    """Store a JSON-serializable value in Redis and the in-process tier"""
+    local_cache.set(key, value, expire)
+    return await set_cache(key, json.dumps(value), expire=expire, tags=tags)
+
+async def _publish_invalidation(key: str):
     try:
-        return redis_client.delete(key) > 0
+        await redis_client.publish(INVALIDATION_CHANNEL, key)
+    except redis.RedisError:
+        logger.warning("Redis error on cache invalidation publish", exc_info=True, event="cache_invalidate_error", key=key)
+
+async def delete_cache(key: str) -> bool:
+    """Delete key from cache (Redis and every worker's local tier)"""
+    local_cache.delete(key)
+    try:
+        deleted = await redis_client.delete(_redis_key(key), _fresh_key(key)) > 0
     except redis.RedisError:
         logger.warning("Redis error on delete_cache or auto deleted by TTL expiration", exc_info=True, event="cache_delete_error", key=key)
-        return False
+        deleted = False
+    await _publish_invalidation(key)
+    return deleted
+
+async def invalidate_tags(*tags: str, stale: bool = False) -> int:
+    """
+    Invalidate every key registered under any of the given tags.
 
-def clear_cache() -> bool:
-    """Clear all cache"""
+    With stale=True only the soft TTL of computed keys is expired (see
+    mark_stale): values stay readable while they refresh. Otherwise the keys
+    and the tag sets are deleted. All Redis work is pipelined - one round trip
+    to read the tag sets, one to delete and broadcast. Returns the number of
+    keys invalidated.
+    """
+    if not tags:
+        return 0
     try:
-        return redis_client.flushdb()
+        pipe = redis_client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.smembers(_tag_key(tag))
+        members = await pipe.execute()
+        keys = set().union(*members)
+
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            if stale:
+                pipe.delete(_fresh_key(key))
+            else:
+                pipe.delete(_redis_key(key), _fresh_key(key))
+            pipe.publish(INVALIDATION_CHANNEL, key)
+        if not stale:
+            pipe.delete(*[_tag_key(tag) for tag in tags])
+        await pipe.execute()
+    except redis.RedisError:
+        logger.error("Redis error on invalidate_tags", exc_info=True, event="cache_invalidate_error", tags=tags)
+        return 0
+
+    for key in keys:
+        local_cache.delete(key)
+    return len(keys)
+
+async def clear_cache() -> bool:
+    """
+    Clear all cached values and tag sets.
+
+    Only the cache namespaces are scanned and deleted (in pipelined batches);
+    rate-limit counters and other keys in the same Redis db are left alone.
+    """
+    local_cache.clear()
+    try:
+        for pattern in (f"{CACHE_PREFIX}*", f"{TAG_PREFIX}*"):
+            batch = []
+            async for redis_key in redis_client.scan_iter(match=pattern, count=500):
+                batch.append(redis_key)
+                if len(batch) >= 500:
+                    await redis_client.delete(*batch)
+                    batch = []
+            if batch:
+                await redis_client.delete(*batch)
     except redis.RedisError:
         logger.error("Redis error on clear_cache", exc_info=True, event="cache_clear_error")
-        return False
\ No newline at end of file
+        return False
+    await _publish_invalidation(_CLEAR_ALL)
+    return True
+
+
+# ========== Single-flight rebuilds ==========
+
+# Deletes the lock only if we still own it (the token matches)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# One asyncio.Lock per key being rebuilt in this worker; entries vanish with their last user
+_local_rebuild_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+async def _acquire_rebuild_lock(key: str, token: str) -> bool:
+    try:
+        return bool(await redis_client.set(
+            f"lock:{key}", token, nx=True, px=settings.cache_rebuild_lock_seconds * 1000
+        ))
+    except redis.RedisError:
+        # Without Redis there is nothing to coordinate - let this caller rebuild
+        logger.warning("Redis error acquiring rebuild lock", exc_info=True, event="cache_lock_error", key=key)
+        return True
+
+async def _release_rebuild_lock(key: str, token: str):
+    try:
+        await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+    except redis.RedisError:
+        logger.warning("Redis error releasing rebuild lock", exc_info=True, event="cache_lock_error", key=key)
+
+# ========== Computed values with soft/hard TTL ==========
+#
+# A computed value lives under its key for the hard TTL. Freshness is tracked
+# by a separate `{key}:fresh` marker (holding the fresh-until timestamp) that
+# expires after the soft TTL, so mark_stale() is a single DEL and never has to
+# rewrite the payload.
+
+# Background refreshes in flight in this worker (strong refs keep tasks alive)
+_refresh_tasks: set[asyncio.Task] = set()
+_refreshing_keys: set[str] = set()
+
+
+async def _get_entry(key: str) -> tuple[Any, float] | None:
+    """Return (value, fresh_until) for a computed key, or None on a hard miss"""
+    hit, entry = local_cache.get(key)
+    if hit:
+        return entry
+    try:
+        raw, fresh_until = await redis_client.mget(_redis_key(key), _fresh_key(key))
+    except redis.RedisError:
+        logger.warning("Redis error on computed cache read", exc_info=True, event="cache_miss", key=key)
+        return None
+    if raw is None:
+        return None
+    entry = (json.loads(raw), float(fresh_until) if fresh_until else 0.0)
+    local_cache.set(key, entry)
+    return entry
+
+async def _store_entry(key: str, value: Any, expire: int, soft_ttl: int, tags: Iterable[str] = ()):
+    fresh_until = time.time() + soft_ttl
+    local_cache.set(key, (value, fresh_until), expire)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.setex(_redis_key(key), expire, json.dumps(value))
+        pipe.setex(_fresh_key(key), soft_ttl, fresh_until)
+        _add_tags(pipe, key, tags, expire)
+        # other workers drop their (possibly stale) local copy and re-read this one
+        pipe.publish(INVALIDATION_CHANNEL, key)
+        await pipe.execute()
+    except redis.RedisError:
+        logger.error("Redis error on computed cache write", exc_info=True, event="cache_set_error", key=key)
+
+async def mark_stale(key: str):
+    """
+    Expire the soft TTL of a computed key now.
+
+    Readers keep getting the current value while one of them refreshes it in
+    the background - use this instead of delete_cache when the value is merely
+    outdated rather than wrong.
+    """
+    local_cache.delete(key)
+    try:
+        await redis_client.delete(_fresh_key(key))
+    except redis.RedisError:
+        logger.warning("Redis error on mark_stale", exc_info=True, event="cache_delete_error", key=key)
+    await _publish_invalidation(key)
+
+async def _wait_for_entry(key: str, timeout: float) -> tuple[Any, float] | None:
+    """Poll for a value another worker is rebuilding; None if it doesn't show up in time"""
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        entry = await _get_entry(key)
+        if entry is not None:
+            return entry
+        delay = min(delay * 2, 0.25)
+    return None
+
+async def _is_fresh_in_redis(key: str) -> bool:
+    """Whether the shared tier holds a fresh value (the local tier may be behind)"""
+    try:
+        fresh_until = await redis_client.get(_fresh_key(key))
+    except redis.RedisError:
+        return False
+    return fresh_until is not None and float(fresh_until) > time.time()
+
+async def _refresh(key: str, compute: Callable[[], Awaitable[Any]], expire: int, soft_ttl: int, tags: Iterable[str]):
+    """
+    Background refresh of a stale key; skipped if another worker holds the
+    lock or has already refreshed it (then the local copy is just dropped).
+    """
+    token = uuid.uuid4().hex
+    try:
+        if not await _acquire_rebuild_lock(key, token):
+            return
+        try:
+            if await _is_fresh_in_redis(key):
+                local_cache.delete(key)
+                return
+            value = await compute()
+            await _store_entry(key, value, expire, soft_ttl, tags)
+        finally:
+            await _release_rebuild_lock(key, token)
+    except Exception:
+        logger.error("Background cache refresh failed", exc_info=True, event="cache_refresh_error", key=key)
+    finally:
+        _refreshing_keys.discard(key)
+
+def _schedule_refresh(key: str, compute: Callable[[], Awaitable[Any]], expire: int, soft_ttl: int, tags: Iterable[str]):
+    if key in _refreshing_keys:
+        return
+    _refreshing_keys.add(key)
+    task = asyncio.create_task(_refresh(key, compute, expire, soft_ttl, tags))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+async def get_or_compute(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    expire: int = 3600,
+    soft_ttl: int | None = None,
+    tags: Iterable[str] = (),
+) -> Any:
+    """
+    Return the cached value for key, rebuilding it at most once per cluster.
+
+    expire is the hard TTL; soft_ttl (defaults to expire) is how long the value
+    counts as fresh. Between the two the stale value is returned immediately
+    and a background refresh is scheduled (stale-while-revalidate). Only a
+    hard miss blocks the caller. The key is registered under tags for
+    invalidate_tags().
+
+    On a hard miss, concurrent callers in the same worker queue behind a local
+    lock; across workers a short Redis lock (SET NX PX) elects a single
+    rebuilder while the rest poll for its result. If the rebuilder doesn't
+    finish within cache_rebuild_wait_seconds, the waiter computes the value
+    itself.
+
+    compute must return a JSON-serializable value and must not depend on
+    request-scoped resources (e.g. the request's DB session), since it may run
+    after the response is sent.
+    """
+    soft_ttl = expire if soft_ttl is None else min(soft_ttl, expire)
+
+    entry = await _get_entry(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if fresh_until <= time.time():
+            _schedule_refresh(key, compute, expire, soft_ttl, tags)
+        return value
+
+    lock = _local_rebuild_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _local_rebuild_locks[key] = lock
+
+    async with lock:
+        # Another coroutine in this worker may have just rebuilt it
+        entry = await _get_entry(key)
+        if entry is not None:
+            return entry[0]
+
+        token = uuid.uuid4().hex
+        if await _acquire_rebuild_lock(key, token):
+            try:
+                value = await compute()
+                await _store_entry(key, value, expire, soft_ttl, tags)
+                return value
+            finally:
+                await _release_rebuild_lock(key, token)
+
+        entry = await _wait_for_entry(key, settings.cache_rebuild_wait_seconds)
+        if entry is not None:
+            return entry[0]
+
+        logger.warning("Timed out waiting for cache rebuild, computing locally", event="cache_rebuild_timeout", key=key)
+        value = await compute()
+        await _store_entry(key, value, expire, soft_ttl, tags)
+        return value
+
+
+async def run_invalidation_listener():
+    """
+    Subscribe to the invalidation channel and evict keys from the local tier.
+
+    Runs for the lifetime of the worker (started from the app lifespan). On
+    any Redis error the local tier is cleared - messages may have been missed -
+    and the subscription is re-established with a capped backoff.
+    """
+    backoff = 1
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            backoff = 1
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                key = message["data"]
+                if key == _CLEAR_ALL:
+                    local_cache.clear()
+                else:
+                    local_cache.delete(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Cache invalidation listener disconnected", exc_info=True, event="cache_listener_error", retry_in=backoff)
+            local_cache.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+async def close_cache():
+    """Close the Redis client and release pooled connections (app shutdown)"""
+    await redis_client.aclose()
+    await connection_pool.disconnect()
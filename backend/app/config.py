@@ -8,6 +8,48 @@ class Settings(BaseSettings):
     
     # Redis (Upstash)
     redis_url: str = "redis://localhost:6379"
+    redis_max_connections: int = 50  # per worker process
+    redis_pool_timeout: float = 5.0  # seconds to wait for a free pooled connection
+    redis_socket_timeout: float = 5.0
+
+    # In-process cache tier (per worker, in front of Redis)
+    local_cache_max_entries: int = 1024
+    local_cache_ttl_seconds: int = 30  # upper bound on staleness if an invalidation is missed
+
+    # Single-flight rebuilds of computed cache keys
+    cache_rebuild_lock_seconds: int = 10  # Redis lock TTL held by the rebuilding worker
+    cache_rebuild_wait_seconds: float = 5.0  # how long other callers wait for the rebuilt value
+    cache_tag_ttl_seconds: int = 60 * 60 * 24  # minimum lifetime of a tag -> keys index
+
+    # Content-addressed quiz cache
+    quiz_cache_variants: int = 3  # distinct quizzes kept per (title, topics)
+    quiz_cache_ttl_seconds: int = 60 * 60 * 24 * 7
+    quiz_cache_max_keys: int = 10000  # least recently used keys beyond this are evicted
+    quiz_prefetch_ttl_seconds: int = 60 * 60 * 24  # how long a pre-generated per-level quiz waits to be taken
+
+    # Shared roadmap library (reuse roadmaps across near-identical goal descriptions)
+    roadmap_library_policy: str = "variants"  # off | reuse (any match) | variants (build up to N, then reuse)
+    roadmap_library_variants: int = 3
+    roadmap_library_max_age_days: int = 90  # older templates are not reused
+
+    # Topic explanations (generated per level; the rest on unlock or first view)
+    roadmap_eager_explanation_levels: int = 1  # levels explained while the roadmap is generated
+    explanation_cache_ttl_seconds: int = 60 * 60 * 24 * 7
+
+    # LLM response cache (identical prompts reuse the stored completion)
+    llm_cache_enabled: bool = True
+    llm_cache_redis_ttl_seconds: int = 60 * 60 * 24  # hot tier
+    llm_cache_redis_max_keys: int = 5000  # least recently used keys beyond this are evicted
+    llm_cache_db_ttl_days: int = 30  # durable tier; older rows are not served
+    llm_cache_db_max_rows: int = 50000  # least recently used rows beyond this are deleted
+    llm_cache_db_prune_rate: float = 0.01  # share of writes that also prune the table
+
+    # Background jobs (roadmap generation)
+    job_workers: int = 4  # concurrent jobs per worker process
+    job_premium_boost_seconds: float = 30.0  # premium jobs are queued as if enqueued this much earlier
+    job_queue_max_size: int = 100  # pending jobs per worker process before new ones are refused
+    job_ttl_seconds: int = 60 * 60 * 24  # how long job status stays pollable
+    job_deadline_seconds: float = 180.0  # from enqueue; later the job counts as failed (also if its worker died)
     
     # JWT
     jwt_secret: str
@@ -17,6 +59,47 @@ class Settings(BaseSettings):
     
     # OpenAI
     openai_api_key: str
+    openai_max_connections: int = 100  # per worker process
+    openai_max_keepalive_connections: int = 20
+    openai_keepalive_expiry: float = 30.0  # seconds an idle connection is kept open
+    openai_http2: bool = False  # needs the h2 package
+    openai_connect_timeout_seconds: float = 5.0
+    openai_timeout_seconds: float = 60.0  # default for calls without their own timeout
+    openai_roadmap_timeout_seconds: float = 90.0  # per attempt
+    openai_quiz_timeout_seconds: float = 45.0  # per attempt
+
+    # LLM dispatch (per worker process)
+    llm_max_concurrency: int = 8  # OpenAI calls in flight at once
+    llm_max_queue: int = 32  # callers per tier allowed to wait for a slot; beyond that fail fast
+    llm_premium_reserved: int = 2  # slots free-tier calls can never take
+    llm_premium_boost_seconds: float = 5.0  # premium waiters are served as if they arrived this much earlier
+    llm_queue_timeout_seconds: float = 10.0  # max wait for a slot before giving up
+    llm_retry_after_seconds: int = 15  # Retry-After sent with the resulting 503
+
+    # LLM resilience (retries, deadline, circuit breaker)
+    llm_max_attempts: int = 3  # attempts per call on 429/5xx/timeouts/connection errors
+    llm_deadline_seconds: float = 120.0  # overall budget per call, retries and backoff included
+    llm_backoff_base_seconds: float = 1.0  # doubled per retry, jittered
+    llm_backoff_max_seconds: float = 10.0
+    llm_breaker_failure_threshold: int = 5  # consecutive failures that open the breaker
+    llm_breaker_cooldown_seconds: float = 30.0  # how long an open breaker fails fast before probing
+
+    # LLM backend: openai, or fake (local, schema-valid content, for offline load tests)
+    llm_backend: str = "openai"
+    llm_fake_base_latency_ms: float = 400.0  # time to first token
+    llm_fake_ms_per_token: float = 20.0  # generation speed; latency grows with output size
+    llm_fake_latency_distribution: str = "lognormal"  # fixed | uniform | lognormal
+    llm_fake_latency_spread: float = 0.3  # lognormal sigma, or +/- fraction for uniform
+    llm_fake_rate_limit_rate: float = 0.0  # share of calls failing with 429
+    llm_fake_server_error_rate: float = 0.0  # share of calls failing with 500
+    llm_fake_seed: int | None = None  # fixes latencies and errors too (content is always deterministic)
+
+    # LLM usage accounting (summed in memory, flushed to the llm_usage table)
+    llm_usage_flush_seconds: float = 30.0
+    llm_usage_flush_max_buckets: int = 500  # flush early once this many (day, endpoint, user, purpose, model) sums pile up
+    llm_daily_token_quota_free: int = 0  # prompt + completion tokens per user per UTC day; 0 = unlimited
+    llm_daily_token_quota_premium: int = 0
+
     stripe_api_key: str
     stripe_publishable_key: str
     stripe_webhook_secret: str
@@ -0,0 +1,140 @@
+"""
+Lazy, per-level topic explanations.
+
+Roadmaps are generated with explanations for the first
+roadmap_eager_explanation_levels levels only; most users never reach the
+last levels, so explaining them up front is wasted LLM spend. The rest are
+generated when a level is unlocked (prefetch_level_explanations, from
+submit_level_quiz) or when first requested (ensure_level_explanations), then
+written into the level's topics.
+
+Generated explanations are also cached in Redis by content (goal title, level
+title and topic names), so goals sharing a roadmap, e.g. from the roadmap
+library, only pay for each level once.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Dict, Optional
+
+import redis
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.ai_service import explain_level
+from app.cache import CACHE_PREFIX, redis_client
+from app.config import settings
+from app.db import async_session
+from app.logger import logger
+from app.models import Level, Roadmap
+from app.quiz_cache import quiz_content_key
+
+
+EXPLANATION_KEY_PREFIX = f"{CACHE_PREFIX}explanations:"
+
+# Explanations being generated in this worker, by level id (shared by unlock and request)
+_inflight: Dict[int, asyncio.Task] = {}
+
+
+def needs_explanations(topics: Optional[list]) -> bool:
+    return any(not topic.get("explanation") for topic in topics or [])
+
+
+def explanation_content_key(goal_title: str, level_title: str, level_topics: list) -> str:
+    """Hash of the goal title and the level's content (see quiz_content_key)"""
+    content = json.dumps([" ".join(goal_title.lower().split()), quiz_content_key(level_title, level_topics)])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+async def _cached_explanations(content_key: str) -> Optional[Dict[str, str]]:
+    try:
+        raw = await redis_client.get(f"{EXPLANATION_KEY_PREFIX}{content_key}")
+    except redis.RedisError:
+        logger.warning("Redis error reading explanation cache", exc_info=True, event="explanation_cache_error", key=content_key)
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def _store_explanations(content_key: str, explanations: Dict[str, str]):
+    try:
+        await redis_client.setex(
+            f"{EXPLANATION_KEY_PREFIX}{content_key}", settings.explanation_cache_ttl_seconds, json.dumps(explanations)
+        )
+    except redis.RedisError:
+        logger.error("Redis error writing explanation cache", exc_info=True, event="explanation_cache_error", key=content_key)
+
+
+async def _load_level(db, level_id: int) -> Optional[Level]:
+    result = await db.execute(
+        select(Level)
+        .options(selectinload(Level.roadmap).selectinload(Roadmap.goal))
+        .where(Level.id == level_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def _explain(level_id: int, priority: str) -> Optional[list]:
+    async with async_session() as db:
+        level = await _load_level(db, level_id)
+        if level is None:
+            return None
+        if not needs_explanations(level.topics):
+            return level.topics
+        goal_title = level.roadmap.goal.title
+        level_data = {"title": level.title, "description": level.description, "topics": level.topics}
+
+    content_key = explanation_content_key(goal_title, level_data["title"], level_data["topics"])
+    explanations = await _cached_explanations(content_key)
+    if explanations is None:
+        explained = await explain_level(goal_title, level_data, priority=priority)
+        explanations = {topic["name"]: topic["explanation"] for topic in explained["topics"] if topic.get("explanation")}
+        await _store_explanations(content_key, explanations)
+        logger.info("Level explained", level_id=level_id, event="level_explained")
+    else:
+        logger.info("Level explanations served from cache", level_id=level_id, event="explanation_cache_hit")
+
+    # Merge into the level as it is now: topics may have been completed during the LLM call
+    async with async_session() as db:
+        level = await db.get(Level, level_id, with_for_update=True)
+        if level is None:
+            return None
+        level.topics = [
+            {**topic, "explanation": topic.get("explanation") or explanations.get(topic["name"])}
+            for topic in level.topics or []
+        ]
+        await db.commit()
+        return level.topics
+
+
+def _start(level_id: int, priority: str) -> asyncio.Task:
+    task = _inflight.get(level_id)
+    if task is None:
+        task = asyncio.create_task(_explain(level_id, priority))
+        _inflight[level_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(level_id, None))
+    return task
+
+
+async def ensure_level_explanations(level_id: int, priority: str = "free") -> Optional[list]:
+    """
+    Make sure every topic of the level has an explanation and return the topics.
+
+    Joins a generation already in flight for the level (e.g. started on
+    unlock). The generation itself is shielded, so a client disconnecting
+    doesn't throw the result away.
+
+    Raises:
+        LLMError, ValueError, Exception: As explain_level
+    """
+    return await asyncio.shield(_start(level_id, priority))
+
+
+def _log_prefetch_failure(level_id: int, task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Level explanation pre-generation failed", error=str(task.exception()), event="explanation_prefetch_error", level_id=level_id)
+
+
+def prefetch_level_explanations(level_id: int, priority: str = "free"):
+    """Generate the level's explanations in the background (e.g. on unlock)"""
+    task = _start(level_id, priority)
+    task.add_done_callback(lambda task: _log_prefetch_failure(level_id, task))
@@ -0,0 +1,163 @@
+"""
+Local stand-in for the LLM provider (llm_backend = "fake").
+
+Returns schema-valid roadmap skeletons, level explanations and quizzes
+without any network access, so the whole app can be load-tested and
+profiled offline. Content is derived from a hash of the prompt, so the same
+prompt always gets the same answer. Latency and failures are simulated:
+
+- latency = (llm_fake_base_latency_ms + tokens * llm_fake_ms_per_token)
+  scaled by noise from llm_fake_latency_distribution (fixed, uniform or
+  lognormal, width llm_fake_latency_spread); streams spend the base latency
+  before the first chunk and the rest spread over the chunks
+- llm_fake_rate_limit_rate / llm_fake_server_error_rate of calls fail with
+  the openai SDK's RateLimitError (429) / InternalServerError (500), so
+  retries and the circuit breaker see exactly what a real outage looks like
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import httpx
+import openai
+
+from app.ai_service import LLMBackend, LLMStream
+from app.config import settings
+
+
+STAGES = ["Foundations", "Core Concepts", "Hands-on Practice", "Building Projects", "Advanced Topics", "Mastery"]
+CHUNK_SIZE = 24  # characters per streamed delta
+
+
+def _user_prompt(request: Dict[str, Any]) -> str:
+    return next((m["content"] for m in request["messages"] if m["role"] == "user"), "")
+
+
+def _prompt_tokens(request: Dict[str, Any]) -> int:
+    return math.ceil(sum(len(m["content"]) for m in request["messages"]) / 4)
+
+
+def _content_rng(request: Dict[str, Any]) -> random.Random:
+    digest = hashlib.sha256(json.dumps(request["messages"], sort_keys=True).encode()).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def _fake_roadmap_skeleton(prompt: str, rng: random.Random) -> str:
+    goal = re.search(r'"(.+?)"', prompt, re.DOTALL)
+    subject = " ".join((goal.group(1) if goal else "your goal").split())[:80]
+    title = subject[:1].upper() + subject[1:]
+    lines = [json.dumps({
+        "title": title,
+        "category": "General",
+        "difficulty": rng.choice(["beginner", "intermediate", "advanced"]),
+        "roadmap_name": f"{title} Roadmap",
+    })]
+    for order in range(1, rng.randint(3, 6) + 1):
+        stage = STAGES[order - 1]
+        lines.append(json.dumps({
+            "order": order,
+            "title": stage,
+            "description": f"{stage} for: {subject}",
+            "topics": [{"name": f"{stage} topic {i}", "completed": False} for i in range(1, rng.randint(3, 5) + 1)],
+            "xp_reward": min(100 + 50 * (order - 1), 300),
+        }))
+    return "\n".join(lines)
+
+
+def _fake_explanations(prompt: str) -> str:
+    section = re.search(r"^Topics:\n((?:- .+\n?)+)", prompt, re.MULTILINE)
+    topics = re.findall(r"^- (.+)$", section.group(1), re.MULTILINE) if section else []
+    return json.dumps({"topics": [
+        {"name": name, "explanation": f"{name} is a key step towards the goal. Practice it with a small example."}
+        for name in topics
+    ]})
+
+
+def _fake_quiz(prompt: str, rng: random.Random) -> str:
+    subject = re.search(r"learning about: (.+)", prompt)
+    subject = subject.group(1).strip() if subject else "this level"
+    return json.dumps({"questions": [
+        {
+            "id": i,
+            "question": f"Question {i} about {subject}?",
+            "options": [{"text": f"Option {value}", "value": value} for value in "ABCD"],
+            "correct_answer": rng.choice("ABCD"),
+        }
+        for i in range(1, 6)
+    ]})
+
+
+GENERATORS = {
+    "roadmap_skeleton": lambda prompt, rng: _fake_roadmap_skeleton(prompt, rng),
+    "level_explanation": lambda prompt, rng: _fake_explanations(prompt),
+    "quiz": lambda prompt, rng: _fake_quiz(prompt, rng),
+}
+
+
+def _synthetic_error(cls, status_code: int) -> openai.APIStatusError:
+    response = httpx.Response(status_code, request=httpx.Request("POST", "http://fake-llm.local/v1/chat/completions"))
+    return cls(f"Simulated {status_code} from the fake LLM backend", response=response, body=None)
+
+
+class _FakeStream(LLMStream):
+    def __init__(self, chunks: List[str], delay: float, prompt_tokens: int, completion_tokens: int):
+        self._chunks = chunks
+        self._delay = delay
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield chunk
+
+
+class FakeLLMBackend(LLMBackend):
+    name = "fake"
+
+    def __init__(self):
+        self.rng = random.Random(settings.llm_fake_seed)
+
+    def _noise(self) -> float:
+        spread = settings.llm_fake_latency_spread
+        distribution = settings.llm_fake_latency_distribution
+        if distribution == "uniform":
+            return self.rng.uniform(max(0.0, 1 - spread), 1 + spread)
+        if distribution == "lognormal":
+            return self.rng.lognormvariate(0, spread)
+        return 1.0
+
+    async def _respond(self, request: Dict[str, Any], purpose: str) -> Tuple[str, int, float, float]:
+        """Fail or build the content; returns (content, tokens, time to first token, generation time)"""
+        roll = self.rng.random()
+        if roll < settings.llm_fake_rate_limit_rate:
+            await asyncio.sleep(settings.llm_fake_base_latency_ms / 1000 / 4)
+            raise _synthetic_error(openai.RateLimitError, 429)
+        if roll < settings.llm_fake_rate_limit_rate + settings.llm_fake_server_error_rate:
+            await asyncio.sleep(settings.llm_fake_base_latency_ms / 1000)
+            raise _synthetic_error(openai.InternalServerError, 500)
+
+        content = GENERATORS[purpose](_user_prompt(request), _content_rng(request))
+        tokens = math.ceil(len(content) / 4)
+        noise = self._noise()
+        return (
+            content,
+            tokens,
+            settings.llm_fake_base_latency_ms / 1000 * noise,
+            tokens * settings.llm_fake_ms_per_token / 1000 * noise,
+        )
+
+    async def complete(self, request: Dict[str, Any], purpose: str, timeout: float) -> Tuple[str, int, int]:
+        content, tokens, first_token, generation = await self._respond(request, purpose)
+        await asyncio.sleep(first_token + generation)
+        return content, _prompt_tokens(request), tokens
+
+    async def stream(self, request: Dict[str, Any], purpose: str, timeout: float) -> LLMStream:
+        content, tokens, first_token, generation = await self._respond(request, purpose)
+        await asyncio.sleep(first_token)
+        chunks = [content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE)]
+        return _FakeStream(chunks, generation / len(chunks), _prompt_tokens(request), tokens)
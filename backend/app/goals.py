@@ -1,20 +1,30 @@
+import asyncio
+import json
+
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete, func, insert, select
 from sqlalchemy.orm import selectinload
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.attributes import flag_modified, set_committed_value
 from typing import Annotated, List
 from datetime import datetime, timezone
 
-from .db import get_db
+from .db import get_db, async_session
 from .models import User, Goal, Roadmap, Level, GoalStatus, DifficultyLevel, LevelStatus
-from .schemas import CreateGoalRequest, GoalResponse, GoalListItem
+from .schemas import CreateGoalRequest, GoalResponse, GoalListItem, GoalJobResponse, LevelResponse
 from .auth import get_current_user
-from .ai_service import generate_roadmap
+from .ai_service import LLMError, generate_roadmap
+from .roadmap_library import library_variant, lookup_roadmap, roadmap_parts, save_roadmap
 from .rate_limiter import check_rate_limit
 from .logger import logger
 from .metrics import metrics
 from .events import log_event
+from .quiz_cache import prefetch_level_quiz
+from .explanations import ensure_level_explanations, needs_explanations
+from .jobs import JobError, JobQueueFullError, JobStoreUnavailableError, enqueue_job, get_job
+from .llm_usage import set_usage_scope, usage_scope
+from .progression import adjust_progression_counters
 
 router = APIRouter(prefix="/goals", tags=["goals"])
 
@@ -41,29 +51,90 @@ def is_user_premium(user: User) -> bool:
     return expiry > now
 
 
-# Endpoint to create a new goal with AI-generated roadmap
-@router.post("", response_model=GoalResponse, status_code=201)
-async def create_goal(
-    request: Request,
-    incoming_request: CreateGoalRequest,
-    current_user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[AsyncSession, Depends(get_db)]
-):
+def llm_priority(user: User) -> str:
+    """AI scheduling tier for a user: premium subscribers get priority AI processing"""
+    return "premium" if is_user_premium(user) else "free"
+
+
+async def insert_goal(db: AsyncSession, user_id: int, description: str, ai_data: dict) -> Goal:
     """
-    Create a new goal with AI-generated roadmap.
-    
-    1. User sends goal description
-    2. AI generates structured roadmap
-    3. Store Goal + Roadmap + Levels in database
-    4. Return complete goal with roadmap
+    Insert a goal and its (still empty) roadmap with INSERT ... RETURNING (does not commit).
+
+    ai_data needs title, category, difficulty and roadmap.name; levels are
+    added with insert_levels.
     """
-    # Rate limiting: 15 goals per hour (AI generation is expensive)
-    await check_rate_limit(request, "create_goal", limit=15, window=360)
+    goal = await db.scalar(
+        insert(Goal)
+        .values(
+            user_id=user_id,
+            title=ai_data["title"],
+            description=description,
+            category=ai_data["category"],
+            difficulty_level=DifficultyLevel(ai_data["difficulty"]),
+            status=GoalStatus.NOT_STARTED
+        )
+        .returning(Goal)
+    )
 
-    # Check premium status and goal limits
-    # Free users: 2 goals maximum
-    # Premium users: unlimited goals
-    
+    roadmap = await db.scalar(
+        insert(Roadmap)
+        .values(goal_id=goal.id, name=ai_data["roadmap"]["name"])
+        .returning(Roadmap)
+    )
+
+    set_committed_value(roadmap, "levels", [])
+    set_committed_value(roadmap, "goal", goal)
+    set_committed_value(goal, "roadmap", roadmap)
+    return goal
+
+
+async def insert_levels(db: AsyncSession, roadmap: Roadmap, levels_data: list[dict]) -> list[Level]:
+    """
+    Insert levels into a roadmap as one multi-row INSERT ... RETURNING (does not commit).
+
+    The new rows are added to roadmap.levels without a reload.
+    """
+    levels = (await db.scalars(
+        insert(Level).returning(Level, sort_by_parameter_order=True),
+        [
+            {
+                "roadmap_id": roadmap.id,
+                "order": level_data["order"],
+                "title": level_data["title"],
+                "description": level_data["description"],
+                "topics": level_data["topics"],
+                "xp_reward": level_data["xp_reward"],
+                "status": LevelStatus.UNLOCKED if level_data["order"] == 1 else LevelStatus.LOCKED
+            }
+            for level_data in levels_data
+        ]
+    )).all()
+
+    set_committed_value(roadmap, "levels", sorted([*roadmap.levels, *levels], key=lambda level: level.order))
+    return levels
+
+
+async def persist_goal(db: AsyncSession, user_id: int, description: str, ai_data: dict) -> Goal:
+    """
+    Insert a goal, its roadmap and all of its levels (does not commit).
+
+    Three INSERT ... RETURNING statements - the levels go in as a single
+    multi-row insert. The returned ORM objects are wired together with
+    set_committed_value so the goal can be serialized as-is without a
+    refresh or selectinload round trip.
+    """
+    goal = await insert_goal(db, user_id, description, ai_data)
+    await insert_levels(db, goal.roadmap, ai_data["roadmap"]["levels"])
+    return goal
+
+
+async def enforce_goal_limit(db: AsyncSession, current_user: User):
+    """
+    Raise 403 if the user can't create another goal.
+
+    Free users: 2 goals maximum. Premium users: unlimited goals. An expired
+    premium flag is cleared on the way.
+    """
     result = await db.execute(
         select(Goal).where(Goal.user_id == current_user.id)
     )
@@ -119,114 +190,268 @@ async def create_goal(
                 "max_goals": 2
             }
         )
+
+
+# Endpoint to create a new goal with AI-generated roadmap
+@router.post("", response_model=GoalJobResponse, status_code=202)
+async def create_goal(
+    request: Request,
+    incoming_request: CreateGoalRequest,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)]
+):
+    """
+    Create a new goal with AI-generated roadmap.
     
+    1. User sends goal description
+    2. Quota is checked and a generation job is queued
+    3. Return 202 with the job id right away
+    4. A job worker generates the roadmap and stores Goal + Roadmap + Levels
+    """
+    # Rate limiting: 15 goals per hour (AI generation is expensive)
+    await check_rate_limit(request, "create_goal", limit=15, window=360)
+
+    await enforce_goal_limit(db, current_user)
+
+    # Generation runs in the job worker pool; the client polls /goals/jobs/{job_id}
     try:
-        # Step 1: Generate roadmap using AI
-        ai_data = await generate_roadmap(incoming_request.description)
-        
-        # Step 2: Create Goal
-        goal = Goal(
-            user_id=current_user.id,
-            title=ai_data["title"],
-            description=incoming_request.description,
-            category=ai_data["category"],
-            difficulty_level=DifficultyLevel(ai_data["difficulty"]),
-            status=GoalStatus.NOT_STARTED
+        job = await enqueue_job(
+            "generate_goal",
+            current_user.id,
+            {"description": incoming_request.description},
+            generate_goal_job,
+            priority=llm_priority(current_user)
         )
-        db.add(goal)
-        await db.flush()  # Get goal.id
-        
-        # Step 3: Create Roadmap
-        roadmap = Roadmap(
-            goal_id=goal.id,
-            name=ai_data["roadmap"]["name"]
+    except JobQueueFullError:
+        logger.warning("Goal generation queue full", user_id=current_user.id, event="goal_queue_full")
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "message": "We're generating a lot of roadmaps right now. Please try again in a moment.",
+                "code": "AI_SERVICE_BUSY"
+            },
+            headers={"Retry-After": "30"}
         )
-        db.add(roadmap)
-        await db.flush()  # Get roadmap.id
-        
-        # Step 4: Create Levels
-        for level_data in ai_data["roadmap"]["levels"]:
-            level = Level(
-                roadmap_id=roadmap.id,
-                order=level_data["order"],
-                title=level_data["title"],
-                description=level_data["description"],
-                topics=level_data["topics"],
-                xp_reward=level_data["xp_reward"],
-                status=LevelStatus.UNLOCKED if level_data["order"] == 1 else LevelStatus.LOCKED
-            )
-            db.add(level)
-        
+
+    return GoalJobResponse(job_id=job["id"], status=job["status"])
+
+
+async def generate_goal_job(job: dict) -> dict:
+    """
+    Job handler: generate a roadmap with the AI (or reuse one from the
+    roadmap library) and store the goal.
+
+    No DB session is open during the LLM call. The free-tier limit is checked
+    again on both sides of it, since other jobs for the same user may have
+    finished in the meantime.
+    """
+    user_id = job["user_id"]
+    description = job["payload"]["description"]
+
+    async with async_session() as db:
+        user = await _ensure_goal_quota(db, user_id)
+        priority = llm_priority(user)
+
+        # Step 1: Reuse a library roadmap for a near-identical description...
+        ai_data = await lookup_roadmap(db, description)
+        variant = 0 if ai_data is not None else await library_variant(db, description)
         await db.commit()
-        
-        # Step 5: Refresh and load relationships
-        await db.refresh(goal)
-        result = await db.execute(
-            select(Goal)
-            .options(selectinload(Goal.roadmap).selectinload(Roadmap.levels))
-            .where(Goal.id == goal.id)
-        )
-        goal = result.scalar_one()
-        
+    from_library = ai_data is not None
+
+    # ...or generate one using AI
+    try:
+        if not from_library:
+            with usage_scope("POST /goals", user_id):
+                ai_data = await generate_roadmap(description, priority=priority, cache_variant=variant)
+    except LLMError as e:
+        logger.error("AI service error while creating goal", error=str(e), code=e.code, user_id=user_id, event="goal_creation_error")
+        raise JobError(e.code, e.message)
+    except ValueError as e:
+        # AI validation errors (invalid data structure from AI)
+        logger.error("Invalid goal data from AI", error=str(e), user_id=user_id, event="invalid_goal_data")
+        raise JobError("INVALID_AI_RESPONSE", "Failed to generate a valid roadmap. Please try rephrasing your goal description.")
+
+    async with async_session() as db:
+        user = await _ensure_goal_quota(db, user_id)
+
+        # Step 2: Store Goal + Roadmap + Levels (built from the inserted rows, no re-query)
+        goal = await persist_goal(db, user_id, description, ai_data)
+        await adjust_progression_counters(db, user_id, levels_total=len(goal.roadmap.levels))
+        if not from_library:
+            save_roadmap(db, description, ai_data)
+        await db.commit()
+
         # Track business metric
         metrics.increment_business_metric("goals_created")
 
         # Log event
-        await log_event(db, "goal_created", user_id=current_user.id, data={"goal_id": goal.id, "title": goal.title, "is_premium": has_premium})
-        
-        logger.info(
-            "Goal created successfully",
-            user_id=current_user.id,
-            goal_id=goal.id,
-            is_premium=has_premium,
-            event="goal_created"
-        )
-        
-        return goal
-        
-    except HTTPException:
-        # Re-raise HTTP exceptions (like premium/limit errors)
-        raise
-    except ValueError as e:
-        # AI validation errors (invalid data structure from AI)
-        logger.error("Invalid goal data from AI", error=str(e), user_id=current_user.id, event="invalid_goal_data")
-        await db.rollback()
+        has_premium = is_user_premium(user)
+        await log_event(db, "goal_created", user_id=user_id, data={"goal_id": goal.id, "title": goal.title, "is_premium": has_premium, "from_library": from_library})
+
+    logger.info(
+        "Goal created successfully",
+        user_id=user_id,
+        goal_id=goal.id,
+        is_premium=has_premium,
+        event="goal_created"
+    )
+    return {"goal_id": goal.id}
+
+
+async def _ensure_goal_quota(db: AsyncSession, user_id: int) -> User:
+    """Load the user and raise JobError if they can't create another goal"""
+    user = await db.get(User, user_id)
+    if user is None:
+        raise JobError("USER_NOT_FOUND", "Your account no longer exists.")
+    if is_user_premium(user):
+        return user
+
+    goals_count = await db.scalar(select(func.count(Goal.id)).where(Goal.user_id == user_id))
+    if goals_count >= 2:
+        raise JobError("GOAL_LIMIT_REACHED", "You've reached the limit of 2 goals for free users. Upgrade to Premium for unlimited goals!")
+    return user
+
+
+@router.get("/jobs/{job_id}", response_model=GoalJobResponse)
+async def get_goal_job(
+    job_id: str,
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    """
+    Poll a goal generation job.
+
+    Once status is "done", goal_id points at the new goal (GET /goals/{goal_id}).
+    On "failed", error holds {code, message} like the old synchronous errors.
+    """
+    try:
+        job = await get_job(job_id)
+    except JobStoreUnavailableError:
         raise HTTPException(
-            status_code=400,
-            detail={
-                "message": "Failed to generate a valid roadmap. Please try rephrasing your goal description.",
-                "code": "INVALID_AI_RESPONSE",
-                "error": str(e)
-            }
+            status_code=503,
+            detail={"message": "Couldn't check on your roadmap right now. Please try again.", "code": "JOB_STATUS_UNAVAILABLE"},
+            headers={"Retry-After": "5"}
         )
+    if job is None or job["user_id"] != current_user.id or job["kind"] != "generate_goal":
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return GoalJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        goal_id=job.get("goal_id"),
+        error=job.get("error")
+    )
+
+
+def _sse(event: str, data) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _discard_partial_goal(goal_id: int, user_id: int, levels_inserted: int):
+    """Remove a goal whose streamed generation didn't finish (levels, roadmap, goal)"""
+    async with async_session() as db:
+        roadmap_ids = select(Roadmap.id).where(Roadmap.goal_id == goal_id).scalar_subquery()
+        await db.execute(delete(Level).where(Level.roadmap_id.in_(roadmap_ids)))
+        await db.execute(delete(Roadmap).where(Roadmap.goal_id == goal_id))
+        await db.execute(delete(Goal).where(Goal.id == goal_id))
+        await adjust_progression_counters(db, user_id, levels_total=-levels_inserted)
+        await db.commit()
+
+
+async def _stream_goal_events(user_id: int, description: str):
+    """
+    Generate a roadmap with the streaming AI call (or take it from the roadmap
+    library), persisting and emitting each part.
+
+    Events: "goal" (goal + empty roadmap, once the header is in), "level"
+    (each level as soon as it is complete and stored), then "done" - or
+    "error" with {code, message}, in which case the partial goal is removed.
+
+    It outlives the request handler, so it opens its own sessions - short
+    ones, committed at once, never held while the AI streams or the client
+    reads. The free-tier goal limit checked by the endpoint is checked again
+    before generating and before the goal is stored, since other goals may
+    have been created since.
+    """
+    set_usage_scope("POST /goals/stream", user_id)
+    goal = None
+    levels_inserted = 0
+    try:
+        async with async_session() as db:
+            user = await _ensure_goal_quota(db, user_id)
+        has_premium = is_user_premium(user)
+
+        async for kind, data in roadmap_parts(async_session, description, priority=llm_priority(user)):
+            async with async_session() as db:
+                if kind == "header":
+                    await _ensure_goal_quota(db, user_id)
+                    goal = await insert_goal(db, user_id, description, data)
+                    await db.commit()
+                    event = _sse("goal", GoalResponse.model_validate(goal).model_dump(mode="json"))
+                else:
+                    levels = await insert_levels(db, goal.roadmap, [data])
+                    await adjust_progression_counters(db, user_id, levels_total=1)
+                    await db.commit()
+                    levels_inserted += 1
+                    event = _sse("level", LevelResponse.model_validate(levels[0]).model_dump(mode="json"))
+            yield event
+
+        metrics.increment_business_metric("goals_created")
+        async with async_session() as db:
+            await log_event(db, "goal_created", user_id=user_id, data={"goal_id": goal.id, "title": goal.title, "is_premium": has_premium, "streamed": True})
+
+        logger.info("Goal created successfully", user_id=user_id, goal_id=goal.id, levels=levels_inserted, event="goal_created")
+        yield _sse("done", {"goal_id": goal.id})
+
+    except asyncio.CancelledError:
+        # Client went away mid-generation; clean up outside the cancelled scope
+        if goal is not None:
+            await asyncio.shield(_discard_partial_goal(goal.id, user_id, levels_inserted))
+        raise
     except Exception as e:
-        # Other errors (OpenAI API, database, network issues, etc.)
-        logger.error("Failed to create goal", error=str(e), user_id=current_user.id, event="goal_creation_error")
-        await db.rollback()
-        
-        # Check if it's an AI service error
-        error_message = str(e).lower()
-        if "openai" in error_message or "api" in error_message or "rate limit" in error_message:
-            raise HTTPException(
-                status_code=503,
-                detail={
-                    "message": "AI service is temporarily unavailable. Please try again in a moment.",
-                    "code": "AI_SERVICE_ERROR",
-                    "error": str(e)
-                }
-            )
-        
-        # Generic error
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "message": "An unexpected error occurred while creating your goal. Please try again.",
-                "code": "INTERNAL_ERROR",
-                "error": str(e)
-            }
-        )
+        if isinstance(e, JobError):
+            logger.warning("Goal stream refused", code=e.code, user_id=user_id, event="goal_creation_refused")
+            error = {"code": e.code, "message": e.message}
+        elif isinstance(e, LLMError):
+            logger.error("AI service error while creating goal", error=str(e), code=e.code, user_id=user_id, event="goal_creation_error")
+            error = {"code": e.code, "message": e.message, "retry_after": e.retry_after}
+        elif isinstance(e, ValueError):
+            logger.error("Invalid goal data from AI", error=str(e), user_id=user_id, event="invalid_goal_data")
+            error = {"code": "INVALID_AI_RESPONSE", "message": "Failed to generate a valid roadmap. Please try rephrasing your goal description."}
+        else:
+            logger.error("Failed to create goal", error=str(e), user_id=user_id, event="goal_creation_error")
+            error = {"code": "AI_SERVICE_ERROR", "message": "AI service is temporarily unavailable. Please try again in a moment."}
+        if goal is not None:
+            await _discard_partial_goal(goal.id, user_id, levels_inserted)
+        yield _sse("error", error)
 
 
+# Endpoint to create a goal and stream the roadmap as it is generated
+@router.post("/stream")
+async def create_goal_stream(
+    request: Request,
+    incoming_request: CreateGoalRequest,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)]
+):
+    """
+    Create a new goal, streaming progress as server-sent events.
+
+    Same limits as POST /goals, but instead of a job id the response is a
+    text/event-stream: the goal arrives as soon as the AI has named it and
+    each level as soon as it has been generated and saved.
+    """
+    # Rate limiting: shares the create_goal budget
+    await check_rate_limit(request, "create_goal", limit=15, window=360)
+
+    await enforce_goal_limit(db, current_user)
+
+    return StreamingResponse(
+        _stream_goal_events(current_user.id, incoming_request.description),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 # Endpoint to get all goals for the current user (without roadmap details)
 @router.get("/me", response_model=List[GoalListItem])
@@ -311,4 +536,58 @@ async def mark_topic(
         })
     
     await db.commit()
+
+    # Last topic done: get the quiz ready before the user asks for it
+    if level.topics[topic_index]["completed"] and all(topic.get("completed", False) for topic in level.topics):
+        set_usage_scope("PATCH /goals/levels/{level_id}/topics/{topic_index}", current_user.id)
+        prefetch_level_quiz(level.id, level.title, level.topics, priority=llm_priority(current_user))
+
     return {"detail": "Topic marked as completed"}
+
+
+@router.get("/levels/{level_id}/explanations", response_model=LevelResponse)
+async def get_level_explanations(
+    request: Request,
+    level_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)]
+):
+    """
+    Get a level with every topic explained, generating missing explanations.
+
+    Only the first levels are explained when a roadmap is created; the rest are
+    filled in when unlocked, or here on first view. Locked levels are refused
+    so LLM spend follows actual progress.
+    """
+    result = await db.execute(
+        select(Level)
+        .join(Roadmap, Level.roadmap_id == Roadmap.id)
+        .join(Goal, Roadmap.goal_id == Goal.id)
+        .where(Level.id == level_id, Goal.user_id == current_user.id)
+    )
+    level = result.scalar_one_or_none()
+
+    if not level:
+        logger.error("Level not found for explanations", level_id=level_id, user_id=current_user.id, event="level_not_found")
+        raise HTTPException(status_code=404, detail="Level not found")
+
+    if not needs_explanations(level.topics):
+        return level
+
+    if level.status == LevelStatus.LOCKED:
+        raise HTTPException(status_code=403, detail="Unlock this level to see its explanations")
+
+    # Rate limiting: generating explanations is an AI call
+    await check_rate_limit(request, "explain_level", limit=20, window=360)
+
+    set_usage_scope("GET /goals/levels/{level_id}/explanations", current_user.id)
+    try:
+        topics = await ensure_level_explanations(level.id, priority=llm_priority(current_user))
+    except LLMError:
+        raise  # typed AI error response (handled in main.py)
+    except Exception as e:
+        logger.error("Failed to explain level", level_id=level_id, error=str(e), event="level_explanation_failed")
+        raise HTTPException(status_code=500, detail="Failed to generate explanations")
+
+    set_committed_value(level, "topics", topics)
+    return level
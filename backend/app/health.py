@@ -48,7 +48,7 @@ async def health_check(db: Annotated[AsyncSession, Depends(get_db)]):
     
     # 2. Check Redis
     try:
-        redis_client.ping()
+        await redis_client.ping()
         health_status["checks"]["redis"] = "connected"
     except Exception as e:
         health_status["checks"]["redis"] = "disconnected"
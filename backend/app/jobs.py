@@ -0,0 +1,189 @@
+"""
+Background jobs for slow work (e.g. LLM roadmap generation).
+
+Jobs run on a small pool of asyncio workers inside each API process, so the
+request that enqueues one returns immediately and no web worker or DB
+connection is held while the job waits on the LLM. Job state is kept in
+Redis, so any process can answer status polls.
+
+A job moves pending -> running -> done | failed. The handler's return value
+is merged into the job record when it finishes; raising JobError marks it
+failed with a client-facing {code, message}.
+
+Every job has a deadline (job_deadline_seconds after enqueue): a worker
+won't start it later and stops running it then. Since the state lives only
+in Redis, a job whose process died mid-way would otherwise stay pending or
+running forever; get_job reports any job past its deadline as failed.
+"""
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+import redis
+
+from app.cache import redis_client
+from app.config import settings
+from app.logger import logger
+
+
+JOB_KEY_PREFIX = "job:"
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+
+class JobError(Exception):
+    """Expected job failure; code and message are shown to the client"""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class JobQueueFullError(Exception):
+    """Raised by enqueue_job when this process already has too many pending jobs"""
+
+
+class JobStoreUnavailableError(Exception):
+    """Raised by get_job when the job state can't be read from Redis"""
+
+
+JOB_EXPIRED_ERROR = {"code": "JOB_TIMEOUT", "message": "Generating your roadmap took too long. Please try again."}
+
+
+_queue: Optional[asyncio.PriorityQueue] = None
+_sequence = itertools.count()  # tie-breaker so equal sort keys never compare job dicts
+_workers: list[asyncio.Task] = []
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _job_key(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}{job_id}"
+
+async def _save_job(job: dict):
+    try:
+        await redis_client.setex(_job_key(job["id"]), settings.job_ttl_seconds, json.dumps(job))
+    except redis.RedisError:
+        logger.error("Redis error saving job state", exc_info=True, event="job_state_error", job_id=job["id"])
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """
+    Return the job record, or None if it doesn't exist (or has expired).
+
+    An unfinished job past its deadline is reported as failed. Raises
+    JobStoreUnavailableError if Redis can't be read.
+    """
+    try:
+        raw = await redis_client.get(_job_key(job_id))
+    except redis.RedisError as e:
+        logger.error("Redis error reading job state", exc_info=True, event="job_state_error", job_id=job_id)
+        raise JobStoreUnavailableError() from e
+    if not raw:
+        return None
+
+    job = json.loads(raw)
+    if job["status"] in ("pending", "running") and time.time() > job.get("deadline", float("inf")):
+        job.update(status="failed", error=JOB_EXPIRED_ERROR)
+    return job
+
+async def _finish(job: dict, status: str, **fields: Any):
+    job.update(status=status, finished_at=time.time(), **fields)
+    await _save_job(job)
+
+
+async def enqueue_job(kind: str, user_id: int, payload: dict, handler: JobHandler, priority: str = "free") -> dict:
+    """
+    Record a pending job and queue it for the worker pool.
+
+    Jobs run oldest first, with premium jobs ordered as if they had been
+    enqueued job_premium_boost_seconds earlier - so they jump ahead without
+    starving free jobs indefinitely. Workers are started lazily if the app
+    lifespan hasn't started them. Raises JobQueueFullError when the local
+    queue is full.
+    """
+    start_job_workers()
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "user_id": user_id,
+        "payload": payload,
+        "priority": priority,
+        "status": "pending",
+        "created_at": time.time(),
+    }
+    job["deadline"] = job["created_at"] + settings.job_deadline_seconds
+    if _queue.full():
+        raise JobQueueFullError()
+    await _save_job(job)
+    sort_key = job["created_at"] - (settings.job_premium_boost_seconds if priority == "premium" else 0)
+    _queue.put_nowait((sort_key, next(_sequence), job, handler))
+    logger.info("Job enqueued", job_id=job["id"], kind=kind, user_id=user_id, queued=_queue.qsize(), event="job_enqueued")
+    return job
+
+
+async def _run_job(job: dict, handler: JobHandler):
+    remaining = job["deadline"] - time.time()
+    if remaining <= 0:
+        logger.warning("Job expired in the queue", job_id=job["id"], kind=job["kind"], event="job_expired")
+        await _finish(job, "failed", error=JOB_EXPIRED_ERROR)
+        return
+
+    job.update(status="running", started_at=time.time())
+    await _save_job(job)
+    try:
+        async with asyncio.timeout(remaining):
+            result = await handler(job)
+    except TimeoutError:
+        logger.warning("Job ran past its deadline", job_id=job["id"], kind=job["kind"], event="job_expired")
+        await _finish(job, "failed", error=JOB_EXPIRED_ERROR)
+    except asyncio.CancelledError:
+        await _finish(job, "failed", error={"code": "CANCELLED", "message": "The job was interrupted. Please try again."})
+        raise
+    except JobError as e:
+        logger.warning("Job failed", job_id=job["id"], kind=job["kind"], code=e.code, error=e.message, event="job_failed")
+        await _finish(job, "failed", error={"code": e.code, "message": e.message})
+    except Exception:
+        logger.error("Job crashed", exc_info=True, job_id=job["id"], kind=job["kind"], event="job_error")
+        await _finish(job, "failed", error={"code": "INTERNAL_ERROR", "message": "An unexpected error occurred. Please try again."})
+    else:
+        await _finish(job, "done", **(result or {}))
+        logger.info("Job done", job_id=job["id"], kind=job["kind"], duration=round(job["finished_at"] - job["started_at"], 2), event="job_done")
+
+async def _worker():
+    while True:
+        _, _, job, handler = await _queue.get()
+        try:
+            await _run_job(job, handler)
+        finally:
+            _queue.task_done()
+
+
+def start_job_workers():
+    """Start the worker pool (idempotent; called from the app lifespan)"""
+    global _queue, _loop
+    loop = asyncio.get_running_loop()
+    if _queue is None or _loop is not loop:
+        # first start, or a new event loop (workers of an old loop are gone)
+        _queue = asyncio.PriorityQueue(maxsize=settings.job_queue_max_size)
+        _workers.clear()
+        _loop = loop
+    _workers[:] = [task for task in _workers if not task.done()]
+    for _ in range(settings.job_workers - len(_workers)):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop_job_workers():
+    """Cancel running jobs and fail the ones still queued so pollers don't wait forever"""
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+    if _queue is not None:
+        while not _queue.empty():
+            _, _, job, _ = _queue.get_nowait()
+            await _finish(job, "failed", error={"code": "CANCELLED", "message": "The server restarted before this job ran. Please try again."})
+        _queue = None
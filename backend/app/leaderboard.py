@@ -1,90 +1,453 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from typing import Annotated
-import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Annotated, Literal
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+import redis
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 
 from app.auth import get_current_user
-from app.db import get_db
-from app.cache import get_cache, set_cache
-from app.models import User
-from app.schemas import LeaderboardResponse
+from app.db import get_db, async_session
+from app.cache import get_or_compute, redis_client
+from app.models import User, Event
+from app.schemas import LeaderboardResponse, LeaderboardPageResponse, LeaderboardAroundMeResponse
 from app.rate_limiter import check_rate_limit
 from .logger import logger
 
 
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
+# Top 10 is served fresh for 30s, then stale-while-revalidate until the hard TTL
+LEADERBOARD_SOFT_TTL = 30
+LEADERBOARD_HARD_TTL = 300
+
+# Sorted set of user_id -> total_exp; the source of truth for ranks.
+# Postgres (User.total_exp) stays authoritative for XP itself - the set can
+# always be rebuilt from it with rebuild_leaderboard().
+LEADERBOARD_ZSET = "leaderboard:xp"
+REBUILD_BATCH_SIZE = 1000
+
+# Time-windowed leaderboards rank by XP earned over the last 7 / 30 UTC days
+# (rolling, not calendar weeks or months). award_xp adds to one sorted set
+# per UTC day (leaderboard:xp:day:2026-10-16) that expires once no window
+# covers it. A window's ranking is the ZUNIONSTORE of its daily sets, kept
+# under leaderboard:xp:<window> for WINDOW_CACHE_SECONDS, so reads don't
+# re-union every time; XP awarded meanwhile shows up at the next refresh.
+LeaderboardWindow = Literal["all", "weekly", "monthly"]
+WINDOW_DAYS = {"weekly": 7, "monthly": 30}
+DAY_BUCKET_RETENTION = timedelta(days=max(WINDOW_DAYS.values()) + 1)
+WINDOW_CACHE_SECONDS = LEADERBOARD_SOFT_TTL
+
+
+def day_key(day: date) -> str:
+    """Sorted-set key holding the XP earned on one UTC day"""
+    return f"{LEADERBOARD_ZSET}:day:{day.isoformat()}"
+
+
+def window_days(window: str, now: datetime | None = None) -> list[date]:
+    """The UTC days a window covers, today first"""
+    today = (now or datetime.now(timezone.utc)).astimezone(timezone.utc).date()
+    return [today - timedelta(days=offset) for offset in range(WINDOW_DAYS[window])]
+
+
+def leaderboard_key(window: str = "all") -> str:
+    """Sorted-set key a window is ranked from"""
+    if window == "all":
+        return LEADERBOARD_ZSET
+    if window not in WINDOW_DAYS:
+        raise ValueError(f"Unknown leaderboard window: {window}")
+    return f"{LEADERBOARD_ZSET}:{window}"
+
+
+async def window_set(window: str) -> str:
+    """leaderboard_key(window), (re)building a rolling window's union if it has expired"""
+    key = leaderboard_key(window)
+    if window != "all" and not await redis_client.exists(key):
+        pipe = redis_client.pipeline()
+        pipe.zunionstore(key, [day_key(day) for day in window_days(window)])
+        pipe.expire(key, WINDOW_CACHE_SECONDS)
+        await pipe.execute()
+    return key
+
+
+# ========== Sorted-set maintenance ==========
+
+async def award_xp(user_id: int, xp: int):
+    """Add XP to a user's all-time score and today's bucket (call after the DB commit)"""
+    key = day_key(datetime.now(timezone.utc).date())
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zincrby(LEADERBOARD_ZSET, xp, user_id)
+        pipe.zincrby(key, xp, user_id)
+        pipe.expire(key, int(DAY_BUCKET_RETENTION.total_seconds()))
+        await pipe.execute()
+    except redis.RedisError:
+        # the sets drift until the next rebuild; all-time ranks fall back to SQL meanwhile
+        logger.error("Failed to update leaderboard score", exc_info=True, event="leaderboard_update_error", user_id=user_id, xp=xp)
+
+
+async def add_user_to_leaderboard(user_id: int, total_exp: int = 0):
+    """Insert a user into the leaderboard without touching an existing score"""
+    try:
+        await redis_client.zadd(LEADERBOARD_ZSET, {str(user_id): total_exp}, nx=True)
+    except redis.RedisError:
+        logger.error("Failed to add user to leaderboard", exc_info=True, event="leaderboard_update_error", user_id=user_id)
+
+
+async def _swap_in(tmp_key: str, key: str, loaded: int):
+    if loaded:
+        await redis_client.rename(tmp_key, key)
+    else:
+        await redis_client.delete(key)
+
+
+async def _rebuild_day_buckets(db: AsyncSession) -> int:
+    """Rebuild the daily sets the windows cover from quiz_completed events"""
+    days = window_days("monthly")
+    result = await db.execute(
+        select(Event.user_id, Event.data, Event.created_at)
+        .where(
+            Event.event_type == "quiz_completed",
+            Event.created_at >= datetime.combine(days[-1], datetime.min.time(), tzinfo=timezone.utc),
+            Event.user_id.is_not(None)
+        )
+    )
+    scores = defaultdict(lambda: defaultdict(int))
+    for user_id, data, created_at in result.all():
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        scores[created_at.astimezone(timezone.utc).date()][user_id] += (data or {}).get("xp_earned", 0)
+
+    for day in days:
+        key = day_key(day)
+        tmp_key = f"{key}:rebuild"
+        await redis_client.delete(tmp_key)
+        if scores[day]:
+            await redis_client.zadd(tmp_key, {str(user_id): xp for user_id, xp in scores[day].items()})
+        await _swap_in(tmp_key, key, len(scores[day]))
+        if scores[day]:
+            await redis_client.expire(key, int(DAY_BUCKET_RETENTION.total_seconds()))
+    await redis_client.delete(*[leaderboard_key(window) for window in WINDOW_DAYS])
+    return sum(len(day_scores) for day_scores in scores.values())
+
+
+async def rebuild_leaderboard() -> int:
+    """
+    Rebuild the sorted sets from Postgres (cold start / drift repair).
+
+    The all-time set is loaded from users.total_exp and the daily sets the
+    windows cover from quiz_completed events. Scores are written to a
+    temporary key in batches and swapped in with RENAME, so readers never
+    see a half-built leaderboard. Returns the number of users loaded.
+    """
+    tmp_key = f"{LEADERBOARD_ZSET}:rebuild"
+    loaded = 0
+    async with async_session() as db:
+        await redis_client.delete(tmp_key)
+        result = await db.stream(select(User.id, User.total_exp).execution_options(yield_per=REBUILD_BATCH_SIZE))
+        async for batch in result.partitions(REBUILD_BATCH_SIZE):
+            await redis_client.zadd(tmp_key, {str(row.id): row.total_exp or 0 for row in batch})
+            loaded += len(batch)
+        await _swap_in(tmp_key, LEADERBOARD_ZSET, loaded)
+
+        await _rebuild_day_buckets(db)
+
+    logger.info("Leaderboard rebuilt from database", event="leaderboard_rebuilt", users=loaded)
+    return loaded
+
+
+async def ensure_leaderboard():
+    """Rebuild the sorted sets if the all-time one is missing (e.g. fresh Redis)"""
+    try:
+        if await redis_client.zcard(LEADERBOARD_ZSET) == 0:
+            await rebuild_leaderboard()
+    except Exception:
+        logger.error("Leaderboard warm-up failed", exc_info=True, event="leaderboard_rebuild_error")
+
+
+# ========== Reads ==========
+
+async def fetch_leaderboard_range(db: AsyncSession, offset: int, limit: int, window: str = "all") -> list[dict]:
+    """
+    Fetch leaderboard entries by position, shaped for the leaderboard response.
+
+    Ids come from the sorted set (ZREVRANGE, O(log N + limit) at any depth)
+    and are hydrated with a primary key lookup. For windowed leaderboards
+    total_exp is the XP earned in the window. The all-time view falls back
+    to ORDER BY total_exp OFFSET/LIMIT if Redis is unavailable; windowed
+    views come back empty instead.
+
+    Rows carry the same competition rank as get_user_standing: tied users
+    share a rank, even across a page boundary.
+    """
+    try:
+        key = await window_set(window)
+        members = await redis_client.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        scores = {int(member): int(score) for member, score in members}
+        user_ids = list(scores)
+        first_rank = await _rank_for_score(key, members[0][1]) if members else None
+    except redis.RedisError:
+        logger.warning("Leaderboard set unavailable, using database", exc_info=True, event="leaderboard_fallback", window=window)
+        if window != "all":
+            return []
+        user_ids = None
+
+    query = select(
+        User.id,
+        User.email,
+        User.total_exp,
+        User.is_premium,
+        User.display_name
+    )
+    if user_ids is None:
+        result = await db.execute(
+            query.order_by(User.total_exp.desc(), User.id).offset(offset).limit(limit)
+        )
+        users = result.all()
+        scores = {user.id: user.total_exp or 0 for user in users}
+        first_rank = await _rank_for_score_in_db(db, users[0].total_exp) if users else None
+    elif user_ids:
+        result = await db.execute(query.where(User.id.in_(user_ids)))
+        users_by_id = {user.id: user for user in result.all()}
+        users = [users_by_id[user_id] for user_id in user_ids if user_id in users_by_id]
+    else:
+        users = []
+
+    ranks = _competition_ranks(scores, offset, first_rank)
+    return [
+        {
+            "rank": ranks[user.id],
+            "user_id": user.id,
+            "email": user.email,
+            "total_exp": user.total_exp if window == "all" else scores[user.id],
+            "is_premium": user.is_premium or False,
+            "display_name": user.display_name
+        }
+        for user in users
+    ]
+
+
+def _competition_ranks(scores: dict[int, int], offset: int, first_rank: int | None) -> dict[int, int]:
+    """
+    Ranks for a slice of users in leaderboard order (scores), starting at offset.
+
+    The first user's rank is looked up (it may tie with users on the previous
+    page); after that a user shares the rank of a tied predecessor, and
+    otherwise is ranked by position.
+    """
+    ranks = {}
+    previous = None
+    for index, (user_id, score) in enumerate(scores.items()):
+        if index == 0:
+            rank = first_rank
+        elif score != previous:
+            rank = offset + index + 1
+        ranks[user_id] = rank
+        previous = score
+    return ranks
+
+
+async def fetch_top_users(db: AsyncSession, limit: int = 10, window: str = "all") -> list[dict]:
+    """Fetch the top users by total_exp (or by XP earned in the window)"""
+    return await fetch_leaderboard_range(db, 0, limit, window)
+
+
+async def count_leaderboard(db: AsyncSession, window: str = "all") -> int:
+    """Number of ranked users (ZCARD, falls back to COUNT(*) for all-time)"""
+    try:
+        return await redis_client.zcard(await window_set(window))
+    except redis.RedisError:
+        if window != "all":
+            return 0
+        result = await db.execute(select(func.count()).select_from(User))
+        return result.scalar_one()
+
+
+async def build_leaderboard(window: str = "all") -> list[dict]:
+    """Rebuild the cached top 10 with its own session (may run in the background)"""
+    async with async_session() as db:
+        return await fetch_top_users(db, window=window)
+
+
+async def _rank_for_score(key: str, score: float) -> int:
+    """Competition rank for a score: 1 + users with strictly more XP, so ties share a rank (ZCOUNT, O(log N))"""
+    return await redis_client.zcount(key, f"({score}", "+inf") + 1
+
+
+async def _rank_for_score_in_db(db: AsyncSession, total_exp: int | None) -> int:
+    """Competition rank for an all-time score (index-friendly on ix_users_total_exp)"""
+    result = await db.execute(
+        select(func.count()).select_from(User).where(User.total_exp > (total_exp or 0))
+    )
+    return result.scalar_one() + 1
+
+
+async def get_user_standing(db: AsyncSession, user: User, window: str = "all") -> tuple[int | None, int]:
+    """
+    The user's 1-based rank and XP for a window.
+
+    Users tied on XP share a rank, like SQL rank(). Users without XP in a
+    window have no rank there (None).
+    """
+    if window != "all":
+        try:
+            key = await window_set(window)
+            score = await redis_client.zscore(key, user.id)
+            if score is None:
+                return None, 0
+            return await _rank_for_score(key, score), int(score)
+        except redis.RedisError:
+            logger.warning("Leaderboard set unavailable", exc_info=True, event="leaderboard_fallback", window=window)
+            return None, 0
+
+    return await get_user_rank(db, user), user.total_exp
+
+
+async def get_user_rank(db: AsyncSession, user: User) -> int:
+    """1-based all-time rank of the user; users tied on XP share a rank (ZSCORE + ZCOUNT, O(log N))"""
+    try:
+        score = await redis_client.zscore(LEADERBOARD_ZSET, user.id)
+        if score is None:
+            # user missing from the set (registered while Redis was down, etc.)
+            await add_user_to_leaderboard(user.id, user.total_exp or 0)
+            score = user.total_exp or 0
+        return await _rank_for_score(LEADERBOARD_ZSET, score)
+    except redis.RedisError:
+        logger.warning("Leaderboard set unavailable, using database", exc_info=True, event="leaderboard_fallback")
+
+    return await _rank_for_score_in_db(db, user.total_exp)
+
+
+async def get_user_position(db: AsyncSession, user: User, window: str = "all") -> int | None:
+    """
+    0-based position of the user in leaderboard order (what fetch_leaderboard_range pages by).
+
+    Unlike the rank, this is unique: among tied users it follows the set's
+    order (ZREVRANK), or ORDER BY total_exp DESC, id in the DB fallback.
+    None if the user has no XP in the window.
+    """
+    try:
+        key = await window_set(window)
+        position = await redis_client.zrevrank(key, user.id)
+        if position is None and window == "all":
+            await add_user_to_leaderboard(user.id, user.total_exp or 0)
+            position = await redis_client.zrevrank(key, user.id)
+        return position
+    except redis.RedisError:
+        logger.warning("Leaderboard set unavailable, using database", exc_info=True, event="leaderboard_fallback", window=window)
+        if window != "all":
+            return None
+
+    total_exp = user.total_exp or 0
+    result = await db.execute(
+        select(func.count()).select_from(User).where(
+            (User.total_exp > total_exp) | ((User.total_exp == total_exp) & (User.id < user.id))
+        )
+    )
+    return result.scalar_one()
+
+
+def _current_user_entry(user: User, rank: int | None, xp: int) -> dict:
+    return {
+        "rank": rank,
+        "user_id": user.id,
+        "email": user.email,
+        "total_exp": xp
+    }
+
+
 @router.get("", response_model=LeaderboardResponse)
 async def get_leaderboard(
     request: Request,
-    db: Annotated[AsyncSession, Depends(get_db)], 
-    current_user: Annotated[User, Depends(get_current_user)]
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    window: LeaderboardWindow = "all"
 ):
-    
+
     """
     Retrieve the global leaderboard sorted by total experience points (XP).
+
+    window=weekly|monthly ranks by XP earned over the last 7 / 30 UTC days
+    (rolling, refreshed every WINDOW_CACHE_SECONDS) instead of lifetime XP.
     """
     # Rate limiting: 20 requests per minute (cached, can be lenient)
     await check_rate_limit(request, "get_leaderboard", limit=20, window=40)
-    
-    leaderboard = []
 
-    # check redis cache first
-    cached_leaderboard = get_cache("leaderboard")
-    if cached_leaderboard:
-        leaderboard = json.loads(cached_leaderboard)
-    else:
-        # fetch top 10 users by total_exp
-        result = await db.execute(
-            select(
-                User.id,
-                User.email,
-                User.total_exp,
-                User.is_premium,
-                User.display_name
-            ).order_by(User.total_exp.desc()).limit(10)
-        )
-        top_users = result.all()
-    
-        leaderboard = [
-            {
-                "rank": index + 1,
-                "user_id": user.id,
-                "email": user.email,
-                "total_exp": user.total_exp,
-                "is_premium": user.is_premium or False,
-                "display_name": user.display_name
-            }
-            for index, user in enumerate(top_users)
-        ]
-        # cache the leaderboard for 5 minutes
-        set_cache("leaderboard", json.dumps(leaderboard), expire=300)
-
-    # calculate current user's rank among all users
-    # Use a subquery to rank all users, then filter for current user
-    rank_subquery = select(
-        User.id,
-        User.email,
-        User.total_exp,
-        func.rank().over(order_by=User.total_exp.desc()).label("rank")
-    ).subquery()
-    
-    rank_result = await db.execute(
-        select(rank_subquery.c.rank)
-        .where(rank_subquery.c.id == current_user.id)
+    # cached top 10; stale reads refresh in the background and on a hard miss
+    # only one request in the cluster runs the query
+    cache_key = "leaderboard" if window == "all" else f"leaderboard:{window}"
+    leaderboard = await get_or_compute(
+        cache_key,
+        lambda: build_leaderboard(window),
+        expire=LEADERBOARD_HARD_TTL,
+        soft_ttl=LEADERBOARD_SOFT_TTL,
+        tags=("leaderboard",)
     )
 
-    current_user_rank_row = rank_result.first()
-    current_user_rank = current_user_rank_row.rank if current_user_rank_row else None
-    
+    # current user's rank from the sorted set
+    current_user_rank, current_user_xp = await get_user_standing(db, current_user, window)
+
     return {
         "leaderboard": leaderboard,
-        "current_user": {
-            "rank": current_user_rank,
-            "user_id": current_user.id,
-            "email": current_user.email,
-            "total_exp": current_user.total_exp
-        }
-    }
\ No newline at end of file
+        "current_user": _current_user_entry(current_user, current_user_rank, current_user_xp)
+    }
+
+
+@router.get("/page", response_model=LeaderboardPageResponse)
+async def get_leaderboard_page(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    window: LeaderboardWindow = "all"
+):
+    """
+    Retrieve one page of the leaderboard (offset-paginated).
+    Deep pages cost the same as the first one.
+    """
+    # Rate limiting: 30 requests per minute
+    await check_rate_limit(request, "get_leaderboard_page", limit=30, window=60)
+
+    entries = await fetch_leaderboard_range(db, offset, limit, window)
+    total = await count_leaderboard(db, window)
+    next_offset = offset + limit if offset + limit < total else None
+
+    return {
+        "entries": entries,
+        "offset": offset,
+        "limit": limit,
+        "total": total,
+        "next_offset": next_offset
+    }
+
+
+@router.get("/around-me", response_model=LeaderboardAroundMeResponse)
+async def get_leaderboard_around_me(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    radius: Annotated[int, Query(ge=1, le=25)] = 5,
+    window: LeaderboardWindow = "all"
+):
+    """
+    Retrieve the users ranked directly above and below the current user.
+    """
+    # Rate limiting: 30 requests per minute
+    await check_rate_limit(request, "get_leaderboard_around_me", limit=30, window=60)
+
+    current_user_rank, current_user_xp = await get_user_standing(db, current_user, window)
+    # page by the user's position, not the rank: with ties they can be far apart
+    position = await get_user_position(db, current_user, window) if current_user_rank is not None else None
+    if position is None:
+        # no XP in this window yet - nothing to be around
+        entries = []
+    else:
+        offset = max(0, position - radius)
+        entries = await fetch_leaderboard_range(db, offset, position + radius + 1 - offset, window)
+
+    return {
+        "entries": entries,
+        "current_user": _current_user_entry(current_user, current_user_rank, current_user_xp)
+    }
@@ -0,0 +1,172 @@
+"""
+Generic cache of LLM chat completions, keyed by a hash of the prompt.
+
+Every chat completion in app.ai_service goes through here unless the call
+opts out (e.g. quiz variants, where a different answer is the point). The
+key covers what determines the answer: model, messages, temperature and
+response_format. An identical prompt - typically a retry after the request
+failed downstream of the LLM, e.g. on a DB error - is served from the cache
+instead of paying for a second generation.
+
+Two tiers:
+    Redis     hot entries, expire after llm_cache_redis_ttl_seconds; an
+              access-time index evicts the least recently used beyond
+              llm_cache_redis_max_keys
+    Postgres  llm_responses table, served for llm_cache_db_ttl_days. About
+              one write in 1/llm_cache_db_prune_rate also prunes it: rows
+              unused for llm_cache_db_ttl_days are deleted, then rows beyond
+              llm_cache_db_max_rows, least recently used first (so the table
+              can briefly overshoot). A DB hit is promoted back into Redis.
+
+Cache failures never fail the LLM call: they are logged and treated as a miss.
+"""
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import redis
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import CACHE_PREFIX, redis_client
+from app.config import settings
+from app.db import async_session
+from app.logger import logger
+from app.metrics import metrics
+from app.models import LLMResponse
+
+
+LLM_KEY_PREFIX = f"{CACHE_PREFIX}llm:"
+LLM_INDEX_KEY = f"{CACHE_PREFIX}llm-index"
+
+PROMPT_FIELDS = ("model", "messages", "temperature", "response_format")
+
+
+def prompt_key(request: Dict[str, Any], variant: int = 0) -> str:
+    """
+    Hash of the request fields that determine the completion.
+
+    variant separates prompts that are identical on purpose but should get
+    distinct answers (e.g. the Nth roadmap variant for the same description).
+    """
+    material = {field: request.get(field) for field in PROMPT_FIELDS}
+    if variant:
+        material["variant"] = variant
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+
+# ========== Redis (hot) ==========
+
+async def _redis_get(key: str) -> Optional[Dict[str, Any]]:
+    try:
+        raw = await redis_client.get(f"{LLM_KEY_PREFIX}{key}")
+        if raw is not None:
+            # only keys with a value go in the LRU index; misses would crowd out real entries
+            await redis_client.zadd(LLM_INDEX_KEY, {key: time.time()})
+    except redis.RedisError:
+        logger.warning("Redis error reading LLM cache", exc_info=True, event="llm_cache_error", key=key)
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def _redis_put(key: str, entry: Dict[str, Any]):
+    try:
+        pipe = redis_client.pipeline()
+        pipe.setex(f"{LLM_KEY_PREFIX}{key}", settings.llm_cache_redis_ttl_seconds, json.dumps(entry))
+        pipe.zadd(LLM_INDEX_KEY, {key: time.time()})
+        pipe.zcard(LLM_INDEX_KEY)
+        results = await pipe.execute()
+        if results[-1] > settings.llm_cache_redis_max_keys:
+            keys = await redis_client.zrange(LLM_INDEX_KEY, 0, results[-1] - settings.llm_cache_redis_max_keys - 1)
+            if keys:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.delete(*[f"{LLM_KEY_PREFIX}{evicted}" for evicted in keys])
+                pipe.zrem(LLM_INDEX_KEY, *keys)
+                await pipe.execute()
+    except redis.RedisError:
+        logger.error("Redis error writing LLM cache", exc_info=True, event="llm_cache_error", key=key)
+
+
+# ========== Postgres (durable) ==========
+
+async def _db_get(key: str) -> Optional[Dict[str, Any]]:
+    min_created_at = datetime.now(timezone.utc) - timedelta(days=settings.llm_cache_db_ttl_days)
+    try:
+        async with async_session() as db:
+            row = await db.scalar(
+                select(LLMResponse).where(LLMResponse.key == key, LLMResponse.created_at >= min_created_at)
+            )
+            if row is None:
+                return None
+            row.hit_count += 1
+            row.last_used_at = func.now()
+            entry = {"content": row.content, "completion_tokens": row.completion_tokens}
+            await db.commit()
+            return entry
+    except SQLAlchemyError:
+        logger.warning("DB error reading LLM cache", exc_info=True, event="llm_cache_error", key=key)
+        return None
+
+
+async def _db_put(key: str, model: str, entry: Dict[str, Any]):
+    try:
+        async with async_session() as db:
+            now = datetime.now(timezone.utc)
+            row = await db.get(LLMResponse, key)
+            if row is None:
+                db.add(LLMResponse(key=key, model=model, created_at=now, last_used_at=now, **entry))
+            else:  # expired row being regenerated
+                row.content, row.completion_tokens = entry["content"], entry["completion_tokens"]
+                row.created_at = row.last_used_at = now
+            await db.commit()
+
+            if random.random() < settings.llm_cache_db_prune_rate:
+                await _prune_db(db)
+    except SQLAlchemyError:
+        logger.error("DB error writing LLM cache", exc_info=True, event="llm_cache_error", key=key)
+
+
+async def _prune_db(db: AsyncSession):
+    """Delete expired rows, then the least recently used beyond llm_cache_db_max_rows"""
+    # last_used_at >= created_at, so this only removes rows that can't be served (and uses its index)
+    min_last_used_at = datetime.now(timezone.utc) - timedelta(days=settings.llm_cache_db_ttl_days)
+    expired = (await db.execute(delete(LLMResponse).where(LLMResponse.last_used_at < min_last_used_at))).rowcount
+
+    excess = await db.scalar(select(func.count()).select_from(LLMResponse)) - settings.llm_cache_db_max_rows
+    if excess > 0:
+        oldest = select(LLMResponse.key).order_by(LLMResponse.last_used_at).limit(excess)
+        await db.execute(delete(LLMResponse).where(LLMResponse.key.in_(oldest)))
+    await db.commit()
+    logger.info("LLM cache pruned", expired=expired, evicted=max(excess, 0), event="llm_cache_pruned")
+
+
+# ========== Public API ==========
+
+async def get_cached_response(key: str) -> Optional[str]:
+    """Cached completion content for a prompt key, or None (counts a hit or miss)"""
+    entry = await _redis_get(key)
+    result = "redis_hits"
+    if entry is None:
+        entry = await _db_get(key)
+        result = "db_hits"
+        if entry is not None:
+            await _redis_put(key, entry)
+
+    if entry is None:
+        metrics.record_llm_cache("misses")
+        return None
+
+    metrics.record_llm_cache(result, tokens_saved=entry["completion_tokens"])
+    logger.info("LLM cache hit", key=key, tier=result.removesuffix("_hits"), event="llm_cache_hit")
+    return entry["content"]
+
+
+async def store_response(key: str, model: str, content: str, completion_tokens: int = 0):
+    """Store a completion in both tiers"""
+    entry = {"content": content, "completion_tokens": completion_tokens}
+    await _redis_put(key, entry)
+    await _db_put(key, model, entry)
@@ -0,0 +1,201 @@
+"""
+Token usage and cost accounting for LLM calls.
+
+Every completion made by app.ai_service is recorded here with its prompt and
+completion tokens, model, purpose and latency, attributed to the endpoint and
+user that caused it (see usage_scope / set_usage_scope). Answers served from
+the LLM response cache are counted as cache hits with no tokens.
+
+Records are summed in memory per (day, endpoint, user, purpose, model) and
+written to the llm_usage table in batches: every llm_usage_flush_seconds by
+run_usage_flusher(), or sooner once llm_usage_flush_max_buckets buckets have
+piled up. Rows are partial sums, so reports always aggregate with SUM.
+
+Each user's tokens for the current UTC day are also counted in Redis, shared
+by all worker processes, so daily token quotas can be checked before a call
+is made (see tokens_used_today). Accounting failures never fail the LLM call:
+they are logged, and a failed flush is retried with the next batch.
+"""
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import redis
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.cache import CACHE_PREFIX, redis_client
+from app.config import settings
+from app.db import async_session
+from app.logger import logger
+from app.models import LLMUsage
+
+
+USAGE_KEY_PREFIX = f"{CACHE_PREFIX}llm-tokens:"
+
+# USD per 1M tokens (prompt, completion); unknown models are reported without a cost
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+COUNTERS = ("calls", "cache_hits", "prompt_tokens", "completion_tokens", "latency_ms")
+
+# (endpoint, user_id) the current request or job is spending LLM tokens for
+_scope: contextvars.ContextVar[Tuple[str, Optional[int]]] = contextvars.ContextVar(
+    "llm_usage_scope", default=("unattributed", None)
+)
+
+BucketKey = Tuple[date, str, Optional[int], str, str]
+_buckets: Dict[BucketKey, Dict[str, int]] = {}
+_flush_lock = asyncio.Lock()
+_flush_task: Optional[asyncio.Task] = None
+
+
+def set_usage_scope(endpoint: str, user_id: Optional[int]):
+    """
+    Attribute LLM calls made from here on in this request to endpoint and user.
+
+    Background tasks started afterwards (asyncio.create_task) inherit it.
+    Use usage_scope instead where the context outlives the unit of work,
+    e.g. in a job worker.
+    """
+    _scope.set((endpoint, user_id))
+
+
+@contextmanager
+def usage_scope(endpoint: str, user_id: Optional[int]) -> Iterator[None]:
+    """Attribute LLM calls made inside the block to endpoint and user"""
+    token = _scope.set((endpoint, user_id))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_user_id() -> Optional[int]:
+    """The user LLM calls are currently attributed to, if any"""
+    return _scope.get()[1]
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return round((prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000, 6)
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _tokens_key(user_id: int, day: date) -> str:
+    return f"{USAGE_KEY_PREFIX}{day.isoformat()}:{user_id}"
+
+
+def seconds_until_reset() -> int:
+    """Seconds until the daily token counters start over (midnight UTC)"""
+    now = datetime.now(timezone.utc)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return max(1, int((midnight - now).total_seconds()))
+
+
+async def tokens_used_today(user_id: int) -> int:
+    """Prompt + completion tokens the user has spent today (0 if Redis is unavailable)"""
+    try:
+        used = await redis_client.get(_tokens_key(user_id, _today()))
+    except redis.RedisError:
+        logger.warning("Redis error reading LLM token usage", exc_info=True, event="llm_usage_error", user_id=user_id)
+        return 0
+    return int(used or 0)
+
+
+async def record_usage(
+    purpose: str,
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    latency_ms: float = 0,
+    cache_hit: bool = False,
+):
+    """Count one completion (or LLM cache hit) against the current scope"""
+    endpoint, user_id = _scope.get()
+    day = _today()
+    bucket = _buckets.setdefault((day, endpoint, user_id, purpose, model), dict.fromkeys(COUNTERS, 0))
+    if cache_hit:
+        bucket["cache_hits"] += 1
+    else:
+        bucket["calls"] += 1
+        bucket["prompt_tokens"] += prompt_tokens
+        bucket["completion_tokens"] += completion_tokens
+        bucket["latency_ms"] += round(latency_ms)
+
+    tokens = prompt_tokens + completion_tokens
+    if user_id is not None and tokens:
+        key = _tokens_key(user_id, day)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.incrby(key, tokens)
+            pipe.expire(key, 60 * 60 * 48)
+            await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Redis error counting LLM token usage", exc_info=True, event="llm_usage_error", user_id=user_id)
+
+    if len(_buckets) >= settings.llm_usage_flush_max_buckets and (_flush_task is None or _flush_task.done()):
+        _start_flush()
+
+
+def _start_flush():
+    global _flush_task
+    _flush_task = asyncio.create_task(flush_usage())
+
+
+def _merge_back(buckets: Dict[BucketKey, Dict[str, int]]):
+    for key, counters in buckets.items():
+        bucket = _buckets.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        for name, value in counters.items():
+            bucket[name] += value
+
+
+async def flush_usage() -> int:
+    """Write the buckets summed so far to llm_usage; returns the number of rows"""
+    global _buckets
+    async with _flush_lock:
+        if not _buckets:
+            return 0
+        buckets, _buckets = _buckets, {}
+        rows = [
+            {"day": day, "endpoint": endpoint, "user_id": user_id, "purpose": purpose, "model": model, **counters}
+            for (day, endpoint, user_id, purpose, model), counters in buckets.items()
+        ]
+        try:
+            async with async_session() as db:
+                await db.execute(insert(LLMUsage), rows)
+                await db.commit()
+        except SQLAlchemyError:
+            logger.error("DB error flushing LLM usage", exc_info=True, event="llm_usage_error", rows=len(rows))
+            _merge_back(buckets)
+            return 0
+        logger.debug("LLM usage flushed", rows=len(rows), event="llm_usage_flushed")
+        return len(rows)
+
+
+async def run_usage_flusher():
+    """Flush usage every llm_usage_flush_seconds (app lifespan task); flushes once more when cancelled"""
+    try:
+        while True:
+            await asyncio.sleep(settings.llm_usage_flush_seconds)
+            await flush_usage()
+    finally:
+        await flush_usage()
+
+
+def pending_usage() -> Dict[str, Any]:
+    """Totals not yet flushed to the DB (this process)"""
+    totals = dict.fromkeys(COUNTERS, 0)
+    for counters in _buckets.values():
+        for name, value in counters.items():
+            totals[name] += value
+    return {"buckets": len(_buckets), **totals}
@@ -33,6 +33,15 @@ class MetricsCollector:
             "quizzes_completed": 0,
             "users_registered": 0,
         }
+        self.llm = {
+            tier: {"active": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+            for tier in ("premium", "free")
+        }
+        self.llm_wait_times = defaultdict(list)
+        self.roadmap_library = {"hits": 0, "misses": 0}
+        self.llm_cache = {"redis_hits": 0, "db_hits": 0, "misses": 0, "tokens_saved": 0}
+        self.llm_resilience = {"retries": 0, "timeouts": 0, "breaker_opens": 0, "breaker_state": "closed"}
+        self.llm_validation = {"valid": 0, "repaired": 0, "rejected": 0}
         self.start_time = datetime.utcnow()
     
     def increment_request(self, endpoint: str, method: str):
@@ -60,6 +69,45 @@ class MetricsCollector:
         if metric_name in self.business_metrics:
             self.business_metrics[metric_name] += 1
     
+    def set_llm_load(self, active: Dict[str, int], queued: Dict[str, int]):
+        """Track LLM calls in flight and callers waiting for a slot, per tier."""
+        for tier in self.llm:
+            self.llm[tier]["active"] = active.get(tier, 0)
+            self.llm[tier]["queued"] = queued.get(tier, 0)
+    
+    def record_llm_wait(self, tier: str, wait_ms: float):
+        """Track how long a caller of the given tier waited for an LLM slot."""
+        self.llm_wait_times[tier].append(wait_ms)
+        if len(self.llm_wait_times[tier]) > 100:
+            self.llm_wait_times[tier] = self.llm_wait_times[tier][-100:]
+    
+    def increment_llm_rejection(self, tier: str, reason: str):
+        """Track an LLM call refused with 503 (reason: queue_full or timeout)."""
+        self.llm[tier][f"rejected_{reason}"] += 1
+    
+    def record_roadmap_library(self, hit: bool):
+        """Track whether a goal reused a library roadmap or needed generation."""
+        self.roadmap_library["hits" if hit else "misses"] += 1
+    
+    def increment_llm_resilience(self, counter: str):
+        """Track an LLM call retry or timeout."""
+        self.llm_resilience[counter] += 1
+    
+    def set_llm_breaker_state(self, state: str):
+        """Track the LLM circuit breaker state (closed, open or half_open)."""
+        self.llm_resilience["breaker_state"] = state
+        if state == "open":
+            self.llm_resilience["breaker_opens"] += 1
+    
+    def record_llm_cache(self, result: str, tokens_saved: int = 0):
+        """Track an LLM response cache lookup (result: redis_hits, db_hits or misses)."""
+        self.llm_cache[result] += 1
+        self.llm_cache["tokens_saved"] += tokens_saved
+    
+    def record_llm_validation(self, result: str):
+        """Track how an LLM payload fared in validation (result: valid, repaired or rejected)."""
+        self.llm_validation[result] += 1
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get current metrics summary."""
         uptime_seconds = (datetime.utcnow() - self.start_time).total_seconds()
@@ -93,6 +141,29 @@ class MetricsCollector:
                 {"endpoint": endpoint, "avg_ms": round(ms, 2)}
                 for endpoint, ms in slowest_endpoints
             ],
+            "llm": {
+                tier: {
+                    **counters,
+                    "avg_wait_ms": round(sum(self.llm_wait_times[tier]) / len(self.llm_wait_times[tier]), 2) if self.llm_wait_times[tier] else 0,
+                    "max_wait_ms": round(max(self.llm_wait_times[tier]), 2) if self.llm_wait_times[tier] else 0,
+                }
+                for tier, counters in self.llm.items()
+            },
+            "roadmap_library": {
+                **self.roadmap_library,
+                "hit_rate_percent": round(
+                    self.roadmap_library["hits"] / (self.roadmap_library["hits"] + self.roadmap_library["misses"]) * 100, 2
+                ) if self.roadmap_library["hits"] + self.roadmap_library["misses"] else 0,
+            },
+            "llm_resilience": dict(self.llm_resilience),
+            "llm_validation": dict(self.llm_validation),
+            "llm_cache": {
+                **self.llm_cache,
+                "hit_rate_percent": round(
+                    (self.llm_cache["redis_hits"] + self.llm_cache["db_hits"])
+                    / (self.llm_cache["redis_hits"] + self.llm_cache["db_hits"] + self.llm_cache["misses"]) * 100, 2
+                ) if self.llm_cache["redis_hits"] + self.llm_cache["db_hits"] + self.llm_cache["misses"] else 0,
+            },
             "business_metrics": {
                 "users_registered": self.business_metrics["users_registered"],
                 "goals_created": self.business_metrics["goals_created"],
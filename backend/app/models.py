@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSON
@@ -48,6 +48,11 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(255), nullable=True)  # Nullable for OAuth users
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     total_exp: Mapped[int] = mapped_column(Integer, default=0, index=True) 
+
+    # Denormalized progression counters (kept in step by create_goal/submit_level_quiz,
+    # repaired by progression.reconcile_progression_counters)
+    levels_completed: Mapped[int] = mapped_column(Integer, default=0)
+    levels_total: Mapped[int] = mapped_column(Integer, default=0)
     
     # authentication
     refresh_token_hash: Mapped[str | None] = mapped_column(String(255), nullable=True)
@@ -118,4 +123,45 @@ class Level(Base):
     roadmap: Mapped["Roadmap"] = relationship("Roadmap", back_populates="levels")
 
 
+class RoadmapTemplate(Base):
+    """A generated roadmap kept for reuse by goals with the same normalized description"""
+    __tablename__ = "roadmap_templates"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    description_key: Mapped[str] = mapped_column(String(64), nullable=False, index=True)  # sha256 of normalized_description
+    normalized_description: Mapped[str] = mapped_column(Text, nullable=False)
+    roadmap: Mapped[dict] = mapped_column(JSON, nullable=False)  # generate_roadmap() output
+    hit_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    last_used_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class LLMResponse(Base):
+    """A chat completion kept for reuse by identical prompts (durable tier of app.llm_cache)"""
+    __tablename__ = "llm_responses"
 
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of model, messages, temperature, response_format
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    hit_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    last_used_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class LLMUsage(Base):
+    """LLM token usage, summed per (day, endpoint, user, purpose, model) between flushes (see app.llm_usage)"""
+    __tablename__ = "llm_usage"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    day: Mapped[Date] = mapped_column(Date, nullable=False, index=True)  # UTC
+    endpoint: Mapped[str] = mapped_column(String(100), nullable=False)
+    user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    purpose: Mapped[str] = mapped_column(String(50), nullable=False)  # roadmap_skeleton, level_explanation, quiz
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    calls: Mapped[int] = mapped_column(Integer, default=0)
+    cache_hits: Mapped[int] = mapped_column(Integer, default=0)  # answered from the LLM response cache
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    latency_ms: Mapped[int] = mapped_column(Integer, default=0)  # summed over calls
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy import func
+from sqlalchemy import func, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Annotated
@@ -14,6 +14,59 @@ from .logger import logger
 
 router = APIRouter(prefix="/progression", tags=["progression"])
 
+
+async def adjust_progression_counters(db: AsyncSession, user_id: int, levels_total: int = 0, levels_completed: int = 0):
+    """
+    Add to a user's progression counters in one atomic UPDATE (does not commit).
+
+    SET levels_total = levels_total + n rather than read-modify-write on a
+    loaded User, so concurrent generations and quiz submissions can't
+    overwrite each other's increments.
+    """
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            levels_total=User.levels_total + levels_total,
+            levels_completed=User.levels_completed + levels_completed
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reconcile_progression_counters(db: AsyncSession) -> int:
+    """
+    Recompute users.levels_completed / levels_total from the levels table.
+
+    The counters are maintained incrementally (adjust_progression_counters)
+    by goal creation and submit_level_quiz; this repairs any drift in a single UPDATE. Only rows
+    whose counters are wrong are written. Returns the number of users fixed.
+    """
+    def level_count(*conditions):
+        return (
+            select(func.count(Level.id))
+            .join(Roadmap, Level.roadmap_id == Roadmap.id)
+            .join(Goal, Roadmap.goal_id == Goal.id)
+            .where(Goal.user_id == User.id, *conditions)
+            .correlate(User)
+            .scalar_subquery()
+        )
+
+    total = level_count()
+    completed = level_count(Level.status == LevelStatus.COMPLETED)
+
+    result = await db.execute(
+        update(User)
+        .where(or_(User.levels_total != total, User.levels_completed != completed))
+        .values(levels_total=total, levels_completed=completed)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+    logger.info("Progression counters reconciled", users_fixed=result.rowcount, event="progression_reconciled")
+    return result.rowcount
+
+
 @router.get("/stats", response_model=StatsResponse)
 async def get_user_progression(
     request: Request,
@@ -26,31 +79,10 @@ async def get_user_progression(
     # Rate limiting: 30 requests per minute (read-only, less restrictive)
     await check_rate_limit(request, "get_stats", limit=30, window=60)
     
-    # Fetch total XP from user
+    # Counters are denormalized onto the user row, so this is a primary-key read
     total_xp = current_user.total_exp
-
-    # Count completed levels
-    result = await db.execute(
-        select(func.count())
-        .select_from(Level)
-        .join(Roadmap, Level.roadmap_id == Roadmap.id)
-        .join(Goal, Roadmap.goal_id == Goal.id)
-        .where(
-            Goal.user_id == current_user.id,
-            Level.status == LevelStatus.COMPLETED
-        )
-    )
-    levels_completed = result.scalar_one()
-    
-    # Count total levels for progression percentage
-    result = await db.execute(
-        select(func.count())
-        .select_from(Level)
-        .join(Roadmap, Level.roadmap_id == Roadmap.id)
-        .join(Goal, Roadmap.goal_id == Goal.id)
-        .where(Goal.user_id == current_user.id)
-    )
-    total_levels = result.scalar_one()
+    levels_completed = current_user.levels_completed
+    total_levels = current_user.levels_total
 
     return StatsResponse(
         email=current_user.email,
@@ -0,0 +1,186 @@
+"""
+Content-addressed cache of generated quizzes.
+
+A quiz depends only on the level title and its topic names, so levels with
+the same content (the same user reloading, or many users on similar
+roadmaps) can share quizzes. Each key holds up to quiz_cache_variants
+quizzes in a Redis list; a random one is served per request so retakes don't
+always see the same questions.
+
+Separately, a per-level slot holds one quiz pre-generated when the level's
+last topic is completed (prefetch_level_quiz), so taking the quiz usually
+doesn't wait on anything.
+
+Keys live under the cache namespace (cleared by clear_cache), expire after
+quiz_cache_ttl_seconds without a write, and an access-time index in a sorted
+set evicts the least recently used keys beyond quiz_cache_max_keys.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Any, Dict
+
+import redis
+
+from app.ai_service import generate_quiz_for_level
+from app.cache import CACHE_PREFIX, redis_client
+from app.config import settings
+from app.logger import logger
+
+
+QUIZ_KEY_PREFIX = f"{CACHE_PREFIX}quiz:"
+QUIZ_INDEX_KEY = f"{CACHE_PREFIX}quiz-index"
+LEVEL_QUIZ_PREFIX = f"{CACHE_PREFIX}quiz-level:"
+
+# Top-ups and pre-generations in flight in this worker (strong refs keep tasks alive)
+_topup_tasks: set[asyncio.Task] = set()
+_topping_up: set[str] = set()
+_prefetching: set[int] = set()
+
+
+def _normalize(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def quiz_content_key(level_title: str, level_topics: list) -> str:
+    """Hash of the normalized level title and topic names (order-insensitive)"""
+    topic_names = sorted(_normalize(topic.get("name", "")) for topic in level_topics or [])
+    content = json.dumps([_normalize(level_title), topic_names])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _variants_key(content_key: str) -> str:
+    return f"{QUIZ_KEY_PREFIX}{content_key}"
+
+
+async def get_quiz_variants(content_key: str) -> list[Dict[str, Any]]:
+    """All cached quizzes for a content key (marks the key as recently used)"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.lrange(_variants_key(content_key), 0, -1)
+        pipe.zadd(QUIZ_INDEX_KEY, {content_key: time.time()})
+        variants, _ = await pipe.execute()
+    except redis.RedisError:
+        logger.warning("Redis error reading quiz cache", exc_info=True, event="quiz_cache_error", key=content_key)
+        return []
+    return [json.loads(variant) for variant in variants]
+
+
+async def store_quiz_variant(content_key: str, quiz: Dict[str, Any]):
+    """Add a quiz variant, keeping the newest quiz_cache_variants"""
+    key = _variants_key(content_key)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.lpush(key, json.dumps(quiz))
+        pipe.ltrim(key, 0, settings.quiz_cache_variants - 1)
+        pipe.expire(key, settings.quiz_cache_ttl_seconds)
+        pipe.zadd(QUIZ_INDEX_KEY, {content_key: time.time()})
+        pipe.zcard(QUIZ_INDEX_KEY)
+        results = await pipe.execute()
+        if results[-1] > settings.quiz_cache_max_keys:
+            await _evict_least_recently_used(results[-1] - settings.quiz_cache_max_keys)
+    except redis.RedisError:
+        logger.error("Redis error writing quiz cache", exc_info=True, event="quiz_cache_error", key=content_key)
+
+
+async def _evict_least_recently_used(count: int):
+    content_keys = await redis_client.zrange(QUIZ_INDEX_KEY, 0, count - 1)
+    if not content_keys:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.delete(*[_variants_key(content_key) for content_key in content_keys])
+    pipe.zrem(QUIZ_INDEX_KEY, *content_keys)
+    await pipe.execute()
+    logger.info("Evicted least recently used quizzes", count=len(content_keys), event="quiz_cache_evicted")
+
+
+async def _top_up(content_key: str, level_title: str, level_topics: list, priority: str):
+    """
+    Generate one more variant in the background (never blocks a request).
+
+    Runs at the requesting user's priority and, as the task inherits the
+    request's usage scope, counts against that user's token quota.
+    """
+    try:
+        quiz = await generate_quiz_for_level(level_title, level_topics, priority=priority, cache=False)  # a new variant
+        await store_quiz_variant(content_key, quiz)
+    except Exception:
+        logger.warning("Background quiz variant generation failed", exc_info=True, event="quiz_topup_error", key=content_key)
+    finally:
+        _topping_up.discard(content_key)
+
+
+def _schedule_top_up(content_key: str, level_title: str, level_topics: list, priority: str):
+    if content_key in _topping_up:
+        return
+    _topping_up.add(content_key)
+    task = asyncio.create_task(_top_up(content_key, level_title, level_topics, priority))
+    _topup_tasks.add(task)
+    task.add_done_callback(_topup_tasks.discard)
+
+
+async def get_or_generate_quiz(level_title: str, level_topics: list, priority: str = "free") -> Dict[str, Any]:
+    """
+    Serve a cached quiz for this content, generating one only on a miss.
+
+    With at least one variant cached, a random variant is returned at once
+    and, while there are fewer than quiz_cache_variants, another one is
+    generated in the background. Only a cold key waits on the LLM.
+    """
+    content_key = quiz_content_key(level_title, level_topics)
+
+    variants = await get_quiz_variants(content_key)
+    if variants:
+        if len(variants) < settings.quiz_cache_variants:
+            _schedule_top_up(content_key, level_title, level_topics, priority)
+        logger.info("Quiz cache hit", key=content_key, variants=len(variants), event="quiz_cache_hit")
+        return random.choice(variants)
+
+    logger.info("Quiz cache miss", key=content_key, event="quiz_cache_miss")
+    quiz = await generate_quiz_for_level(level_title, level_topics, priority=priority)
+    await store_quiz_variant(content_key, quiz)
+    return quiz
+
+
+# ========== Per-level pre-generated quiz ==========
+
+def _level_quiz_key(level_id: int) -> str:
+    return f"{LEVEL_QUIZ_PREFIX}{level_id}"
+
+
+async def _prefetch(level_id: int, level_title: str, level_topics: list, priority: str):
+    try:
+        quiz = await get_or_generate_quiz(level_title, level_topics, priority=priority)
+        await redis_client.setex(_level_quiz_key(level_id), settings.quiz_prefetch_ttl_seconds, json.dumps(quiz))
+        logger.info("Quiz pre-generated", level_id=level_id, event="quiz_prefetched")
+    except Exception:
+        logger.warning("Quiz pre-generation failed", exc_info=True, event="quiz_prefetch_error", level_id=level_id)
+    finally:
+        _prefetching.discard(level_id)
+
+
+def prefetch_level_quiz(level_id: int, level_title: str, level_topics: list, priority: str = "free"):
+    """
+    Prepare the level's quiz in the background and park it in the level's slot.
+
+    Must be called with plain values (not ORM objects): the task outlives the
+    request and its DB session.
+    """
+    if level_id in _prefetching:
+        return
+    _prefetching.add(level_id)
+    task = asyncio.create_task(_prefetch(level_id, level_title, level_topics, priority))
+    _topup_tasks.add(task)
+    task.add_done_callback(_topup_tasks.discard)
+
+
+async def take_prefetched_quiz(level_id: int) -> Dict[str, Any] | None:
+    """Return and clear the level's pre-generated quiz (a retake gets a fresh one)"""
+    try:
+        raw = await redis_client.getdel(_level_quiz_key(level_id))
+    except redis.RedisError:
+        logger.warning("Redis error reading pre-generated quiz", exc_info=True, event="quiz_cache_error", level_id=level_id)
+        return None
+    return json.loads(raw) if raw else None
@@ -3,15 +3,22 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from app.auth import get_current_user
 from app.db import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from typing import Annotated
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 
-from app.ai_service import generate_quiz_for_level
+from app.ai_service import LLMError
+from app.quiz_cache import get_or_generate_quiz, take_prefetched_quiz
+from app.explanations import needs_explanations, prefetch_level_explanations
 from app.schemas import QuizSubmitRequest
 from app.models import Level, Roadmap, Goal, User, LevelStatus, GoalStatus
-from app.cache import delete_cache
+from app.cache import invalidate_tags
+from app.leaderboard import award_xp
+from app.goals import llm_priority
+from app.progression import adjust_progression_counters
+from app.llm_usage import set_usage_scope
 from app.rate_limiter import check_rate_limit
 from .logger import logger
 from .metrics import metrics
@@ -48,9 +55,14 @@ async def get_level_quiz(
             detail="Complete all topics before taking the quiz"
         )
     
-    # Generate quiz for the level based on its topics
+    set_usage_scope("GET /levels/{level_id}/quiz", current_user.id)
+
+    # Serve the quiz pre-generated on the last topic, else a cached one for the level's content,
+    # generating only on a miss
     try:
-        quiz_data = await generate_quiz_for_level(level.title, level.topics or [])
+        quiz_data = await take_prefetched_quiz(level.id)
+        if quiz_data is None:
+            quiz_data = await get_or_generate_quiz(level.title, level.topics or [], priority=llm_priority(current_user))
         
         # Track business metric
         metrics.increment_business_metric("quizzes_generated")
@@ -67,6 +79,8 @@ async def get_level_quiz(
         await log_event(db, "quiz_generated", user_id=current_user.id, data={"level_id": level.id, "level_title": level.title})
         
         return response
+    except LLMError:
+        raise  # typed AI error response (handled in main.py)
     except Exception as e:
         logger.error("Failed to generate quiz", level_id=level_id, error=str(e), event="quiz_generation_failed")
         raise HTTPException(status_code=500, detail=str(e))
@@ -117,10 +131,17 @@ async def submit_level_quiz(
         # Update user's total XP
         current_user.total_exp += xp_earned
         
-        # Mark level as completed if not already
-        from app.models import LevelStatus
-        if level.status != LevelStatus.COMPLETED:
-            level.status = LevelStatus.COMPLETED
+        # Mark level as completed if not already; conditional UPDATE so a
+        # concurrent submission of the same level can't count it twice
+        newly_completed = await db.execute(
+            update(Level)
+            .where(Level.id == level.id, Level.status != LevelStatus.COMPLETED)
+            .values(status=LevelStatus.COMPLETED)
+            .execution_options(synchronize_session=False)
+        )
+        set_committed_value(level, "status", LevelStatus.COMPLETED)
+        if newly_completed.rowcount:
+            await adjust_progression_counters(db, current_user.id, levels_completed=1)
    
         # ✅ OPTIMIZED: Use pre-loaded data (no additional queries!)
         goal = level.roadmap.goal  # Already loaded via selectinload
@@ -142,9 +163,6 @@ async def submit_level_quiz(
         else:
             message = f"Congratulations! You earned {xp_earned} XP!"
         
-        # Clear relevant caches
-        delete_cache("leaderboard")
-        
         # Track business metric
         metrics.increment_business_metric("quizzes_completed")
 
@@ -157,6 +175,17 @@ async def submit_level_quiz(
         })
 
         await db.commit()
+
+        # Keep the leaderboard sorted set in step with the committed XP
+        await award_xp(current_user.id, xp_earned)
+
+        # Only now is the cached top 10 outdated: readers get the old one while it refreshes
+        await invalidate_tags("leaderboard", stale=True)
+
+        # Newly unlocked level: explain its topics before the user opens it
+        if next_level_unlocked and needs_explanations(next_level.topics):
+            set_usage_scope("POST /levels/{level_id}/quiz/submit", current_user.id)
+            prefetch_level_explanations(next_level.id, priority=llm_priority(current_user))
     else:
         message = "You didn't pass this time. Review the topics and try again!"
     
@@ -28,7 +28,7 @@ async def check_rate_limit(request: Request, key: str, limit: int, window: int):
     cache_key = f"rate_limit:{ip}:{key}"
     
     try:
-        count = redis_client.get(cache_key)
+        count = await redis_client.get(cache_key)
         if count and int(count) >= limit:
             raise HTTPException(
                 status_code=429, 
@@ -39,7 +39,7 @@ async def check_rate_limit(request: Request, key: str, limit: int, window: int):
         pipe = redis_client.pipeline()
         pipe.incr(cache_key)
         pipe.expire(cache_key, window)
-        pipe.execute()
+        await pipe.execute()
     except HTTPException:
         # Re-raise HTTP exceptions (like rate limit exceeded)
         raise
@@ -0,0 +1,178 @@
+"""
+Shared roadmap library.
+
+Many goals are near-identical ("learn python", "I want to learn Python!").
+Descriptions are normalized - lowercased, punctuation and stopwords dropped,
+remaining words (in any script) de-duplicated and sorted - and hashed;
+generated roadmaps are stored under that key and reused for later goals with
+the same key, with fresh completion state. Descriptions with too little left
+after normalization (fewer than MIN_NORMALIZED_CHARS word characters) never
+use the library: a key that short says too little about the goal.
+
+roadmap_library_policy decides when a match is reused:
+    off       always generate
+    reuse     reuse any stored roadmap for the key
+    variants  generate until roadmap_library_variants roadmaps exist for the
+              key, then reuse a random one (keeps some variety)
+Templates older than roadmap_library_max_age_days are never reused.
+"""
+import copy
+import hashlib
+import random
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai_service import stream_roadmap
+from app.config import settings
+from app.logger import logger
+from app.metrics import metrics
+from app.models import RoadmapTemplate
+
+
+MIN_NORMALIZED_CHARS = 3
+
+# Filler words that don't change what the roadmap should cover
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be because been before being both but by can could
+do does doing for from get getting go going had has have having he her here him his how i i'd i'm
+if in into is it its just know let like me more most my myself need now of on once or other our
+out over please really should so some start started such than that the their them then there
+these they this those through to too up us very wanna want wanting was we were what when where
+which while who why will with would you your
+learn learning study studying understand understanding become get better basics
+""".split())
+
+
+def normalize_description(description: str) -> str:
+    """
+    Reduce a goal description to its sorted set of meaningful words.
+
+    Returns "" (library not used) when the words left are too short to tell
+    goals apart.
+    """
+    words = re.findall(r"[\w+#.]+", description.lower())
+    words = {word.strip(".") for word in words}
+    words = sorted(word for word in words if word and word not in STOPWORDS)
+    if sum(len(word) for word in words) < MIN_NORMALIZED_CHARS:
+        return ""
+    return " ".join(words)
+
+
+def description_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def fresh_copy(roadmap_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Deep copy of a stored roadmap with every topic marked not completed"""
+    data = copy.deepcopy(roadmap_data)
+    for level in data["roadmap"]["levels"]:
+        for topic in level.get("topics") or []:
+            topic["completed"] = False
+    return data
+
+
+def _reusable(normalized: str) -> tuple:
+    """WHERE clauses for the templates that may be reused for a normalized description"""
+    min_created_at = datetime.now(timezone.utc) - timedelta(days=settings.roadmap_library_max_age_days)
+    return RoadmapTemplate.description_key == description_key(normalized), RoadmapTemplate.created_at >= min_created_at
+
+
+async def lookup_roadmap(db: AsyncSession, description: str) -> Optional[Dict[str, Any]]:
+    """
+    Return a fresh copy of a reusable library roadmap for description, or None.
+
+    Counts a hit or miss for the hit-rate metrics; a hit bumps the template's
+    usage stats (committed with the caller's transaction).
+    """
+    if settings.roadmap_library_policy == "off":
+        return None
+
+    normalized = normalize_description(description)
+    if not normalized:
+        return None
+
+    templates = (await db.scalars(select(RoadmapTemplate).where(*_reusable(normalized)))).all()
+
+    if not templates or (settings.roadmap_library_policy == "variants" and len(templates) < settings.roadmap_library_variants):
+        metrics.record_roadmap_library(hit=False)
+        logger.info("Roadmap library miss", normalized=normalized, templates=len(templates), event="roadmap_library_miss")
+        return None
+
+    template = random.choice(templates)
+    template.hit_count += 1
+    template.last_used_at = func.now()
+    metrics.record_roadmap_library(hit=True)
+    logger.info("Roadmap library hit", normalized=normalized, template_id=template.id, event="roadmap_library_hit")
+    return fresh_copy(template.roadmap)
+
+
+async def library_variant(db: AsyncSession, description: str) -> int:
+    """
+    Number of reusable templates for description, used as the LLM cache variant.
+
+    A retry of a failed generation asks for the same variant and is served
+    from the LLM cache; once that roadmap is saved, the next generation asks
+    for a new variant instead of replaying it into the library.
+    """
+    normalized = normalize_description(description)
+    if settings.roadmap_library_policy == "off" or not normalized:
+        return 0
+    return await db.scalar(select(func.count()).select_from(RoadmapTemplate).where(*_reusable(normalized)))
+
+
+def save_roadmap(db: AsyncSession, description: str, roadmap_data: Dict[str, Any]):
+    """Add a generated roadmap to the library (committed with the caller's transaction)"""
+    if settings.roadmap_library_policy == "off":
+        return
+    normalized = normalize_description(description)
+    if not normalized:
+        return
+    db.add(RoadmapTemplate(
+        description_key=description_key(normalized),
+        normalized_description=normalized,
+        roadmap=fresh_copy(roadmap_data)
+    ))
+
+
+async def roadmap_parts(
+    session_factory: Callable[[], AsyncSession],
+    description: str,
+    priority: str = "free"
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    stream_roadmap() backed by the library.
+
+    A library hit yields the stored header and levels at once; otherwise the
+    roadmap is streamed from the AI and saved to the library when complete.
+    The library is read and written in short sessions from session_factory,
+    so no connection is held while the AI streams.
+    """
+    async with session_factory() as db:
+        roadmap_data = await lookup_roadmap(db, description)
+        variant = 0 if roadmap_data is not None else await library_variant(db, description)
+        await db.commit()  # template usage stats of a hit
+
+    if roadmap_data is not None:
+        levels = roadmap_data["roadmap"].pop("levels")
+        yield "header", roadmap_data
+        for level in levels:
+            yield "level", level
+        return
+
+    header, levels = None, []
+    async for kind, data in stream_roadmap(description, priority=priority, cache_variant=variant):
+        if kind == "header":
+            header = data
+        else:
+            levels.append(data)
+        yield kind, data
+
+    header = copy.deepcopy(header)
+    header["roadmap"]["levels"] = sorted(levels, key=lambda level: level["order"])
+    async with session_factory() as db:
+        save_roadmap(db, description, header)
+        await db.commit()
@@ -95,6 +95,13 @@ class GoalResponse(BaseModel):
         from_attributes = True
 
 
+class GoalJobResponse(BaseModel):
+    job_id: str
+    status: str  # pending | running | done | failed
+    goal_id: Optional[int] = None
+    error: Optional[dict] = None
+
+
 class GoalListItem(BaseModel):
     """Simplified goal for list view (no roadmap details)"""
     id: int
@@ -154,7 +161,7 @@ class QuizResultResponse(BaseModel):
 
 
 class Leaderboardcondidate(BaseModel):
-    rank: int
+    rank: Optional[int] = None  # None when unranked (e.g. no XP in a time window)
     user_id: int
     email: str
     total_exp: int
@@ -167,6 +174,19 @@ class LeaderboardResponse(BaseModel):
     current_user: Leaderboardcondidate
 
 
+class LeaderboardPageResponse(BaseModel):
+    entries: List[Leaderboardcondidate]
+    offset: int
+    limit: int
+    total: int
+    next_offset: Optional[int] = None  # None on the last page
+
+
+class LeaderboardAroundMeResponse(BaseModel):
+    entries: List[Leaderboardcondidate]
+    current_user: Leaderboardcondidate
+
+
 
 # progress schemas
 
@@ -12,7 +12,8 @@ from .models import User
 from .auth import hash_password, verify_password, create_access_token, get_current_user, create_refresh_token, hash_refresh_token, decode_token
 from .schemas import RegisterRequest, UserResponse, TokenResponse, OAuthLoginRequest, UpdateProfileRequest
 from .config import settings
-from .cache import delete_cache
+from .cache import invalidate_tags
+from .leaderboard import add_user_to_leaderboard
 from .logger import logger
 from app.rate_limiter import check_rate_limit
 from .metrics import metrics
@@ -53,8 +54,9 @@ async def register(
     # Log event
     await log_event(db, "user_registered", user_id=new_user.id, data={"email": new_user.email})
 
-    # delete leaderboard cache as new user is added
-    delete_cache("leaderboard")
+    # leaderboard is outdated as new user is added
+    await add_user_to_leaderboard(new_user.id)
+    await invalidate_tags("leaderboard", stale=True)
     return new_user
 
 @router.post("/login", response_model=TokenResponse)
@@ -204,6 +206,8 @@ async def oauth_login(
         await db.commit()
         await db.refresh(user)
         
+        await add_user_to_leaderboard(user.id)
+
         # Log new OAuth user registration
         await log_event(db, "user_registered_oauth", user_id=user.id, data={
             "email": user.email,
@@ -1,8 +1,16 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.logger import logger
 from app.logging_config import configure_external_loggers
+from app.cache import close_cache, run_invalidation_listener
+from app.leaderboard import ensure_leaderboard
+from app.jobs import start_job_workers, stop_job_workers
+from app.ai_service import LLMError, get_llm_backend, close_llm_backend
+from app.llm_usage import run_usage_flusher
 import sentry_sdk
 from sentry_sdk.integrations.fastapi import FastApiIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
@@ -30,7 +38,26 @@ else:
 
 logger.info("starting_app: THIS RUN")
 
-app = FastAPI(title="QuestPath API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks for shared clients and background tasks"""
+    invalidation_listener = asyncio.create_task(run_invalidation_listener())
+    await ensure_leaderboard()  # cold start: build the sorted set from Postgres
+    get_llm_backend()  # pick the LLM backend and open its connection pool up front
+    start_job_workers()
+    usage_flusher = asyncio.create_task(run_usage_flusher())
+    yield
+    await stop_job_workers()
+    await close_llm_backend()
+    usage_flusher.cancel()  # writes out the usage summed since the last flush
+    await asyncio.gather(usage_flusher, return_exceptions=True)
+    invalidation_listener.cancel()
+    await asyncio.gather(invalidation_listener, return_exceptions=True)
+    await close_cache()
+
+
+app = FastAPI(title="QuestPath API", version="1.0.0", lifespan=lifespan)
 
 # Configure all external library logging
 configure_external_loggers()
@@ -59,6 +86,23 @@ from app.middleware import add_request_tracking, add_security_headers
 app.middleware("http")(add_request_tracking)
 app.middleware("http")(add_security_headers)
 
+
+@app.exception_handler(LLMError)
+async def llm_error_handler(request: Request, exc: LLMError):
+    """AI call failed (busy, provider down, timed out, breaker open) - typed errors carry their status"""
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={
+            "detail": {
+                "message": exc.message,
+                "code": exc.code,
+                "retry_after": exc.retry_after
+            }
+        },
+        headers=headers
+    )
+
  
 
 
@@ -0,0 +1,36 @@
+"""add llm_responses table
+
+Revision ID: add_llm_responses
+Revises: add_roadmap_templates
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_llm_responses'
+down_revision = 'add_roadmap_templates'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'llm_responses',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('completion_tokens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('hit_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_llm_responses_last_used_at', 'llm_responses', ['last_used_at'])
+
+
+def downgrade():
+    op.drop_index('ix_llm_responses_last_used_at', table_name='llm_responses')
+    op.drop_table('llm_responses')
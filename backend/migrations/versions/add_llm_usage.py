@@ -0,0 +1,44 @@
+"""add llm_usage table
+
+Revision ID: add_llm_usage
+Revises: add_llm_responses
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_llm_usage'
+down_revision = 'add_llm_responses'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'llm_usage',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('endpoint', sa.String(length=100), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('purpose', sa.String(length=50), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('calls', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cache_hits', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completion_tokens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('latency_ms', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_llm_usage_day', 'llm_usage', ['day'])
+    op.create_index('ix_llm_usage_user_id', 'llm_usage', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_llm_usage_user_id', table_name='llm_usage')
+    op.drop_index('ix_llm_usage_day', table_name='llm_usage')
+    op.drop_table('llm_usage')
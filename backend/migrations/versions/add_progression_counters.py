@@ -0,0 +1,43 @@
+"""add denormalized progression counters to users
+
+Revision ID: add_progression_counters
+Revises: add_is_admin_column
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_progression_counters'
+down_revision = 'add_is_admin_column'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('levels_completed', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('levels_total', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from existing levels
+    op.execute("""
+        UPDATE users SET
+            levels_total = (
+                SELECT count(levels.id) FROM levels
+                JOIN roadmaps ON levels.roadmap_id = roadmaps.id
+                JOIN goals ON roadmaps.goal_id = goals.id
+                WHERE goals.user_id = users.id
+            ),
+            levels_completed = (
+                SELECT count(levels.id) FROM levels
+                JOIN roadmaps ON levels.roadmap_id = roadmaps.id
+                JOIN goals ON roadmaps.goal_id = goals.id
+                WHERE goals.user_id = users.id AND levels.status = 'COMPLETED'
+            )
+    """)
+
+
+def downgrade():
+    op.drop_column('users', 'levels_total')
+    op.drop_column('users', 'levels_completed')
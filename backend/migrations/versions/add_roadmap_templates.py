@@ -0,0 +1,38 @@
+"""add roadmap_templates table
+
+Revision ID: add_roadmap_templates
+Revises: add_progression_counters
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_roadmap_templates'
+down_revision = 'add_progression_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'roadmap_templates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('description_key', sa.String(length=64), nullable=False),
+        sa.Column('normalized_description', sa.Text(), nullable=False),
+        sa.Column('roadmap', sa.JSON(), nullable=False),
+        sa.Column('hit_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_roadmap_templates_id', 'roadmap_templates', ['id'])
+    op.create_index('ix_roadmap_templates_description_key', 'roadmap_templates', ['description_key'])
+
+
+def downgrade():
+    op.drop_index('ix_roadmap_templates_description_key', table_name='roadmap_templates')
+    op.drop_index('ix_roadmap_templates_id', table_name='roadmap_templates')
+    op.drop_table('roadmap_templates')
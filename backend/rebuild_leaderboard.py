@@ -0,0 +1,33 @@
+"""
+Script to rebuild the Redis leaderboard from the users table.
+
+Use after a Redis wipe/failover or to repair drift between the sorted set
+and users.total_exp.
+
+Usage:
+    python rebuild_leaderboard.py
+"""
+import asyncio
+import sys
+
+from app.cache import close_cache, invalidate_tags
+from app.leaderboard import rebuild_leaderboard
+
+
+async def main():
+    """Rebuild the sorted set and drop the cached top 10."""
+    try:
+        users_loaded = await rebuild_leaderboard()
+        await invalidate_tags("leaderboard")
+        print(f"✅ Leaderboard rebuilt with {users_loaded} users")
+        return True
+    except Exception as e:
+        print(f"❌ Leaderboard rebuild failed: {e}")
+        return False
+    finally:
+        await close_cache()
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
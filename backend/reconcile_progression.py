@@ -0,0 +1,32 @@
+"""
+Script to repair the denormalized progression counters on users.
+
+Recomputes users.levels_completed / levels_total from the levels table.
+Safe to run at any time (e.g. from cron); only drifted rows are written.
+
+Usage:
+    python reconcile_progression.py
+"""
+import asyncio
+import sys
+
+from app.db import async_session
+from app.progression import reconcile_progression_counters
+
+
+async def main():
+    """Reconcile every user's progression counters."""
+    async with async_session() as db:
+        try:
+            users_fixed = await reconcile_progression_counters(db)
+            print(f"✅ Progression counters reconciled ({users_fixed} users fixed)")
+            return True
+        except Exception as e:
+            await db.rollback()
+            print(f"❌ Reconciliation failed: {e}")
+            return False
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
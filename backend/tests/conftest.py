@@ -8,9 +8,10 @@ import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, patch
 
 from app.db import get_db, Base
+from app.cache import local_cache
 from main import app
 # Import models so SQLAlchemy knows about all tables
 from app import models  # This loads all model classes
@@ -75,10 +76,13 @@ async def client(test_engine):
     
     app.dependency_overrides[get_db] = override_get_db
     
-    # Create HTTP client
+    # Create HTTP client (background jobs open their own sessions, point them here too)
     transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as ac:
-        yield ac
+    with patch("app.goals.async_session", async_session_maker), \
+         patch("app.explanations.async_session", async_session_maker), \
+         patch("app.llm_usage.async_session", async_session_maker):
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            yield ac
     
     # Cleanup
     app.dependency_overrides.clear()
@@ -97,58 +101,229 @@ def mock_redis():
     # Create a fake Redis with in-memory storage
     fake_redis_storage = {}
     
-    def fake_get(key):
+    async def fake_get(key):
         return fake_redis_storage.get(key)
     
-    def fake_set(key, value):
+    async def fake_getdel(key):
+        return fake_redis_storage.pop(key, None)
+    
+    async def fake_set(key, value, nx=False, px=None, ex=None):
+        if nx and key in fake_redis_storage:
+            return None
         fake_redis_storage[key] = value
         return True
     
-    def fake_setex(key, seconds, value):
+    async def fake_setex(key, seconds, value):
         fake_redis_storage[key] = value
         return True
     
-    def fake_incr(key):
+    async def fake_incr(key):
         current = int(fake_redis_storage.get(key, 0))
         fake_redis_storage[key] = str(current + 1)
         return current + 1
     
-    def fake_expire(key, seconds):
-        return True
+    async def fake_incrby(key, amount):
+        current = int(fake_redis_storage.get(key, 0))
+        fake_redis_storage[key] = str(current + amount)
+        return current + amount
     
-    def fake_delete(key):
-        fake_redis_storage.pop(key, None)
+    async def fake_expire(key, seconds):
         return True
     
-    def fake_flushdb():
+    async def fake_delete(*keys):
+        return sum(fake_redis_storage.pop(key, None) is not None for key in keys)
+    
+    async def fake_flushdb():
         fake_redis_storage.clear()
         return True
     
-    def fake_pipeline():
-        # Mock pipeline object
-        mock_pipeline = MagicMock()
-        mock_pipeline.incr = MagicMock(return_value=None)
-        mock_pipeline.expire = MagicMock(return_value=None)
-        mock_pipeline.execute = MagicMock(return_value=[1, True])
-        return mock_pipeline
+    async def fake_sadd(key, *members):
+        fake_redis_storage.setdefault(key, set()).update(members)
+        return len(members)
+    
+    async def fake_smembers(key):
+        return set(fake_redis_storage.get(key, set()))
+    
+    async def fake_scan_iter(match=None, count=None):
+        import fnmatch
+        for key in list(fake_redis_storage):
+            if match is None or fnmatch.fnmatch(key, match):
+                yield key
+    
+    # Sorted sets are stored as {member: score} dicts
+    def _zset_desc(key):
+        zset = fake_redis_storage.get(key, {})
+        return sorted(zset.items(), key=lambda item: (item[1], item[0]), reverse=True)
+    
+    async def fake_zadd(key, mapping, nx=False):
+        zset = fake_redis_storage.setdefault(key, {})
+        added = 0
+        for member, score in mapping.items():
+            if nx and str(member) in zset:
+                continue
+            added += str(member) not in zset
+            zset[str(member)] = float(score)
+        return added
+    
+    async def fake_zincrby(key, amount, member):
+        zset = fake_redis_storage.setdefault(key, {})
+        zset[str(member)] = zset.get(str(member), 0.0) + amount
+        return zset[str(member)]
+    
+    async def fake_zrevrange(key, start, end, withscores=False):
+        items = _zset_desc(key)
+        items = items[start:] if end == -1 else items[start:end + 1]
+        return items if withscores else [member for member, _ in items]
+    
+    async def fake_zrevrank(key, member):
+        members = [m for m, _ in _zset_desc(key)]
+        return members.index(str(member)) if str(member) in members else None
+    
+    async def fake_exists(*keys):
+        return sum(key in fake_redis_storage for key in keys)
+    
+    async def fake_zunionstore(dest, keys):
+        union = {}
+        for key in keys:
+            for member, score in fake_redis_storage.get(key, {}).items():
+                union[member] = union.get(member, 0.0) + score
+        fake_redis_storage.pop(dest, None)
+        if union:
+            fake_redis_storage[dest] = union
+        return len(union)
+    
+    async def fake_zcount(key, min_score, max_score):
+        def bound(value):
+            value = str(value)
+            if value in ("+inf", "-inf"):
+                return float(value), False
+            return (float(value[1:]), True) if value.startswith("(") else (float(value), False)
+        (low, low_open), (high, high_open) = bound(min_score), bound(max_score)
+        return sum(
+            (score > low if low_open else score >= low) and (score < high if high_open else score <= high)
+            for score in fake_redis_storage.get(key, {}).values()
+        )
+    
+    async def fake_zscore(key, member):
+        return fake_redis_storage.get(key, {}).get(str(member))
+    
+    async def fake_zcard(key):
+        return len(fake_redis_storage.get(key, {}))
+    
+    async def fake_rename(src, dst):
+        fake_redis_storage[dst] = fake_redis_storage.pop(src)
+        return True
+    
+    async def fake_zrange(key, start, end):
+        items = sorted(fake_redis_storage.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        items = items[start:] if end == -1 else items[start:end + 1]
+        return [member for member, _ in items]
+    
+    async def fake_zrem(key, *members):
+        zset = fake_redis_storage.get(key, {})
+        return sum(zset.pop(str(member), None) is not None for member in members)
+    
+    # Lists are stored as Python lists (head first)
+    async def fake_lpush(key, *values):
+        items = fake_redis_storage.setdefault(key, [])
+        for value in values:
+            items.insert(0, value)
+        return len(items)
+    
+    async def fake_ltrim(key, start, end):
+        items = fake_redis_storage.get(key, [])
+        fake_redis_storage[key] = items[start:] if end == -1 else items[start:end + 1]
+        return True
+    
+    async def fake_lrange(key, start, end):
+        items = fake_redis_storage.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+    
+    async def fake_mget(*keys):
+        return [fake_redis_storage.get(key) for key in keys]
+    
+    class FakePipeline:
+        """Queues commands and runs them against the fake on execute()"""
+        def __init__(self):
+            self.commands = []
+        
+        def __getattr__(self, name):
+            command = getattr(mock_redis_client, name)
+            def queue(*args, **kwargs):
+                self.commands.append((command, args, kwargs))
+                return self
+            return queue
+        
+        async def execute(self):
+            results = [await command(*args, **kwargs) for command, args, kwargs in self.commands]
+            self.commands = []
+            return results
+    
+    def fake_pipeline(transaction=True):
+        return FakePipeline()
+    
+    async def fake_ping():
+        return True
+    
+    async def fake_publish(channel, message):
+        return 0
+    
+    async def fake_eval(script, numkeys, *args):
+        # Only script in use: compare-and-delete for rebuild locks
+        key, token = args[0], args[1]
+        if fake_redis_storage.get(key) == token:
+            fake_redis_storage.pop(key)
+            return 1
+        return 0
     
     # Replace real Redis with our fake one
     with patch('app.cache.redis_client') as mock_redis_client:
         mock_redis_client.get = fake_get
+        mock_redis_client.getdel = fake_getdel
         mock_redis_client.set = fake_set
         mock_redis_client.setex = fake_setex
         mock_redis_client.incr = fake_incr
+        mock_redis_client.incrby = fake_incrby
         mock_redis_client.expire = fake_expire
         mock_redis_client.delete = fake_delete
         mock_redis_client.flushdb = fake_flushdb
         mock_redis_client.pipeline = fake_pipeline
+        mock_redis_client.ping = fake_ping
+        mock_redis_client.publish = fake_publish
+        mock_redis_client.eval = fake_eval
+        mock_redis_client.mget = fake_mget
+        mock_redis_client.sadd = fake_sadd
+        mock_redis_client.smembers = fake_smembers
+        mock_redis_client.scan_iter = fake_scan_iter
+        mock_redis_client.zadd = fake_zadd
+        mock_redis_client.zincrby = fake_zincrby
+        mock_redis_client.zrevrange = fake_zrevrange
+        mock_redis_client.zrevrank = fake_zrevrank
+        mock_redis_client.zcard = fake_zcard
+        mock_redis_client.zscore = fake_zscore
+        mock_redis_client.zcount = fake_zcount
+        mock_redis_client.exists = fake_exists
+        mock_redis_client.zunionstore = fake_zunionstore
+        mock_redis_client.rename = fake_rename
+        mock_redis_client.zrange = fake_zrange
+        mock_redis_client.zrem = fake_zrem
+        mock_redis_client.lpush = fake_lpush
+        mock_redis_client.ltrim = fake_ltrim
+        mock_redis_client.lrange = fake_lrange
         
-        # Also patch in rate_limiter
-        with patch('app.rate_limiter.redis_client', mock_redis_client):
+        # Also patch in modules that import the client directly
+        with patch('app.rate_limiter.redis_client', mock_redis_client), \
+             patch('app.leaderboard.redis_client', mock_redis_client), \
+             patch('app.jobs.redis_client', mock_redis_client), \
+             patch('app.quiz_cache.redis_client', mock_redis_client), \
+             patch('app.explanations.redis_client', mock_redis_client), \
+             patch('app.llm_cache.redis_client', mock_redis_client), \
+             patch('app.llm_usage.redis_client', mock_redis_client):
             yield mock_redis_client
     
-    # Cleanup
+    # Cleanup (including the in-process cache tier)
     fake_redis_storage.clear()
+    local_cache.clear()
 
 
 # ========== FIXTURE 5: Mock OpenAI ==========
@@ -222,18 +397,33 @@ def mock_openai():
     }
     
     # Mock the generate_roadmap function
-    async def fake_generate_roadmap(description):
+    async def fake_generate_roadmap(description, **kwargs):
         return fake_roadmap_response
     
+    # Mock the streaming variant: header first, then one level at a time
+    async def fake_stream_roadmap(description, **kwargs):
+        header = {key: value for key, value in fake_roadmap_response.items() if key != "roadmap"}
+        header["roadmap"] = {"name": fake_roadmap_response["roadmap"]["name"]}
+        yield "header", header
+        for level in fake_roadmap_response["roadmap"]["levels"]:
+            yield "level", level
+    
     # Mock the generate_quiz function
-    async def fake_generate_quiz(level_title, level_topics):
+    async def fake_generate_quiz(level_title, level_topics, **kwargs):
         return fake_quiz_response
     
+    # Mock per-level explanations (lazy, on unlock or first view)
+    async def fake_explain_level(goal_title, level, **kwargs):
+        topics = [{**topic, "explanation": f"About {topic['name']}"} for topic in level["topics"]]
+        return {**level, "topics": topics}
+    
     # Patch both functions
     with patch('app.ai_service.generate_roadmap', side_effect=fake_generate_roadmap), \
          patch('app.ai_service.generate_quiz_for_level', side_effect=fake_generate_quiz), \
          patch('app.goals.generate_roadmap', side_effect=fake_generate_roadmap), \
-         patch('app.quizzes.generate_quiz_for_level', side_effect=fake_generate_quiz):
+         patch('app.roadmap_library.stream_roadmap', fake_stream_roadmap), \
+         patch('app.quiz_cache.generate_quiz_for_level', side_effect=fake_generate_quiz), \
+         patch('app.explanations.explain_level', side_effect=fake_explain_level):
         yield {
             'roadmap': fake_roadmap_response,
             'quiz': fake_quiz_response
@@ -0,0 +1,128 @@
+"""
+Testing validation and repair of AI output (no LLM involved).
+"""
+import json
+
+import pytest
+
+from app.ai_schemas import (
+    level_explanations_adapter, match_explanations, quiz_adapter, repair_level_explanations, repair_quiz,
+    repair_roadmap_header, repair_roadmap_level, repaired_quiz_adapter, roadmap_header_adapter,
+    roadmap_level_adapter, validate_ai_json,
+)
+from app.metrics import metrics
+
+
+def question(i, options=4, answer="A", **fields):
+    return {
+        "id": i,
+        "question": f"Question {i}?",
+        "options": [{"text": f"Option {value}", "value": value} for value in "ABCDEF"[:options]],
+        "correct_answer": answer,
+        **fields,
+    }
+
+
+def validate_quiz(payload):
+    return validate_ai_json("quiz", json.dumps(payload), quiz_adapter, repair_quiz, repaired_quiz_adapter).model_dump()
+
+
+def validate_level(payload, order=1):
+    return validate_ai_json(
+        "roadmap level", json.dumps(payload), roadmap_level_adapter,
+        lambda data, fixes: repair_roadmap_level(data, order, fixes)
+    ).model_dump()
+
+
+def test_valid_quiz_passes_strict_validation():
+    metrics.reset()
+    payload = {"questions": [question(1), question(2, answer="C")]}
+
+    assert validate_quiz(payload) == payload
+    assert metrics.llm_validation == {"valid": 1, "repaired": 0, "rejected": 0}
+
+
+def test_quiz_defects_are_repaired_or_dropped():
+    metrics.reset()
+    payload = {"questions": [
+        question(1, options=3, answer="c"),       # 3 options, lowercase answer
+        question(2, answer="Z"),                  # answer not among the options: dropped
+        question(3, options=5, answer="E"),       # 5 options: trimmed, keeping the answer
+        {"question": "No id?", "options": ["yes", "no", "maybe", "never"], "correct_answer": "no"},
+    ]}
+
+    questions = validate_quiz(payload)["questions"]
+
+    assert [q["id"] for q in questions] == [1, 2, 3]
+    assert [len(q["options"]) for q in questions] == [3, 4, 4]
+    assert questions[0]["correct_answer"] == "C"
+    assert questions[1]["correct_answer"] == "D" and questions[1]["options"][3] == {"text": "Option E", "value": "D"}
+    assert questions[2]["options"][1] == {"text": "no", "value": "B"} and questions[2]["correct_answer"] == "B"
+    assert metrics.llm_validation["repaired"] == 1
+
+
+def test_unrepairable_quiz_is_rejected():
+    metrics.reset()
+    with pytest.raises(ValueError):
+        validate_quiz({"questions": [question(1, answer="Z")]})
+    with pytest.raises(ValueError, match="invalid JSON"):
+        validate_ai_json("quiz", "{not json", quiz_adapter, repair_quiz, repaired_quiz_adapter)
+    assert metrics.llm_validation["rejected"] == 2
+
+
+def test_roadmap_level_repair():
+    level = validate_level({
+        "order": "2",
+        "title": "Basics",
+        "topics": ["Variables", {"name": "Loops", "completed": "false"}, {"completed": False}],
+        "xp_reward": 1000,
+    }, order=2)
+
+    assert level == {
+        "order": 2,
+        "title": "Basics",
+        "description": "",
+        "topics": [{"name": "Variables", "completed": False}, {"name": "Loops", "completed": False}],
+        "xp_reward": 300,
+    }
+
+    with pytest.raises(ValueError):
+        validate_level({"order": 1, "title": "Empty", "topics": [], "xp_reward": 100})
+
+
+@pytest.mark.parametrize("xp_reward", [150, "inf", 1e400, [150]])
+def test_new_levels_never_start_completed(xp_reward):
+    # a valid level passes strictly; the others go through repair (xp_reward falls back)
+    level = validate_level({
+        "order": 1,
+        "title": "Basics",
+        "topics": [{"name": "Variables", "completed": True}, {"name": "Loops", "completed": "yes"}],
+        "xp_reward": xp_reward,
+    })
+
+    assert [topic["completed"] for topic in level["topics"]] == [False, False]
+
+
+def test_roadmap_header_repair():
+    header = validate_ai_json(
+        "roadmap header", json.dumps({"title": "Learn Go", "difficulty": "Beginner"}),
+        roadmap_header_adapter, repair_roadmap_header
+    )
+
+    assert (header.difficulty, header.category, header.roadmap_name) == ("beginner", "General", "Learn Go Roadmap")
+
+
+def test_explanations_are_repaired_and_matched_to_topics():
+    content = json.dumps({"topics": [{"name": "loops", "explanation": "About loops"}, "About variables"]})
+    explained = validate_ai_json("level explanations", content, level_explanations_adapter, repair_level_explanations)
+
+    # one is unnamed, so they are matched by position
+    assert match_explanations(explained, ["Loops", "Variables"]) == ["About loops", "About variables"]
+    with pytest.raises(ValueError):
+        match_explanations(explained, ["Loops", "Variables", "Functions"])
+
+    by_name = validate_ai_json(
+        "level explanations", json.dumps({"Variables": "About variables", "Loops": "About loops"}),
+        level_explanations_adapter, repair_level_explanations
+    )
+    assert match_explanations(by_name, ["Loops", "Variables"]) == ["About loops", "About variables"]
@@ -0,0 +1,150 @@
+"""
+Testing the cache layer - in-process LRU tier in front of (mocked) Redis.
+
+These are UNIT TESTS - no database or real Redis needed.
+"""
+import asyncio
+import json
+import pytest
+
+from app import cache
+from app.cache import (
+    LocalCache, local_cache, get_json, set_json, delete_cache, get_or_compute, mark_stale,
+    invalidate_tags, clear_cache
+)
+
+
+def test_local_cache_evicts_least_recently_used():
+    """Oldest untouched key is dropped once max_entries is exceeded"""
+    cache = LocalCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # touch "a" so "b" becomes least recently used
+    cache.set("c", 3)
+
+    assert cache.get("a") == (True, 1)
+    assert cache.get("b") == (False, None)
+    assert cache.get("c") == (True, 3)
+
+
+def test_local_cache_entries_expire(monkeypatch):
+    """Entries are a miss once their TTL has passed"""
+    now = [1000.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+
+    cache = LocalCache(max_entries=10, ttl=30)
+    cache.set("key", {"x": 1}, ttl=5)
+    assert cache.get("key") == (True, {"x": 1})
+
+    now[0] += 6
+    assert cache.get("key") == (False, None)
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_json_fills_local_tier_from_redis(mock_redis):
+    """A Redis hit is decoded once and then served from the local tier"""
+    await mock_redis.set("cache:leaderboard", json.dumps([{"rank": 1}]))
+
+    assert await get_json("leaderboard") == [{"rank": 1}]
+    assert local_cache.get("leaderboard") == (True, [{"rank": 1}])
+
+
+@pytest.mark.asyncio
+async def test_delete_cache_evicts_both_tiers(mock_redis):
+    await set_json("leaderboard", [{"rank": 1}], expire=300)
+    assert local_cache.get("leaderboard")[0] is True
+
+    await delete_cache("leaderboard")
+
+    assert local_cache.get("leaderboard") == (False, None)
+    assert await get_json("leaderboard") is None
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_rebuilds_once_for_concurrent_callers(mock_redis):
+    """Concurrent misses on the same key share a single rebuild"""
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [{"rank": 1}]
+
+    results = await asyncio.gather(*[
+        get_or_compute("leaderboard", compute, expire=300) for _ in range(5)
+    ])
+
+    assert calls == 1
+    assert all(result == [{"rank": 1}] for result in results)
+    # the rebuild lock was released
+    assert await mock_redis.get("lock:leaderboard") is None
+
+
+@pytest.mark.asyncio
+async def test_stale_value_is_served_while_refreshing(mock_redis):
+    """After mark_stale, readers get the old value and one background refresh runs"""
+    version = 0
+
+    async def compute():
+        nonlocal version
+        version += 1
+        return {"version": version}
+
+    assert await get_or_compute("leaderboard", compute, expire=300, soft_ttl=30) == {"version": 1}
+
+    await mark_stale("leaderboard")
+    stale_reads = await asyncio.gather(*[
+        get_or_compute("leaderboard", compute, expire=300, soft_ttl=30) for _ in range(3)
+    ])
+    assert stale_reads == [{"version": 1}] * 3
+
+    await asyncio.gather(*cache._refresh_tasks)
+    assert version == 2
+    assert await get_or_compute("leaderboard", compute, expire=300, soft_ttl=30) == {"version": 2}
+
+
+@pytest.mark.asyncio
+async def test_invalidate_tags_deletes_every_tagged_key(mock_redis):
+    await set_json("goal:1:detail", {"id": 1}, tags=("user:7", "goal:1"))
+    await set_json("goal:2:detail", {"id": 2}, tags=("user:7", "goal:2"))
+    await set_json("goal:3:detail", {"id": 3}, tags=("user:8", "goal:3"))
+
+    assert await invalidate_tags("user:7") == 2
+
+    assert await get_json("goal:1:detail") is None
+    assert await get_json("goal:2:detail") is None
+    assert await get_json("goal:3:detail") == {"id": 3}
+
+
+@pytest.mark.asyncio
+async def test_clear_cache_keeps_rate_limit_counters(mock_redis):
+    await set_json("leaderboard", [{"rank": 1}], tags=("leaderboard",))
+    await mock_redis.set("rate_limit:127.0.0.1:login", "3")
+
+    assert await clear_cache() is True
+
+    assert await get_json("leaderboard") is None
+    assert await mock_redis.get("rate_limit:127.0.0.1:login") == "3"
+
+
+@pytest.mark.asyncio
+async def test_stale_local_copy_does_not_recompute_a_fresh_value(mock_redis):
+    """A worker whose local tier went stale re-reads what another worker refreshed instead of recomputing"""
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return {"version": calls}
+
+    await get_or_compute("leaderboard", compute, expire=300, soft_ttl=30)
+    # this worker still holds a stale copy; Redis was refreshed elsewhere
+    local_cache.set("leaderboard", ({"version": 0}, 0.0))
+
+    assert await get_or_compute("leaderboard", compute, expire=300, soft_ttl=30) == {"version": 0}
+    await asyncio.gather(*cache._refresh_tasks)
+
+    assert calls == 1
+    assert await get_or_compute("leaderboard", compute, expire=300, soft_ttl=30) == {"version": 1}
@@ -6,11 +6,29 @@ This demonstrates:
 2. Testing with mocked Redis (rate limiting)
 3. Testing with mocked OpenAI (AI generation)
 """
+import asyncio
+import json
+
 import pytest
 from sqlalchemy import select
 from app.models import User, Goal
 
 
+async def create_goal_and_wait(client, token, description):
+    """POST /goals, poll the generation job until it finishes and return the job"""
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await client.post("/goals", json={"description": description}, headers=headers)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    for _ in range(100):
+        job = (await client.get(f"/goals/jobs/{job_id}", headers=headers)).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError("goal generation job did not finish")
+
+
 # ========== DATABASE TESTS (No external dependency) ==========
 
 @pytest.mark.asyncio
@@ -161,18 +179,18 @@ async def test_create_goal_with_ai_roadmap(client, mock_openai):
     )
     token = login_response.json()["access_token"]
     
-    # Now create a goal (this would normally call OpenAI)
-    response = await client.post(
-        "/goals",
-        json={
-            "description": "I want to learn Python programming"
-        },
+    # Now create a goal (this would normally call OpenAI) and wait for the job
+    job = await create_goal_and_wait(client, token, "I want to learn Python programming")
+    assert job["status"] == "done"
+
+    response = await client.get(
+        f"/goals/{job['goal_id']}",
         headers={
             "Authorization": f"Bearer {token}"
         }
     )
     
-    assert response.status_code == 201
+    assert response.status_code == 200
     data = response.json()
     
     # Check the goal was created with AI-generated data
@@ -192,6 +210,86 @@ async def test_create_goal_with_ai_roadmap(client, mock_openai):
     assert len(first_level["topics"]) == 3
 
 
+@pytest.mark.asyncio
+async def test_create_goal_streams_levels(client, mock_openai):
+    """
+    Test the SSE goal creation: goal first, then each level, then done.
+    """
+    await client.post(
+        "/auth/register",
+        json={"email": "streamuser@test.com", "password": "Password123"}
+    )
+    login_response = await client.post(
+        "/auth/login",
+        data={"username": "streamuser@test.com", "password": "Password123"}
+    )
+    token = login_response.json()["access_token"]
+
+    response = await client.post(
+        "/goals/stream",
+        json={"description": "I want to learn Python programming"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        events.append((event_line.removeprefix("event: "), json.loads(data_line.removeprefix("data: "))))
+
+    assert [name for name, _ in events] == ["goal", "level", "level", "done"]
+    assert events[0][1]["title"] == "Learn Python Programming"
+    assert events[1][1]["title"] == "Python Basics"
+    assert events[1][1]["status"] == "unlocked"
+    assert events[3][1]["goal_id"] == events[0][1]["id"]
+
+    # Levels were persisted as they streamed
+    goal_response = await client.get(
+        f"/goals/{events[0][1]['id']}",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert len(goal_response.json()["roadmap"]["levels"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_level_explanations_generated_on_demand(client, mock_openai):
+    """
+    Test lazy explanations: generated for an unlocked level, refused for a locked one.
+    """
+    await client.post(
+        "/auth/register",
+        json={"email": "explainuser@test.com", "password": "Password123"}
+    )
+    login_response = await client.post(
+        "/auth/login",
+        data={"username": "explainuser@test.com", "password": "Password123"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await client.post(
+        "/goals/stream",
+        json={"description": "I want to learn Python programming"},
+        headers=headers
+    )
+    goal_id = json.loads(response.text.split("\n")[1].removeprefix("data: "))["id"]
+    goal = (await client.get(f"/goals/{goal_id}", headers=headers)).json()
+    first_level, second_level = goal["roadmap"]["levels"]
+
+    response = await client.get(f"/goals/levels/{first_level['id']}/explanations", headers=headers)
+    assert response.status_code == 200
+    assert all(topic["explanation"] for topic in response.json()["topics"])
+
+    # Persisted on the level
+    goal = (await client.get(f"/goals/{goal_id}", headers=headers)).json()
+    assert goal["roadmap"]["levels"][0]["topics"][0]["explanation"] == "About Variables and Data Types"
+
+    response = await client.get(f"/goals/levels/{second_level['id']}/explanations", headers=headers)
+    assert response.status_code == 403
+
+
 @pytest.mark.asyncio
 async def test_generate_quiz_for_level(client, mock_openai):
     """
@@ -210,9 +308,9 @@ async def test_generate_quiz_for_level(client, mock_openai):
     token = login_response.json()["access_token"]
     
     # Create a goal (gets AI-generated roadmap)
-    goal_response = await client.post(
-        "/goals",
-        json={"description": "Learn Python"},
+    job = await create_goal_and_wait(client, token, "Learn Python")
+    goal_response = await client.get(
+        f"/goals/{job['goal_id']}",
         headers={"Authorization": f"Bearer {token}"}
     )
     goal = goal_response.json()
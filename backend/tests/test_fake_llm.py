@@ -0,0 +1,52 @@
+"""
+Testing the fake LLM backend end to end through ai_service (no network).
+"""
+from unittest.mock import patch
+
+import pytest
+
+from app.ai_schemas import VALID_DIFFICULTIES
+from app.ai_service import CircuitBreaker, LLMUnavailableError, explain_level, generate_quiz_for_level, generate_roadmap
+from app.config import settings
+from app.fake_llm import FakeLLMBackend
+
+
+@pytest.fixture
+def fake_backend():
+    with patch.object(settings, "llm_fake_base_latency_ms", 0), \
+         patch.object(settings, "llm_fake_ms_per_token", 0), \
+         patch.object(settings, "llm_cache_enabled", False), \
+         patch.object(settings, "llm_backoff_base_seconds", 0.001), \
+         patch("app.ai_service.llm_breaker", CircuitBreaker(failure_threshold=100, cooldown=30)), \
+         patch("app.ai_service._backend", FakeLLMBackend()) as backend:
+        yield backend
+
+
+@pytest.mark.asyncio
+async def test_generates_valid_roadmap_and_quiz(fake_backend):
+    roadmap = await generate_roadmap("I want to learn Python for data science")
+
+    assert roadmap["title"] and roadmap["difficulty"] in VALID_DIFFICULTIES
+    levels = roadmap["roadmap"]["levels"]
+    assert [level["order"] for level in levels] == list(range(1, len(levels) + 1))
+    # Level 1 is explained eagerly, the rest are left for later
+    assert all(topic["explanation"] for topic in levels[0]["topics"])
+    assert not any(topic.get("explanation") for topic in levels[-1]["topics"])
+
+    explained = await explain_level(roadmap["title"], levels[-1])
+    assert all(topic["explanation"] for topic in explained["topics"])
+
+    quiz = await generate_quiz_for_level(levels[0]["title"], levels[0]["topics"])
+    assert len(quiz["questions"]) == 5
+
+
+@pytest.mark.asyncio
+async def test_content_is_deterministic(fake_backend):
+    assert await generate_roadmap("Learn Rust") == await generate_roadmap("Learn Rust")
+
+
+@pytest.mark.asyncio
+async def test_simulated_errors_go_through_retries(fake_backend):
+    with patch.object(settings, "llm_fake_server_error_rate", 1.0):
+        with pytest.raises(LLMUnavailableError):
+            await generate_quiz_for_level("Basics", [{"name": "Variables"}])
@@ -0,0 +1,62 @@
+"""
+Testing background job state: deadlines and Redis failures (Redis is mocked).
+"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import redis
+
+from app import jobs
+from app.jobs import JOB_EXPIRED_ERROR, JobStoreUnavailableError, get_job
+
+
+def make_job(status="pending", deadline_in=60.0):
+    now = time.time()
+    return {"id": "job-1", "kind": "test", "user_id": 1, "status": status, "created_at": now, "deadline": now + deadline_in}
+
+
+@pytest.mark.asyncio
+async def test_job_past_its_deadline_is_reported_failed():
+    # e.g. its worker process died while running it
+    job = make_job(status="running", deadline_in=-1)
+    await jobs._save_job(job)
+
+    polled = await get_job(job["id"])
+
+    assert polled["status"] == "failed"
+    assert polled["error"] == JOB_EXPIRED_ERROR
+
+
+@pytest.mark.asyncio
+async def test_handler_is_stopped_at_the_deadline():
+    async def slow_handler(job):
+        await asyncio.sleep(10)
+        return {}
+
+    job = make_job(deadline_in=0.05)
+    await jobs._run_job(job, slow_handler)
+
+    assert (await get_job(job["id"]))["error"] == JOB_EXPIRED_ERROR
+
+
+@pytest.mark.asyncio
+async def test_crashed_job_does_not_leak_the_exception():
+    async def broken_handler(job):
+        raise RuntimeError("connection string with a password")
+
+    job = make_job()
+    await jobs._run_job(job, broken_handler)
+
+    polled = await get_job(job["id"])
+    assert polled["status"] == "failed"
+    assert polled["error"]["code"] == "INTERNAL_ERROR"
+    assert "password" not in str(polled)
+
+
+@pytest.mark.asyncio
+async def test_redis_error_reading_a_job():
+    with patch.object(jobs.redis_client, "get", AsyncMock(side_effect=redis.ConnectionError())):
+        with pytest.raises(JobStoreUnavailableError):
+            await get_job("job-1")
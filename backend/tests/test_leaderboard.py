@@ -0,0 +1,179 @@
+"""
+Testing the Redis sorted-set leaderboard (Redis is mocked).
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.auth import get_current_user
+from app.leaderboard import (
+    LEADERBOARD_ZSET, award_xp, add_user_to_leaderboard, day_key, fetch_leaderboard_range, get_user_rank,
+    get_user_standing, leaderboard_key, window_days
+)
+from app.models import User
+from main import app
+
+
+async def add_users(db, *total_exps):
+    """Users with the given all-time XP, in the DB and in the sorted set"""
+    users = [User(email=f"user{i}@test.com", total_exp=xp) for i, xp in enumerate(total_exps)]
+    db.add_all(users)
+    await db.commit()
+    for user in users:
+        await add_user_to_leaderboard(user.id, user.total_exp)
+    return users
+
+
+@pytest.mark.asyncio
+async def test_award_xp_reorders_ranks(mock_redis):
+    for user_id in (1, 2, 3):
+        await add_user_to_leaderboard(user_id)
+
+    await award_xp(2, 150)
+    await award_xp(3, 100)
+    await award_xp(3, 100)
+
+    assert await mock_redis.zrevrange(LEADERBOARD_ZSET, 0, 9) == ["3", "2", "1"]
+    assert await get_user_rank(None, SimpleNamespace(id=3, total_exp=200)) == 1
+    assert await get_user_rank(None, SimpleNamespace(id=1, total_exp=0)) == 3
+
+
+@pytest.mark.asyncio
+async def test_add_user_keeps_existing_score(mock_redis):
+    await award_xp(5, 300)
+    await add_user_to_leaderboard(5)
+
+    assert await mock_redis.zrevrange(LEADERBOARD_ZSET, 0, 0, withscores=True) == [("5", 300.0)]
+
+
+@pytest.mark.asyncio
+async def test_missing_user_is_added_on_rank_lookup(mock_redis):
+    await award_xp(1, 500)
+
+    rank = await get_user_rank(None, SimpleNamespace(id=9, total_exp=700))
+
+    assert rank == 1
+    assert await mock_redis.zcard(LEADERBOARD_ZSET) == 2
+
+
+@pytest.mark.asyncio
+async def test_tied_users_share_a_rank(mock_redis):
+    await award_xp(1, 300)
+    await award_xp(2, 200)
+    await award_xp(3, 200)
+    await award_xp(4, 100)
+
+    ranks = [await get_user_rank(None, SimpleNamespace(id=user_id, total_exp=0)) for user_id in (1, 2, 3, 4)]
+
+    assert ranks == [1, 2, 2, 4]
+    assert await get_user_standing(None, SimpleNamespace(id=3), "weekly") == (2, 200)
+
+
+def test_window_keys():
+    now = datetime(2026, 10, 16, 15, 30, tzinfo=timezone.utc)
+
+    assert leaderboard_key("all") == "leaderboard:xp"
+    assert leaderboard_key("weekly") == "leaderboard:xp:weekly"
+    assert day_key(now.date()) == "leaderboard:xp:day:2026-10-16"
+    # rolling: the last 7 days, across the Monday calendar weeks would reset on
+    days = window_days("weekly", now)
+    assert len(days) == 7 and days[0] == now.date() and days[-1] == now.date() - timedelta(days=6)
+
+
+@pytest.mark.asyncio
+async def test_windows_roll_over_daily_buckets(mock_redis):
+    eight_days_ago = datetime.now(timezone.utc).date() - timedelta(days=8)
+    await mock_redis.zadd(day_key(eight_days_ago), {"1": 500})
+    await award_xp(2, 100)
+
+    assert await get_user_standing(None, SimpleNamespace(id=1), "weekly") == (None, 0)
+    assert await get_user_standing(None, SimpleNamespace(id=1), "monthly") == (1, 500)
+    assert await get_user_standing(None, SimpleNamespace(id=2), "monthly") == (2, 100)
+
+
+@pytest.mark.asyncio
+async def test_windowed_standing_counts_only_awarded_xp(mock_redis):
+    await add_user_to_leaderboard(1, total_exp=1000)  # lifetime XP only
+    await award_xp(2, 100)
+
+    veteran = SimpleNamespace(id=1, total_exp=1000)
+    newcomer = SimpleNamespace(id=2, total_exp=100)
+
+    assert await get_user_standing(None, veteran, "all") == (1, 1000)
+    assert await get_user_standing(None, newcomer, "weekly") == (1, 100)
+    assert await get_user_standing(None, veteran, "weekly") == (None, 0)
+
+
+@pytest.mark.asyncio
+async def test_listing_ranks_match_user_ranks(test_db, mock_redis):
+    users = await add_users(test_db, 300, 200, 200, 200, 100)
+
+    top = await fetch_leaderboard_range(test_db, 0, 10)
+    # second page starts in the middle of the tie
+    page = await fetch_leaderboard_range(test_db, 2, 3)
+
+    assert [entry["rank"] for entry in top] == [1, 2, 2, 2, 5]
+    assert [entry["rank"] for entry in page] == [2, 2, 5]
+    for entry in top:
+        user = next(user for user in users if user.id == entry["user_id"])
+        assert entry["rank"] == await get_user_rank(test_db, user)
+
+
+def log_in_as(user):
+    app.dependency_overrides[get_current_user] = lambda: user  # cleared by the client fixture
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_pages(client, test_db, mock_redis):
+    users = await add_users(test_db, 500, 400, 300, 200, 100)
+    log_in_as(users[0])
+
+    pages = []
+    offset = 0
+    while offset is not None:
+        page = (await client.get("/leaderboard/page", params={"offset": offset, "limit": 2})).json()
+        assert (page["offset"], page["limit"], page["total"]) == (offset, 2, 5)
+        pages.append([entry["total_exp"] for entry in page["entries"]])
+        offset = page["next_offset"]
+
+    assert pages == [[500, 400], [300, 200], [100]]
+    assert (await client.get("/leaderboard/page", params={"offset": 10})).json()["entries"] == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("me, expected", [(0, [500, 400]), (2, [400, 300, 200]), (4, [200, 100])])
+async def test_around_me_is_cut_at_the_edges(client, test_db, mock_redis, me, expected):
+    users = await add_users(test_db, 500, 400, 300, 200, 100)
+    log_in_as(users[me])
+
+    response = (await client.get("/leaderboard/around-me", params={"radius": 1})).json()
+
+    assert [entry["total_exp"] for entry in response["entries"]] == expected
+    assert response["current_user"]["rank"] == me + 1
+
+
+@pytest.mark.asyncio
+async def test_around_me_without_xp_in_the_window(client, test_db, mock_redis):
+    veteran, newcomer = await add_users(test_db, 1000, 0)
+    await award_xp(newcomer.id, 100)
+    log_in_as(veteran)
+
+    response = (await client.get("/leaderboard/around-me", params={"window": "weekly"})).json()
+
+    assert response["entries"] == []
+    assert response["current_user"]["rank"] is None
+
+
+@pytest.mark.asyncio
+async def test_around_me_follows_position_not_rank_on_ties(client, test_db, mock_redis):
+    # 3 users with XP, then 12 tied on 0 XP: every one of those has rank 4
+    users = await add_users(test_db, 300, 200, 100, *[0] * 12)
+    positions = await mock_redis.zrevrange(LEADERBOARD_ZSET, 0, -1)
+    me = next(user for user in users if str(user.id) == positions[-1])  # last of the tie
+    log_in_as(me)
+
+    response = (await client.get("/leaderboard/around-me", params={"radius": 2})).json()
+
+    assert response["current_user"]["rank"] == 4
+    assert me.id in [entry["user_id"] for entry in response["entries"]]
+    assert [entry["rank"] for entry in response["entries"]] == [4, 4, 4]
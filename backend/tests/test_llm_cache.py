@@ -0,0 +1,140 @@
+"""
+Testing the LLM response cache (Redis is mocked, the DB tier uses the test engine).
+"""
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.ai_service import LLMBackend, LLMStream, OpenAIBackend, _chat_completion, stream_roadmap_skeleton
+from app.config import settings
+from app.llm_cache import LLM_INDEX_KEY, LLM_KEY_PREFIX, get_cached_response, prompt_key, store_response
+from app.metrics import metrics
+from app.models import LLMResponse
+
+
+REQUEST = {
+    "model": "gpt-4o-mini",
+    "messages": [{"role": "user", "content": "Explain variables"}],
+    "temperature": 0.7,
+    "response_format": {"type": "json_object"},
+    "max_tokens": 500,
+}
+
+
+@pytest.fixture
+def fake_llm(test_engine):
+    """OpenAI client whose completions return {"answer": 42}; DB tier on the test engine"""
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps({"answer": 42})))],
+        usage=SimpleNamespace(prompt_tokens=20, completion_tokens=7),
+    )
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(return_value=response))))
+    session_maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+
+    metrics.reset()
+    with patch("app.ai_service._backend", OpenAIBackend()), \
+         patch("app.ai_service.get_openai_client", return_value=client), \
+         patch("app.llm_cache.async_session", session_maker):
+        yield client.chat.completions.create
+
+
+class LinesBackend(LLMBackend):
+    """Streams the given NDJSON lines and counts the calls"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.calls = 0
+
+    async def stream(self, request, purpose, timeout):
+        self.calls += 1
+        lines = self.lines
+
+        class Stream(LLMStream):
+            async def __aiter__(self):
+                for line in lines:
+                    yield line + "\n"
+
+        return Stream()
+
+
+HEADER = {"title": "Learn Go", "category": "Programming", "difficulty": "beginner", "roadmap_name": "Go Roadmap"}
+LEVEL = {"order": 1, "title": "Basics", "description": "", "topics": [{"name": "Syntax", "completed": False}], "xp_reward": 100}
+
+
+def test_prompt_key_ignores_call_options():
+    assert prompt_key(REQUEST) == prompt_key({**REQUEST, "max_tokens": 100, "timeout": 5})
+    assert prompt_key(REQUEST) != prompt_key({**REQUEST, "temperature": 0.2})
+    assert prompt_key(REQUEST) != prompt_key(REQUEST, variant=1)
+
+
+@pytest.mark.asyncio
+async def test_identical_prompt_is_served_from_cache(fake_llm):
+    first = await _chat_completion(REQUEST, json.loads, "level_explanation")
+    second = await _chat_completion(dict(REQUEST), json.loads, "level_explanation")
+
+    assert first == second == {"answer": 42}
+    assert fake_llm.call_count == 1
+    assert metrics.llm_cache["redis_hits"] == 1
+    assert metrics.llm_cache["tokens_saved"] == 7
+
+
+@pytest.mark.asyncio
+async def test_hot_tier_miss_falls_back_to_db(fake_llm, mock_redis):
+    await _chat_completion(REQUEST, json.loads, "level_explanation")
+    await mock_redis.delete(f"{LLM_KEY_PREFIX}{prompt_key(REQUEST)}")
+
+    assert await _chat_completion(REQUEST, json.loads, "level_explanation") == {"answer": 42}
+    assert fake_llm.call_count == 1
+    assert metrics.llm_cache["db_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_opt_out_and_rejected_answers_are_not_cached(fake_llm):
+    await _chat_completion(REQUEST, json.loads, "level_explanation", cache=False)
+
+    def reject(content):
+        raise ValueError("invalid")
+
+    with pytest.raises(ValueError):
+        await _chat_completion(REQUEST, reject, "level_explanation")
+
+    await _chat_completion(REQUEST, json.loads, "level_explanation")
+    assert fake_llm.call_count == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("bad_level, calls", [(False, 1), (True, 2)])
+async def test_stream_with_dropped_levels_is_not_cached(fake_llm, bad_level, calls):
+    lines = [json.dumps(HEADER), json.dumps(LEVEL)] + ([json.dumps({"title": "No topics", "topics": []})] if bad_level else [])
+    backend = LinesBackend(lines)
+
+    with patch("app.ai_service._backend", backend):
+        for _ in range(2):
+            parts = [part async for part in stream_roadmap_skeleton("learn go")]
+            assert [kind for kind, _ in parts] == ["header", "level"]
+
+    assert backend.calls == calls
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prune_rate, rows", [(0.0, 3), (1.0, 2)])
+async def test_db_tier_is_pruned_on_some_writes(fake_llm, test_engine, prune_rate, rows):
+    with patch.object(settings, "llm_cache_db_prune_rate", prune_rate), \
+         patch.object(settings, "llm_cache_db_max_rows", 2):
+        for key in ("a", "b", "c"):
+            await store_response(key, "gpt-4o-mini", key)
+
+    async with async_sessionmaker(test_engine, class_=AsyncSession)() as db:
+        assert await db.scalar(select(func.count()).select_from(LLMResponse)) == rows
+
+
+@pytest.mark.asyncio
+async def test_misses_stay_out_of_the_lru_index(fake_llm, mock_redis):
+    assert await get_cached_response("never-stored") is None
+    await _chat_completion(REQUEST, json.loads, "level_explanation")
+
+    assert await mock_redis.zcard(LLM_INDEX_KEY) == 1
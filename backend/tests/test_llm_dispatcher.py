@@ -0,0 +1,125 @@
+"""
+Testing the LLM concurrency limiter (no OpenAI calls are made).
+"""
+import asyncio
+
+import pytest
+
+from app.ai_service import LLMDispatcher, LLMOverloadedError
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    dispatcher = LLMDispatcher(max_concurrency=2, max_queue=10, queue_timeout=1)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with dispatcher.slot():
+            peak = max(peak, sum(dispatcher.active.values()))
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(6)))
+
+    assert peak == 2
+    assert dispatcher.active == {"premium": 0, "free": 0}
+    assert dispatcher.queued == {"premium": 0, "free": 0}
+
+
+@pytest.mark.asyncio
+async def test_full_queue_fails_fast():
+    dispatcher = LLMDispatcher(max_concurrency=1, max_queue=1, queue_timeout=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with dispatcher.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(LLMOverloadedError) as exc_info:
+        async with dispatcher.slot():
+            pass
+    assert exc_info.value.reason == "queue_full"
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_rejects():
+    dispatcher = LLMDispatcher(max_concurrency=1, max_queue=5, queue_timeout=0.02)
+    release = asyncio.Event()
+
+    async def hold():
+        async with dispatcher.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(LLMOverloadedError) as exc_info:
+        async with dispatcher.slot():
+            pass
+    assert exc_info.value.reason == "timeout"
+    assert dispatcher.queued == {"premium": 0, "free": 0}
+
+    release.set()
+    await holder
+
+
+@pytest.mark.asyncio
+async def test_reserved_slots_are_premium_only():
+    dispatcher = LLMDispatcher(max_concurrency=2, max_queue=5, queue_timeout=0.02, premium_reserved=1)
+    release = asyncio.Event()
+
+    async def hold(priority):
+        async with dispatcher.slot(priority):
+            await release.wait()
+
+    free_holder = asyncio.create_task(hold("free"))
+    await asyncio.sleep(0.01)
+
+    # The one unreserved slot is taken: another free call has to wait...
+    with pytest.raises(LLMOverloadedError):
+        async with dispatcher.slot("free"):
+            pass
+
+    # ...but a premium call still gets the reserved one
+    async with dispatcher.slot("premium"):
+        assert dispatcher.active == {"premium": 1, "free": 1}
+
+    release.set()
+    await free_holder
+
+
+@pytest.mark.asyncio
+async def test_premium_jumps_queue_without_starving_free():
+    dispatcher = LLMDispatcher(max_concurrency=1, max_queue=10, queue_timeout=5, premium_boost=0.05)
+    order = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with dispatcher.slot("premium"):
+            await release.wait()
+
+    async def call(name, priority):
+        async with dispatcher.slot(priority):
+            order.append(name)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.01)
+
+    early_free = asyncio.create_task(call("early_free", "free"))
+    await asyncio.sleep(0.1)  # waited longer than the premium boost
+    late_free = asyncio.create_task(call("late_free", "free"))
+    await asyncio.sleep(0.01)
+    premium = asyncio.create_task(call("premium", "premium"))
+    await asyncio.sleep(0.01)
+
+    release.set()
+    await asyncio.gather(holder, early_free, late_free, premium)
+
+    assert order == ["early_free", "premium", "late_free"]
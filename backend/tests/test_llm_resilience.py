@@ -0,0 +1,82 @@
+"""
+Testing retries, deadlines and the circuit breaker around LLM calls (no OpenAI calls are made).
+"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import openai
+import pytest
+
+from app.ai_service import (
+    CircuitBreaker, LLMCircuitOpenError, LLMRequestError, LLMTimeoutError, LLMUnavailableError, _call_with_resilience
+)
+from app.config import settings
+
+
+def status_error(cls, status_code):
+    response = httpx.Response(status_code, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return cls("provider error", response=response, body=None)
+
+
+@pytest.fixture
+def fast_resilience():
+    """Fresh breaker, no real backoff sleeps"""
+    with patch("app.ai_service.llm_breaker", CircuitBreaker(failure_threshold=2, cooldown=30)) as breaker, \
+         patch.object(settings, "llm_backoff_base_seconds", 0.001), \
+         patch.object(settings, "llm_max_attempts", 3):
+        yield breaker
+
+
+def deadline(seconds=5):
+    return asyncio.get_running_loop().time() + seconds
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried(fast_resilience):
+    call = AsyncMock(side_effect=[status_error(openai.InternalServerError, 500), "ok"])
+
+    assert await _call_with_resilience(call, 1, deadline()) == "ok"
+    assert call.call_count == 2
+    assert fast_resilience.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(fast_resilience):
+    call = AsyncMock(side_effect=status_error(openai.BadRequestError, 400))
+
+    with pytest.raises(LLMRequestError):
+        await _call_with_resilience(call, 1, deadline())
+    assert call.call_count == 1
+    assert fast_resilience.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_hung_attempt_times_out_within_deadline(fast_resilience):
+    fast_resilience.failure_threshold = 10
+
+    async def hang(timeout):
+        await asyncio.sleep(10)
+
+    with pytest.raises(LLMTimeoutError):
+        await _call_with_resilience(hang, 0.05, deadline(0.2))
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_then_fails_fast(fast_resilience):
+    failing = AsyncMock(side_effect=status_error(openai.RateLimitError, 429))
+
+    with pytest.raises(LLMUnavailableError):
+        await _call_with_resilience(failing, 1, deadline())
+    assert fast_resilience.state == "open"
+
+    healthy = AsyncMock(return_value="ok")
+    with pytest.raises(LLMCircuitOpenError) as exc_info:
+        await _call_with_resilience(healthy, 1, deadline())
+    assert healthy.call_count == 0
+    assert exc_info.value.retry_after > 0
+
+    # After the cooldown one probe goes through and closes the breaker
+    fast_resilience.opened_at -= 30
+    assert await _call_with_resilience(healthy, 1, deadline()) == "ok"
+    assert fast_resilience.state == "closed"
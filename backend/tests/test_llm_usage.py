@@ -0,0 +1,74 @@
+"""
+Testing LLM usage accounting and token quotas (Redis is mocked, flushes go to the test engine).
+"""
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import llm_usage
+from app.admin import get_llm_usage
+from app.ai_service import CircuitBreaker, LLMQuotaExceededError, generate_quiz_for_level
+from app.config import settings
+from app.fake_llm import FakeLLMBackend
+from app.llm_usage import flush_usage, record_usage, tokens_used_today, usage_scope
+
+
+@pytest.fixture
+def usage_db(test_engine):
+    session_maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    with patch("app.llm_usage.async_session", session_maker), \
+         patch("app.llm_usage._buckets", {}):
+        yield
+
+
+@pytest.fixture
+def fake_backend():
+    with patch.object(settings, "llm_fake_base_latency_ms", 0), \
+         patch.object(settings, "llm_fake_ms_per_token", 0), \
+         patch.object(settings, "llm_cache_enabled", False), \
+         patch("app.ai_service.llm_breaker", CircuitBreaker(failure_threshold=100, cooldown=30)), \
+         patch("app.ai_service._backend", FakeLLMBackend()) as backend:
+        yield backend
+
+
+@pytest.mark.asyncio
+async def test_usage_is_summed_flushed_and_reported(usage_db, test_db, mock_redis):
+    with usage_scope("GET /levels/{level_id}/quiz", 1):
+        await record_usage("quiz", "gpt-4o-mini", 1000, 500, latency_ms=800)
+        await record_usage("quiz", "gpt-4o-mini", 1000, 300, latency_ms=400)
+        await record_usage("quiz", "gpt-4o-mini", cache_hit=True)
+    with usage_scope("POST /goals", 2):
+        await record_usage("roadmap_skeleton", "gpt-4o-mini", 2000, 1000, latency_ms=3000)
+
+    assert len(llm_usage._buckets) == 2
+    assert await tokens_used_today(1) == 2800
+    assert await flush_usage() == 2
+    assert llm_usage._buckets == {}
+
+    report = await get_llm_usage(db=test_db, current_user=None)
+
+    assert report["totals"]["calls"] == 3
+    assert report["totals"]["cache_hits"] == 1
+    assert report["totals"]["prompt_tokens"] == 4000
+    quiz = next(entry for entry in report["by_endpoint"] if entry["purpose"] == "quiz")
+    assert quiz["endpoint"] == "GET /levels/{level_id}/quiz"
+    assert quiz["calls"] == 2 and quiz["avg_latency_ms"] == 600
+    assert quiz["cost_usd"] == pytest.approx((2000 * 0.15 + 800 * 0.60) / 1_000_000)
+    assert [entry["user_id"] for entry in report["by_user"]] == [2, 1]  # most expensive first
+    assert len(report["by_day"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_quota_is_enforced_before_the_call(usage_db, fake_backend, mock_redis):
+    with usage_scope("GET /levels/{level_id}/quiz", 7), \
+         patch.object(settings, "llm_daily_token_quota_free", 1):
+        await generate_quiz_for_level("Basics", [{"name": "Variables"}])  # under quota when it starts
+        assert await tokens_used_today(7) > 1
+
+        with pytest.raises(LLMQuotaExceededError) as error:
+            await generate_quiz_for_level("Basics", [{"name": "Loops"}])
+        assert error.value.retry_after > 0
+
+        # Premium has its own (here unlimited) quota
+        await generate_quiz_for_level("Basics", [{"name": "Loops"}], priority="premium")
@@ -0,0 +1,80 @@
+"""
+Testing the content-addressed quiz cache (Redis and OpenAI are mocked).
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app import quiz_cache
+from app.quiz_cache import (
+    QUIZ_INDEX_KEY, get_or_generate_quiz, prefetch_level_quiz, quiz_content_key, store_quiz_variant, take_prefetched_quiz
+)
+
+
+TOPICS = [{"name": "Variables", "completed": False}, {"name": "Loops", "completed": True}]
+
+
+def test_content_key_ignores_case_whitespace_and_topic_order():
+    reordered = [{"name": "  loops "}, {"name": "VARIABLES"}]
+
+    assert quiz_content_key("Python Basics", TOPICS) == quiz_content_key("python  basics", reordered)
+    assert quiz_content_key("Python Basics", TOPICS) != quiz_content_key("Python Basics", TOPICS[:1])
+
+
+@pytest.mark.asyncio
+async def test_miss_generates_then_hits_serve_cached(mock_openai):
+    first = await get_or_generate_quiz("Python Basics", TOPICS)
+    second = await get_or_generate_quiz("python basics", list(reversed(TOPICS)))
+
+    assert first == second == mock_openai["quiz"]
+    assert quiz_cache.generate_quiz_for_level.call_count == 1
+
+    # the hit scheduled a background top-up towards quiz_cache_variants
+    await asyncio.gather(*quiz_cache._topup_tasks)
+    assert quiz_cache.generate_quiz_for_level.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_top_up_runs_at_the_callers_priority(mock_openai):
+    await get_or_generate_quiz("Python Basics", TOPICS, priority="premium")
+    await get_or_generate_quiz("Python Basics", TOPICS, priority="premium")
+    await asyncio.gather(*quiz_cache._topup_tasks)
+
+    top_up = quiz_cache.generate_quiz_for_level.call_args_list[-1]
+    assert top_up.kwargs == {"priority": "premium", "cache": False}
+
+
+@pytest.mark.asyncio
+async def test_variants_are_capped(mock_redis):
+    key = quiz_content_key("Python Basics", TOPICS)
+    with patch.object(quiz_cache.settings, "quiz_cache_variants", 2):
+        for i in range(4):
+            await store_quiz_variant(key, {"questions": [i]})
+
+        variants = await quiz_cache.get_quiz_variants(key)
+
+    assert [variant["questions"] for variant in variants] == [[3], [2]]
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_keys_are_evicted(mock_redis):
+    with patch.object(quiz_cache.settings, "quiz_cache_max_keys", 2):
+        for title in ("a", "b", "c"):
+            await store_quiz_variant(quiz_content_key(title, []), {"questions": [title]})
+            await asyncio.sleep(0.001)
+
+    assert await mock_redis.zcard(QUIZ_INDEX_KEY) == 2
+    assert await quiz_cache.get_quiz_variants(quiz_content_key("a", [])) == []
+    assert await quiz_cache.get_quiz_variants(quiz_content_key("c", [])) == [{"questions": ["c"]}]
+
+
+@pytest.mark.asyncio
+async def test_prefetched_quiz_is_served_once(mock_openai):
+    prefetch_level_quiz(7, "Python Basics", TOPICS)
+    prefetch_level_quiz(7, "Python Basics", TOPICS)  # already in flight, ignored
+    await asyncio.gather(*quiz_cache._topup_tasks)
+
+    assert quiz_cache.generate_quiz_for_level.call_count == 1
+    assert await take_prefetched_quiz(7) == mock_openai["quiz"]
+    assert await take_prefetched_quiz(7) is None
@@ -0,0 +1,105 @@
+"""
+Testing roadmap library normalization, reuse copies and the reuse policies (DB on the test engine).
+"""
+import random
+from unittest.mock import patch
+
+import pytest
+
+from app.config import settings
+from app.roadmap_library import (
+    description_key, fresh_copy, library_variant, lookup_roadmap, normalize_description, save_roadmap
+)
+
+
+def roadmap(title):
+    return {
+        "title": title,
+        "category": "Programming",
+        "difficulty": "beginner",
+        "roadmap": {"name": title, "levels": [{"order": 1, "topics": [{"name": "Loops", "completed": True}]}]}
+    }
+
+
+async def save(db, description, title):
+    save_roadmap(db, description, roadmap(title))
+    await db.commit()
+
+
+def test_near_identical_descriptions_share_a_key():
+    variants = ["learn python", "I want to learn Python!", "  Python, please  ", "python"]
+
+    assert {normalize_description(text) for text in variants} == {"python"}
+    assert description_key(normalize_description(variants[0])) == description_key(normalize_description(variants[1]))
+
+
+def test_meaningful_words_are_kept():
+    assert normalize_description("I want to learn Python for data science") == "data python science"
+    assert normalize_description("Learn C# and C++") == "c# c++"
+    assert normalize_description("learn python") != normalize_description("learn rust")
+
+
+def test_non_latin_words_are_kept_whole():
+    assert normalize_description("learn python in 日本語") == "python 日本語"
+    assert normalize_description("Apprendre le français") == "apprendre français le"
+    assert normalize_description("学习 Python") == "python 学习"
+
+
+def test_too_little_left_skips_the_library():
+    assert normalize_description("learn c") == ""
+    assert normalize_description("I want to learn 🎸") == ""
+
+
+def test_fresh_copy_resets_completion_without_touching_the_template():
+    template = {
+        "title": "Python",
+        "roadmap": {"name": "Python", "levels": [{"order": 1, "topics": [{"name": "Loops", "completed": True}]}]}
+    }
+
+    copy = fresh_copy(template)
+
+    assert copy["roadmap"]["levels"][0]["topics"][0]["completed"] is False
+    assert template["roadmap"]["levels"][0]["topics"][0]["completed"] is True
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_is_served_from_the_library(test_db):
+    with patch.object(settings, "roadmap_library_policy", "reuse"):
+        await save(test_db, "learn python", "Python A")
+
+        reused = await lookup_roadmap(test_db, "I want to learn Python!")
+        other = await lookup_roadmap(test_db, "learn python in 日本語")
+
+    assert reused["title"] == "Python A"
+    assert reused["roadmap"]["levels"][0]["topics"][0]["completed"] is False
+    assert other is None
+
+
+@pytest.mark.asyncio
+async def test_variants_policy_builds_variants_then_rotates(test_db):
+    random.seed(7)
+    with patch.object(settings, "roadmap_library_policy", "variants"), \
+         patch.object(settings, "roadmap_library_variants", 2):
+        await save(test_db, "learn python", "Python A")
+        assert await lookup_roadmap(test_db, "learn python") is None  # still building variants
+        assert await library_variant(test_db, "learn python") == 1
+
+        await save(test_db, "python please", "Python B")
+        assert await library_variant(test_db, "learn python") == 2
+        served = {(await lookup_roadmap(test_db, "learn python"))["title"] for _ in range(20)}
+
+    assert served == {"Python A", "Python B"}
+
+
+@pytest.mark.asyncio
+async def test_off_policy_bypasses_the_library(test_db):
+    with patch.object(settings, "roadmap_library_policy", "reuse"):
+        await save(test_db, "learn python", "Python A")
+
+    with patch.object(settings, "roadmap_library_policy", "off"):
+        await save(test_db, "learn python", "Python B")
+        assert await lookup_roadmap(test_db, "learn python") is None
+        assert await library_variant(test_db, "learn python") == 0
+
+    with patch.object(settings, "roadmap_library_policy", "reuse"):
+        assert await library_variant(test_db, "learn python") == 1  # nothing was saved while off
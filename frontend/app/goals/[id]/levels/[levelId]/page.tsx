@@ -50,6 +50,12 @@ export default function LevelTopicsPage() {
           setError('Level not found');
         } else {
           setLevel(foundLevel);
+          // Explanations are generated on first view; fill them in when ready
+          if (foundLevel.status !== 'locked' && foundLevel.topics.some((t: Topic) => !t.explanation)) {
+            api.get(`/goals/levels/${foundLevel.id}/explanations`)
+              .then((explained) => setLevel(explained.data))
+              .catch(() => {});
+          }
         }
       } catch (err: any) {
         setError(err.response?.data?.detail || 'Failed to load level');
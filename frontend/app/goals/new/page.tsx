@@ -10,6 +10,33 @@ import Navbar from '@/components/Navbar';
 import ErrorDisplay from '@/components/ui/ErrorDisplay';
 import PremiumLimitModal from '@/components/PremiumLimitModal';
 
+// Roadmap generation runs as a background job; poll its status until it finishes
+const JOB_POLL_INTERVAL_MS = 1500;
+const JOB_POLL_TIMEOUT_MS = 3 * 60 * 1000;
+
+async function waitForGoal(jobId: string): Promise<number> {
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    let job;
+    try {
+      ({ data: job } = await api.get(`/goals/jobs/${jobId}`));
+    } catch (err: any) {
+      // Job status briefly unavailable: keep polling
+      if (err.response?.status === 503) continue;
+      throw err;
+    }
+    if (job.status === 'done') {
+      return job.goal_id;
+    }
+    if (job.status === 'failed') {
+      // Same shape as an HTTP error so the handler below treats both alike
+      throw { response: { data: { detail: job.error } } };
+    }
+  }
+  throw { response: { data: { detail: 'Roadmap generation is taking longer than expected. Check your goals in a minute.' } } };
+}
+
 // Example goals users can click to try
 const EXAMPLE_GOALS = [
   "🌐 Learn web development",
@@ -45,7 +72,8 @@ export default function NewGoalPage() {
         description: description.trim()
       });
 
-      router.push(`/goals/${response.data.id}`);
+      const goalId = await waitForGoal(response.data.job_id);
+      router.push(`/goals/${goalId}`);
     } catch (err: any) {
       // Handle different error formats
       let errorMessage = 'Failed to create goal. Please try again.';